@@ -0,0 +1,109 @@
+"""Concurrent throughput of the blocking vs. async database layer.
+
+Run from the cyberspace directory:
+
+    python benchmarks/bench_async_db.py --requests 500 --concurrency 50 --latency-ms 5
+
+Both variants run the same user lookup as crud.get_user_by_email against one
+SQLite file. A `sleep_ms()` SQL function is registered on every connection to
+stand in for the MySQL network round trip, so the numbers reflect how much of
+that wait the event loop can overlap:
+
+* "blocking" is the old pattern: an `async def` handler calling a synchronous
+  Session inline, which stalls the loop for the full round trip.
+* "async" is the current pattern: AsyncSession from database.SessionLocal.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="simulated DB round trip")
+    return parser.parse_args()
+
+
+def setup_environment(workdir: str) -> str:
+    db_path = os.path.join(workdir, "bench.db")
+    with open(os.path.join(workdir, "config.ini"), "w") as f:
+        f.write(
+            "[DEFAULT]\nALGORITHM = HS256\nSECRET_KEY = bench\n"
+            "EMAIL_FROM = bench@example.com\nEMAIL_PASSWORD = bench\n\n"
+            f"[DATABASE]\nURL = sqlite+aiosqlite:///{db_path}\n"
+        )
+    # database.py reads config.ini relative to the working directory
+    os.chdir(workdir)
+    return db_path
+
+
+def register_sleep(dbapi_connection, connection_record):
+    dbapi_connection.create_function("sleep_ms", 1, lambda ms: time.sleep(ms / 1000.0) or 0)
+
+
+async def run_concurrently(handler, total: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await handler(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return total / (time.perf_counter() - start)
+
+
+async def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="bench_async_db_")
+    db_path = setup_environment(workdir)
+
+    from sqlalchemy import create_engine, event, text
+    from sqlalchemy.orm import sessionmaker
+    from database import engine, SessionLocal
+    from models import Base, User
+    import crud
+
+    event.listen(engine.sync_engine, "connect", register_sleep)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as db:
+        db.add_all(User(email_id=f"user{i}@example.com", mobile_number=str(i)) for i in range(100))
+        await db.commit()
+
+    sync_engine = create_engine(f"sqlite:///{db_path}")
+    event.listen(sync_engine, "connect", register_sleep)
+    SyncSession = sessionmaker(bind=sync_engine)
+    latency = text("SELECT sleep_ms(:ms)").bindparams(ms=args.latency_ms)
+
+    async def blocking_handler(i):
+        with SyncSession() as db:
+            db.execute(latency)
+            db.query(User).filter(User.email_id == f"user{i % 100}@example.com").first()
+
+    async def async_handler(i):
+        async with SessionLocal() as db:
+            await db.execute(latency)
+            await crud.get_user_by_email(db, f"user{i % 100}@example.com")
+
+    blocking_rps = await run_concurrently(blocking_handler, args.requests, args.concurrency)
+    async_rps = await run_concurrently(async_handler, args.requests, args.concurrency)
+
+    print(f"requests={args.requests} concurrency={args.concurrency} latency={args.latency_ms}ms")
+    print(f"blocking session : {blocking_rps:8.1f} req/s")
+    print(f"async session    : {async_rps:8.1f} req/s  ({async_rps / blocking_rps:.1f}x)")
+
+    sync_engine.dispose()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+"""Requests/s of the ASGI CORS middleware vs. the old BaseHTTPMiddleware one.
+
+Run from the cyberspace directory:
+
+    python benchmarks/bench_cors.py --requests 20000
+
+Both middlewares wrap the same FastAPI app with one small JSON route and are
+called directly over ASGI (no sockets), so the difference is the cost of the
+middleware layer itself. Three request kinds are measured: a cross-origin GET
+from an allowed origin, a same-origin GET (no Origin header) and a preflight.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+ORIGIN = "http://127.0.0.1:5500"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    return parser.parse_args()
+
+
+def legacy_cors(app):
+    """The middleware service.add_custom_cors_middleware installed before cors.py."""
+    from starlette.middleware.base import BaseHTTPMiddleware
+    from starlette.responses import Response
+
+    allowed_origins = [ORIGIN]
+
+    class CustomCORSMiddleware(BaseHTTPMiddleware):
+        async def dispatch(self, request, call_next):
+            if request.method == "OPTIONS":
+                response = Response()
+                response.headers.update({
+                    "Access-Control-Allow-Origin": allowed_origins[0],
+                    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE",
+                    "Access-Control-Allow-Headers": "X-Custom-Header, Content-Type, Authorization",
+                    "Access-Control-Max-Age": "86400",
+                    "Access-Control-Allow-Credentials": "true",
+                })
+                return response
+
+            response = await call_next(request)
+            origin = request.headers.get("Origin")
+            if origin in allowed_origins:
+                response.headers.update({
+                    "Access-Control-Allow-Origin": origin,
+                    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE",
+                    "Access-Control-Allow-Headers": "X-Custom-Header, Content-Type, Authorization",
+                    "Access-Control-Allow-Credentials": "true",
+                })
+            return response
+
+    app.add_middleware(CustomCORSMiddleware)
+
+
+def build_app(install):
+    from fastapi import FastAPI
+
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    install(app)
+    return app
+
+
+def scope_for(method: str, headers: list) -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": "/ping", "raw_path": b"/ping", "root_path": "", "query_string": b"",
+        "headers": headers, "client": ("127.0.0.1", 1234), "server": ("127.0.0.1", 8000),
+    }
+
+
+async def call(app, scope: dict, send):
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Like a server: nothing more arrives until the client goes away
+        await asyncio.Future()
+
+    await app(dict(scope), receive, send)
+
+
+async def requests_per_second(app, scope: dict, total: int) -> float:
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    # Warm up routing and middleware stack construction
+    for _ in range(100):
+        await call(app, scope, send)
+    start = time.perf_counter()
+    for _ in range(total):
+        await call(app, scope, send)
+    elapsed = time.perf_counter() - start
+    assert all(status == 200 for status in statuses), set(statuses)
+    return total / elapsed
+
+
+async def main():
+    args = parse_args()
+    from cors import CORSMiddleware
+
+    apps = {
+        "BaseHTTPMiddleware": build_app(legacy_cors),
+        "ASGI middleware": build_app(lambda app: app.add_middleware(CORSMiddleware, allowed_origins={ORIGIN})),
+    }
+    cases = {
+        "cross-origin GET": scope_for("GET", [(b"host", b"127.0.0.1:8000"), (b"origin", ORIGIN.encode())]),
+        "same-origin GET": scope_for("GET", [(b"host", b"127.0.0.1:8000")]),
+        "preflight": scope_for("OPTIONS", [
+            (b"host", b"127.0.0.1:8000"), (b"origin", ORIGIN.encode()),
+            (b"access-control-request-method", b"POST"),
+        ]),
+    }
+
+    print(f"requests={args.requests} per case")
+    for case, scope in cases.items():
+        results = {name: await requests_per_second(app, scope, args.requests) for name, app in apps.items()}
+        old, new = results["BaseHTTPMiddleware"], results["ASGI middleware"]
+        print(f"{case:17}: BaseHTTPMiddleware {old:8.0f} req/s   ASGI {new:8.0f} req/s   ({new / old:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,477 @@
+"""Latency, throughput and memory of the main endpoints, checked against a baseline.
+
+Run from the cyberspace directory:
+
+    python benchmarks/bench_endpoints.py                  # run, compare with the baseline
+    python benchmarks/bench_endpoints.py --save-baseline  # run and store as the new baseline
+    python benchmarks/bench_endpoints.py --scenarios login,profile --scale 2
+
+The real main.app is driven in-process over ASGI (httpx.ASGITransport), with
+its startup and shutdown hooks, against a scratch SQLite database built from
+the Alembic migrations. The mailer's DeliveryWorker runs alongside it and
+delivers the outbox to a stub SMTP server on localhost, so signups exercise
+the whole email path without sending anything.
+
+Scenarios: signup, login, profile, the four registration POSTs and paper
+uploads at several sizes. Each runs --repeat times and reports the median
+p50/p95/p99/max latency, requests/s and peak RSS of this process over the
+passes. Results are written as JSON
+(--output) and compared with --baseline: a p50/p95 latency or RSS more than
+--tolerance above the baseline, lower throughput by the same margin, or
+failed requests count as a regression and make the exit status 1.
+
+The numbers depend on the machine, so a baseline is only comparable with
+runs on the same hardware; regenerate it with --save-baseline after moving.
+Tail latencies of the smaller scenarios vary by a third between identical
+runs on a busy or single-core box, hence the generous default tolerance.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+DEFAULT_BASELINE = os.path.join(HERE, "bench_endpoints_baseline.json")
+PASSWORD = "load-test-password"
+SEED_USERS = 8
+UPLOAD_SIZES = {"upload_100kb": 100 * 1024, "upload_1mb": 1024 * 1024, "upload_10mb": 10 * 1024 * 1024}
+# metric -> +1 if higher is worse, -1 if lower is worse
+# p99 and max are reported but not compared: over a few hundred requests they are a couple of samples
+COMPARED_METRICS = {"p50_ms": 1, "p95_ms": 1, "throughput_rps": -1, "peak_rss_mb": 1}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", help="comma-separated subset of scenarios to run")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every scenario's request count")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3, help="passes per scenario; medians are reported")
+    parser.add_argument("--output", help="where to write this run's results (default: the scratch directory)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="relative change that counts as a regression (0.5 = 50%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    return parser.parse_args()
+
+
+class StubSMTPServer:
+    """Just enough SMTP for smtplib.send_message; every message is accepted and dropped."""
+
+    def __init__(self):
+        self.messages = 0
+        self._server = None
+
+    async def start(self, port: int):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", port)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(b"220 stub ESMTP\r\n")
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line[:4].upper()
+            if command == b"DATA":
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                await writer.drain()
+                while (await reader.readline()) not in (b".\r\n", b""):
+                    pass
+                self.messages += 1
+                writer.write(b"250 Queued\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                # EHLO/HELO, MAIL, RCPT, RSET, NOOP
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def setup_environment(workdir: str, smtp_port: int):
+    db_path = os.path.join(workdir, "bench.db")
+    with open(os.path.join(workdir, "config.ini"), "w") as f:
+        f.write(
+            "[DEFAULT]\nALGORITHM = HS256\nSECRET_KEY = bench\n"
+            "EMAIL_FROM = bench@example.com\nEMAIL_PASSWORD = bench\n"
+            # Measures throughput, so every request is admitted: argon2 calls queue
+            # instead of being turned away, and all clients share one IP
+            "HASH_MAX_QUEUE = 1000\n\n"
+            f"[DATABASE]\nURL = sqlite+aiosqlite:///{db_path}\n\n"
+            f"[SMTP]\nHOST = 127.0.0.1\nPORT = {smtp_port}\nSTARTTLS = false\nLOGIN = false\n"
+            "POLL_INTERVAL = 0.2\n\n"
+            "[APP]\nMODE = production\n\n"
+            "[RATE_LIMIT]\nENABLED = false\n"
+        )
+    # settings.py reads config.ini relative to the working directory
+    os.chdir(workdir)
+
+
+def make_pdf(size: int) -> bytes:
+    """A valid one-page PDF padded to about `size` bytes with an unreferenced binary stream."""
+    content = b"BT /F1 12 Tf 72 712 Td (Load test paper) Tj ET"
+    padding = os.urandom(max(size - 700, 0))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length %d >>\nstream\n" % len(padding) + padding + b"\nendstream",
+    ]
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Not Linux: the lifetime peak is the best available figure (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RSSSampler:
+    """Tracks the peak resident set size of this process while running."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._task = None
+
+    async def _sample(self):
+        while True:
+            self.peak = max(self.peak, current_rss())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.peak = current_rss()
+        self._task = asyncio.create_task(self._sample())
+
+    async def stop(self) -> int:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return max(self.peak, current_rss())
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Scenario:
+    def __init__(self, name: str, requests: int, send):
+        self.name = name
+        self.requests = requests
+        # send(client, i) -> httpx.Response for the i-th request
+        self.send = send
+
+
+def build_scenarios(users: list, run_id: str) -> list:
+    """users: (email, access token) pairs created before the timed scenarios."""
+    def auth(i):
+        return {"Authorization": f"Bearer {users[i % len(users)][1]}"}
+
+    def person(i):
+        return {"first_name": "Load", "last_name": "Test", "email_id": users[i % len(users)][0],
+                "phone_number": "9000000000"}
+
+    async def signup(client, i):
+        return await client.post("/users/", data={
+            "first_name": "Load", "last_name": "Test", "email_id": f"signup-{run_id}-{i}@example.com",
+            "mobile_number": f"8{i:09d}", "college_name": "Bench College", "password": PASSWORD,
+        })
+
+    async def login(client, i):
+        return await client.post("/login", json={"username": users[i % len(users)][0], "password": PASSWORD})
+
+    async def profile(client, i):
+        return await client.get("/user/profile", headers=auth(i))
+
+    async def virtual_internship(client, i):
+        return await client.post("/virtualInternship/", headers=auth(i), data={
+            **person(i), "address": "1 Bench Street", "highest_qualification": "BSc",
+            "field_of_study": "CS", "skills_and_strengths": "Python", "experience": "None",
+            "available_start_date": "01-07-2026", "preferred_internship": "Backend",
+        })
+
+    async def seminar(client, i):
+        return await client.post("/seminar/", headers=auth(i), data={
+            **person(i), "course": "CS", "year_of_study": "2", "seminar_topic": "Load testing",
+        })
+
+    async def webinar(client, i):
+        return await client.post("/webinar/", headers=auth(i), data={
+            **person(i), "course": "CS", "year_of_study": "2", "webinar_topic": "Load testing",
+        })
+
+    def paper_upload(pdf: bytes):
+        async def upload(client, i):
+            return await client.post("/research-paper/", headers=auth(i), data={
+                **person(i), "student_id": f"S{i}", "paper_title": f"Load test paper {i}",
+                "abstract": "Throughput of a small web service", "keywords": "load test",
+                "paper_category": "cs",
+            }, files={"paper_pdf": ("paper.pdf", pdf, "application/pdf")})
+        return upload
+
+    scenarios = [
+        Scenario("signup", 30, signup),
+        Scenario("login", 30, login),
+        Scenario("profile", 500, profile),
+        Scenario("virtual_internship", 200, virtual_internship),
+        Scenario("seminar", 200, seminar),
+        Scenario("webinar", 200, webinar),
+        Scenario("research_paper", 100, paper_upload(make_pdf(20 * 1024))),
+    ]
+    counts = {"upload_100kb": 50, "upload_1mb": 30, "upload_10mb": 20}
+    for name, size in UPLOAD_SIZES.items():
+        scenarios.append(Scenario(name, counts[name], paper_upload(make_pdf(size))))
+    return scenarios
+
+
+async def run_scenario(client, scenario: Scenario, requests: int, concurrency: int, first: int = 0) -> dict:
+    """One pass of `requests` requests, numbered from `first` so repeats never reuse signup emails."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = {}
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                status = (await scenario.send(client, i)).status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    sampler = RSSSampler()
+    sampler.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(first, first + requests)))
+    elapsed = time.perf_counter() - start
+    peak_rss = await sampler.stop()
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(count for status, count in statuses.items() if not status.startswith("2")),
+        "statuses": statuses,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "throughput_rps": requests / elapsed,
+        "peak_rss_mb": peak_rss / (1024 * 1024),
+    }
+
+
+async def seed_users(client, run_id: str) -> list:
+    users = []
+    for i in range(SEED_USERS):
+        email = f"seed-{run_id}-{i}@example.com"
+        response = await client.post("/users/", data={
+            "first_name": "Seed", "last_name": "User", "email_id": email,
+            "mobile_number": f"7{i:09d}", "college_name": "Bench College", "password": PASSWORD,
+        })
+        response.raise_for_status()
+        response = await client.post("/login", json={"username": email, "password": PASSWORD})
+        response.raise_for_status()
+        users.append((email, response.json()["access_token"]))
+    return users
+
+
+async def run(args, selected: list) -> dict:
+    import httpx
+    from database import SessionLocal, engine
+    from mailer import DeliveryWorker, SMTPConnectionPool, POLL_INTERVAL, SMTP_HOST, SMTP_PORT
+    from startup import migrate
+    import main
+
+    smtp = StubSMTPServer()
+    await smtp.start(SMTP_PORT)
+    await migrate(engine)
+    await main.app.router.startup()
+
+    pool = SMTPConnectionPool(host=SMTP_HOST, port=SMTP_PORT, size=2, starttls=False)
+    mailer = DeliveryWorker(SessionLocal, pool, poll_interval=POLL_INTERVAL)
+    mailer_task = asyncio.create_task(mailer.run_forever(report_every=float("inf")))
+
+    results = {}
+    run_id = str(int(time.time()))
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            users = await seed_users(client, run_id)
+            for scenario in build_scenarios(users, run_id):
+                if scenario.name not in selected:
+                    continue
+                requests = max(int(scenario.requests * args.scale), 1)
+                passes = [await run_scenario(client, scenario, requests, args.concurrency, first=n * requests)
+                          for n in range(args.repeat)]
+                results[scenario.name] = merge_passes(passes)
+                print(format_result(scenario.name, results[scenario.name]))
+
+        # Let the mailer and the ingest pipeline finish what the scenarios queued
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline and (
+                await pending_mail(SessionLocal) or main.ingest_pipeline.in_flight
+                or await main.ingest_pipeline.count_backlog()):
+            main.ingest_pipeline.wake()
+            await asyncio.sleep(0.2)
+        print(f"mail: {smtp.messages} delivered to the stub SMTP server, {mailer.stats()}")
+        print(f"ingest: {main.ingest_pipeline.stats()}")
+    finally:
+        mailer_task.cancel()
+        await asyncio.gather(mailer_task, return_exceptions=True)
+        await main.app.router.shutdown()
+        # The shutdown hook only cancels the background tasks; let every one of them
+        # unwind before the loop closes
+        await asyncio.gather(*main.background_tasks(), return_exceptions=True)
+        # smtplib blocks, and the stub server answering its QUITs runs on this loop
+        await asyncio.to_thread(pool.close)
+        await smtp.close()
+        await engine.dispose()
+    return results
+
+
+async def pending_mail(session_factory) -> int:
+    from sqlalchemy import func, select
+    from models import EmailOutbox
+
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(EmailOutbox).where(EmailOutbox.status == "pending"))
+
+
+def merge_passes(passes: list) -> dict:
+    """Median of each metric over repeated passes; request and error counts are summed."""
+    merged = {key: statistics.median(result[key] for result in passes)
+              for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms", "throughput_rps", "peak_rss_mb")}
+    statuses = {}
+    for result in passes:
+        for status, count in result["statuses"].items():
+            statuses[status] = statuses.get(status, 0) + count
+    return {
+        "requests": sum(result["requests"] for result in passes),
+        "passes": len(passes),
+        "concurrency": passes[0]["concurrency"],
+        "errors": sum(result["errors"] for result in passes),
+        "statuses": statuses,
+        **merged,
+    }
+
+
+def format_result(name: str, result: dict) -> str:
+    return (f"{name:19} n={result['requests']:<4} err={result['errors']:<3} "
+            f"p50={result['p50_ms']:8.1f}ms p95={result['p95_ms']:8.1f}ms p99={result['p99_ms']:8.1f}ms "
+            f"{result['throughput_rps']:8.1f} req/s  rss={result['peak_rss_mb']:6.1f}MB")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of `results` against `baseline`, as printable lines."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["errors"] > base["errors"]:
+            regressions.append(f"{name}: {result['errors']} failed requests (baseline {base['errors']})")
+        for metric, direction in COMPARED_METRICS.items():
+            if not base[metric]:
+                continue
+            change = (result[metric] - base[metric]) / base[metric]
+            if change * direction > tolerance:
+                regressions.append(f"{name}: {metric} {result[metric]:.1f} vs baseline {base[metric]:.1f} "
+                                   f"({change:+.0%})")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    names = ["signup", "login", "profile", "virtual_internship", "seminar", "webinar",
+             "research_paper", *UPLOAD_SIZES]
+    selected = args.scenarios.split(",") if args.scenarios else names
+    unknown = set(selected) - set(names)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}; choose from {', '.join(names)}")
+
+    workdir = tempfile.mkdtemp(prefix="bench_endpoints_")
+    output = os.path.abspath(args.output) if args.output else os.path.join(workdir, "results.json")
+    baseline_path = os.path.abspath(args.baseline)
+    setup_environment(workdir, free_port())
+    results = asyncio.run(run(args, selected))
+
+    report = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "scale": args.scale,
+        "scenarios": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.save_baseline:
+        if os.path.exists(baseline_path):
+            # Keep baseline entries for scenarios this run skipped
+            with open(baseline_path) as f:
+                report["scenarios"] = {**json.load(f)["scenarios"], **results}
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {baseline_path}")
+        return
+
+    if not os.path.exists(baseline_path):
+        print(f"no baseline at {baseline_path}; run with --save-baseline to create one")
+        return
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline["scenarios"], args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if regressions:
+        sys.exit(1)
+    print(f"no regressions against {baseline_path} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
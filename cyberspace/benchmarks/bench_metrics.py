@@ -0,0 +1,58 @@
+"""Hot-path cost of the /metrics instrumentation.
+
+Run from the cyberspace directory:
+
+    python benchmarks/bench_metrics.py --requests 20000
+
+Measures requests/s of a FastAPI app with one small JSON route, called
+directly over ASGI, with and without MetricsMiddleware, and the time of a
+single histogram observation and counter increment (what every query, hash
+and upload pays).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from bench_cors import build_app, requests_per_second, scope_for
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    return parser.parse_args()
+
+
+def nanoseconds_per_call(fn, calls: int = 200000) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+async def main():
+    args = parse_args()
+    from prometheus_client import Counter, Histogram
+    from metrics import MetricsMiddleware
+
+    scope = scope_for("GET", [(b"host", b"127.0.0.1:8000")])
+    plain = await requests_per_second(build_app(lambda app: None), scope, args.requests)
+    timed = await requests_per_second(build_app(lambda app: app.add_middleware(MetricsMiddleware)), scope, args.requests)
+    print(f"requests={args.requests}")
+    print(f"without metrics {plain:8.0f} req/s   with metrics {timed:8.0f} req/s   "
+          f"({(1 / timed - 1 / plain) * 1e6:+.1f} us per request)")
+
+    # registry=None: measured, never exported
+    histogram = Histogram("bench_seconds", "bench", ("operation",), registry=None).labels("SELECT")
+    counter = Counter("bench_total", "bench", registry=None)
+    print(f"histogram observe {nanoseconds_per_call(lambda: histogram.observe(0.003)):6.0f} ns")
+    print(f"counter inc       {nanoseconds_per_call(counter.inc):6.0f} ns")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""Latency of GET /research-paper/search's query over a large paper table.
+
+Run from the cyberspace directory:
+
+    python benchmarks/bench_paper_search.py --papers 200000 --queries 200
+
+Builds a scratch SQLite database from the Alembic migrations (so the FTS5
+table and its triggers are the real ones), inserts --papers synthetic papers
+through the ORM table so the triggers index them incrementally, then times
+crud.search_research_papers for random one- to three-word queries. Words are
+drawn from a Zipf-distributed vocabulary, like real text: a few very common
+terms and a long tail of rare ones.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+WORDS = [
+    "learning", "deep", "neural", "network", "crop", "yield", "soil", "climate", "quantum", "graph",
+    "protein", "folding", "robot", "vision", "language", "model", "energy", "solar", "battery", "grid",
+    "market", "policy", "health", "cancer", "imaging", "genome", "bridge", "concrete", "traffic", "urban",
+    "water", "river", "flood", "drought", "forest", "carbon", "emission", "sensor", "wireless", "security",
+]
+
+
+SYLLABLES = ["ka", "lo", "mi", "tu", "re", "sa", "no", "vi", "de", "pa", "ri", "go", "te", "zu", "mo", "la"]
+VOCABULARY = WORDS + [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES for d in SYLLABLES]
+# Zipf's law: the n-th most common word appears about 1/n as often as the first
+CUM_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--papers", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    return parser.parse_args()
+
+
+def setup_environment(workdir: str):
+    db_path = os.path.join(workdir, "bench.db")
+    with open(os.path.join(workdir, "config.ini"), "w") as f:
+        f.write(
+            "[DEFAULT]\nALGORITHM = HS256\nSECRET_KEY = bench\n"
+            "EMAIL_FROM = bench@example.com\nEMAIL_PASSWORD = bench\n\n"
+            f"[DATABASE]\nURL = sqlite+aiosqlite:///{db_path}\n"
+        )
+    # database.py reads config.ini relative to the working directory
+    os.chdir(workdir)
+
+    from alembic import command
+    from alembic.config import Config
+
+    alembic_config = Config(os.path.join(os.path.dirname(HERE), "alembic.ini"))
+    alembic_config.set_main_option("script_location", os.path.join(os.path.dirname(HERE), "migrations"))
+    command.upgrade(alembic_config, "head")
+
+
+def phrase(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=words))
+
+
+async def run(args):
+    from sqlalchemy import insert
+    from database import engine, SessionLocal
+    from models import ResearchPaper
+    import crud
+
+    rng = random.Random(42)
+    start = time.perf_counter()
+    async with SessionLocal() as db:
+        for offset in range(0, args.papers, 10000):
+            await db.execute(insert(ResearchPaper), [
+                {"paper_title": phrase(rng, 6), "abstract": phrase(rng, 60),
+                 "keywords": phrase(rng, 4), "paper_category": rng.choice(WORDS)}
+                for _ in range(min(10000, args.papers - offset))
+            ])
+        await db.commit()
+    print(f"inserted and indexed {args.papers} papers in {time.perf_counter() - start:.1f}s")
+
+    latencies = []
+    async with SessionLocal() as db:
+        for _ in range(args.queries):
+            query = phrase(rng, rng.randint(1, 3))
+            start = time.perf_counter()
+            await crud.search_research_papers(db, query, args.limit)
+            latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    print(f"queries={args.queries} limit={args.limit} "
+          f"p50={statistics.median(latencies) * 1000:.1f}ms "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms "
+          f"max={latencies[-1] * 1000:.1f}ms")
+
+    await engine.dispose()
+
+
+def main():
+    args = parse_args()
+    # Alembic's env.py runs its own event loop, so migrate before starting ours
+    setup_environment(tempfile.mkdtemp(prefix="bench_paper_search_"))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
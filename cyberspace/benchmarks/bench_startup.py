@@ -0,0 +1,139 @@
+"""Import-to-first-response time of a fresh worker, with and without warm-up.
+
+Run from the cyberspace directory:
+
+    python benchmarks/bench_startup.py --runs 5
+
+Builds a scratch SQLite database from the Alembic migrations with one user,
+then starts --runs fresh Python processes per variant ([APP] WARM_UP on and
+off, both in production mode). Each one imports main, runs the startup hooks
+and immediately sends POST /login and GET /user/profile, which is what a
+worker sees when it rejoins the load balancer during a rolling restart.
+Medians are reported for: import time, time until startup finished, the
+first login and profile requests, the same requests once warm, and import
+to first response.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+EMAIL = "startup@example.com"
+PASSWORD = "startup-bench"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def write_config(workdir: str, db_path: str, warm_up: bool) -> str:
+    path = os.path.join(workdir, f"config-warm-{str(warm_up).lower()}.ini")
+    with open(path, "w") as f:
+        f.write(
+            "[DEFAULT]\nALGORITHM = HS256\nSECRET_KEY = bench\n"
+            "EMAIL_FROM = bench@example.com\nEMAIL_PASSWORD = bench\n\n"
+            f"[DATABASE]\nURL = sqlite+aiosqlite:///{db_path}\n\n"
+            f"[APP]\nMODE = production\nWARM_UP = {str(warm_up).lower()}\n"
+        )
+    return path
+
+
+def setup_environment(workdir: str):
+    db_path = os.path.join(workdir, "bench.db")
+    os.environ["CYBERSPACE_CONFIG"] = write_config(workdir, db_path, warm_up=False)
+    write_config(workdir, db_path, warm_up=True)
+    os.makedirs(os.path.join(workdir, "images"))
+    os.chdir(workdir)
+
+    from alembic import command
+    from alembic.config import Config
+
+    alembic_config = Config(os.path.join(os.path.dirname(HERE), "alembic.ini"))
+    alembic_config.set_main_option("script_location", os.path.join(os.path.dirname(HERE), "migrations"))
+    command.upgrade(alembic_config, "head")
+
+
+async def seed():
+    from database import SessionLocal, engine
+    from service import hasher
+    import crud
+    import schemas
+
+    async with SessionLocal() as db:
+        await crud.create_user(db, schemas.UserCreate(
+            first_name="Start", last_name="Up", email_id=EMAIL,
+            mobile_number="0000000000", college_name="Bench", password=PASSWORD,
+        ))
+    hasher.shutdown()
+    await engine.dispose()
+
+
+def child():
+    """One fresh worker: import, start up, first requests. Prints JSON timings."""
+    started = time.perf_counter()
+    import main
+    from fastapi.testclient import TestClient
+
+    imported = time.perf_counter()
+    timings = {"import": imported - started}
+    with TestClient(main.app) as client:
+        timings["ready"] = time.perf_counter() - started
+        for attempt in ("first", "warm"):
+            start = time.perf_counter()
+            response = client.post("/login", json={"username": EMAIL, "password": PASSWORD})
+            timings[f"{attempt}_login"] = time.perf_counter() - start
+            assert response.status_code == 200, response.text
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+            start = time.perf_counter()
+            response = client.get("/user/profile", headers=headers)
+            timings[f"{attempt}_profile"] = time.perf_counter() - start
+            assert response.status_code == 200, response.text
+        timings["import_to_first_response"] = main.startup_timer.stats()["import_to_first_response_seconds"]
+    print(json.dumps(timings))
+
+
+def run_variant(workdir: str, warm_up: bool, runs: int) -> dict:
+    env = dict(os.environ, CYBERSPACE_CONFIG=os.path.join(workdir, f"config-warm-{str(warm_up).lower()}.ini"))
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", os.path.abspath(__file__), "--child"],
+            cwd=workdir, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: statistics.median(result[key] for result in results) for key in results[0]}
+
+
+def main():
+    args = parse_args()
+    if args.child:
+        child()
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    # Alembic's env.py runs its own event loop, so migrate before starting ours
+    setup_environment(workdir)
+    asyncio.run(seed())
+
+    variants = {"no warm-up": run_variant(workdir, False, args.runs),
+                "warm-up": run_variant(workdir, True, args.runs)}
+    print(f"runs={args.runs} per variant, medians in ms")
+    print(f"{'':28}" + "".join(f"{name:>14}" for name in variants))
+    for key in next(iter(variants.values())):
+        print(f"{key:28}" + "".join(f"{timings[key] * 1000:14.1f}" for timings in variants.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Registration insert throughput with and without the write coalescer.
+
+Run from the cyberspace directory:
+
+    python benchmarks/bench_write_coalescer.py --requests 1000 --concurrency 50 --window-ms 5
+
+Both variants call crud.create_seminar from many concurrent "requests"
+against one SQLite file (synchronous=FULL, so every commit is an fsync):
+
+* "per-request commit" is the default: one transaction per row.
+* "coalesced" routes the same calls through WriteCoalescer, which commits up
+  to --max-batch rows per transaction.
+
+Reports rows/s, commits/s and the per-request latency each variant paid.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=100)
+    return parser.parse_args()
+
+
+def setup_environment(workdir: str) -> str:
+    db_path = os.path.join(workdir, "bench.db")
+    with open(os.path.join(workdir, "config.ini"), "w") as f:
+        f.write(
+            "[DEFAULT]\nALGORITHM = HS256\nSECRET_KEY = bench\n"
+            "EMAIL_FROM = bench@example.com\nEMAIL_PASSWORD = bench\n\n"
+            f"[DATABASE]\nURL = sqlite+aiosqlite:///{db_path}\n"
+        )
+    # database.py reads config.ini relative to the working directory
+    os.chdir(workdir)
+    return db_path
+
+
+def full_sync(dbapi_connection, connection_record):
+    dbapi_connection.execute("PRAGMA synchronous=FULL")
+
+
+async def run_concurrently(handler, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await handler(i)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - start, latencies
+
+
+async def main():
+    args = parse_args()
+    setup_environment(tempfile.mkdtemp(prefix="bench_write_coalescer_"))
+
+    from sqlalchemy import event
+    from coalescer import WriteCoalescer
+    from database import engine, SessionLocal
+    from models import Base, User
+    import crud
+    import schemas
+
+    event.listen(engine.sync_engine, "connect", full_sync)
+    commits = [0]
+    event.listen(engine.sync_engine, "commit", lambda conn: commits.__setitem__(0, commits[0] + 1))
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as db:
+        user = User(email_id="bench@example.com", mobile_number="0")
+        db.add(user)
+        await db.commit()
+
+    seminar = schemas.Seminar(
+        first_name="Bench", email_id="bench@example.com", phone_number="0000000000",
+        course="c", year_of_study="1", seminar_topic="t",
+    )
+
+    async def handler(i):
+        async with SessionLocal() as db:
+            await crud.create_seminar(db, seminar, user.id)
+
+    print(f"requests={args.requests} concurrency={args.concurrency} "
+          f"window={args.window_ms}ms max_batch={args.max_batch}")
+    variants = [
+        ("per-request commit", None),
+        ("coalesced", WriteCoalescer(SessionLocal, window_ms=args.window_ms, max_batch=args.max_batch)),
+    ]
+    results = {}
+    for label, coalescer in variants:
+        crud.write_coalescer = coalescer
+        commits[0] = 0
+        elapsed, latencies = await run_concurrently(handler, args.requests, args.concurrency)
+        latencies.sort()
+        results[label] = args.requests / elapsed
+        print(f"{label:19}: {args.requests / elapsed:8.1f} rows/s  {commits[0] / elapsed:8.1f} commits/s  "
+              f"p50={statistics.median(latencies) * 1000:.1f}ms "
+              f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms")
+    print(f"speedup: {results['coalesced'] / results['per-request commit']:.1f}x")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
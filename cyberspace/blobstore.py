@@ -0,0 +1,225 @@
+"""Content-addressed storage for uploaded papers and profile images.
+
+Blobs are named by the SHA-256 of their content and fanned out over two
+directory levels (`ab/cd/abcd....pdf`), so identical uploads share one file.
+The relative name is what gets stored in ResearchPaper.paper_pdf and
+User.image_filename, and the `blobs` table keeps a reference count per name.
+
+Files can end up unreferenced, e.g. when crud.create_research_paper fails after
+the PDF was written. Clean them up with:
+
+    python blobstore.py gc [--grace-minutes 60] [--dry-run]
+    python blobstore.py import-legacy   # move old uuid-named files into the store
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import time
+from typing import Iterator, Optional
+
+BLOB_NAME = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z]+$")
+TEMP_PREFIX = ".upload-"
+
+
+class BlobStore:
+    def __init__(self, root: str, kind: str):
+        self.root = root
+        self.kind = kind
+
+    @staticmethod
+    def name_for(digest: str, extension: str) -> str:
+        return f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.root, *name.split("/"))
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Path of stored file `name`, or None if it is missing or outside the store."""
+        path = os.path.normpath(self.path_for(name))
+        root = os.path.normpath(self.root)
+        # Dot-files are in-progress uploads, never finished blobs
+        if (name.startswith("/") or not path.startswith(root + os.sep)
+                or os.path.basename(path).startswith(".") or not os.path.isfile(path)):
+            return None
+        return path
+
+    def put(self, temp_path: str, digest: str, extension: str) -> str:
+        """Move a fully written temp file into the store and return its blob name.
+
+        If a blob with the same content already exists the temp file is simply
+        discarded and the existing name returned.
+        """
+        name = self.name_for(digest, extension)
+        path = self.path_for(name)
+        try:
+            if self.reuse(name):
+                os.remove(temp_path)
+                return name
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # mkstemp creates the file owner-only; match what open() would have produced
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def reuse(self, name: str) -> bool:
+        """True if blob `name` is already stored, refreshing its mtime so a concurrent gc run keeps it."""
+        try:
+            os.utime(self.path_for(name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def delete(self, name: str):
+        path = self.path_for(name)
+        os.remove(path)
+        # Drop the fan-out directories once they are empty
+        for directory in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+
+    def iter_blobs(self) -> Iterator[str]:
+        if not os.path.isdir(self.root):
+            return
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, "/")
+                if BLOB_NAME.match(name):
+                    yield name
+
+    def iter_stale_temp_files(self, older_than: float) -> Iterator[str]:
+        if not os.path.isdir(self.root):
+            return
+        for filename in os.listdir(self.root):
+            path = os.path.join(self.root, filename)
+            if filename.startswith(TEMP_PREFIX) and os.path.getmtime(path) < older_than:
+                yield path
+
+
+paper_store = BlobStore("uploads/papers", "paper")
+image_store = BlobStore("images", "image")
+
+
+async def collect_garbage(grace_minutes: float = 60, dry_run: bool = False) -> dict:
+    """Delete blobs that no ResearchPaper or User row references.
+
+    Reference counts are recomputed from the tables rather than trusted, and
+    blobs younger than the grace period are kept so uploads whose row has not
+    been committed yet are not collected from under the request.
+    """
+    from sqlalchemy import delete, func, select, update
+    from database import SessionLocal
+    from image_variants import image_variants
+    from models import Blob, ResearchPaper, User
+
+    cutoff = time.time() - grace_minutes * 60
+    report = {"kept": 0, "deleted": 0, "temp_files_deleted": 0, "bytes_freed": 0}
+
+    async with SessionLocal() as db:
+        counts = {}
+        for column in (ResearchPaper.paper_pdf, User.image_filename):
+            rows = await db.execute(select(column, func.count()).where(column.is_not(None)).group_by(column))
+            for name, count in rows:
+                counts[name] = counts.get(name, 0) + count
+
+        for store in (paper_store, image_store):
+            for name in store.iter_blobs():
+                path = store.path_for(name)
+                if counts.get(name) or os.path.getmtime(path) >= cutoff:
+                    report["kept"] += 1
+                    continue
+                report["deleted"] += 1
+                report["bytes_freed"] += os.path.getsize(path)
+                if not dry_run:
+                    store.delete(name)
+                    if store is image_store:
+                        image_variants.discard(name)
+                    await db.execute(delete(Blob).where(Blob.name == name))
+
+            for path in store.iter_stale_temp_files(cutoff):
+                report["temp_files_deleted"] += 1
+                if not dry_run:
+                    os.remove(path)
+
+        if not dry_run:
+            # Bring the stored counters back in line with the real references
+            blobs = await db.execute(select(Blob.name, Blob.ref_count))
+            for name, ref_count in blobs.all():
+                if counts.get(name, 0) != ref_count:
+                    await db.execute(update(Blob).where(Blob.name == name).values(ref_count=counts.get(name, 0)))
+            await db.commit()
+
+    return report
+
+
+async def import_legacy_files() -> dict:
+    """Move uuid-named files referenced by existing rows into the blob store."""
+    from sqlalchemy import select
+    from database import SessionLocal
+    from models import ResearchPaper, User
+    import crud
+
+    report = {"moved": 0, "deduplicated": 0, "missing": 0}
+
+    async with SessionLocal() as db:
+        for store, model, column, extension in (
+            (paper_store, ResearchPaper, "paper_pdf", ".pdf"),
+            (image_store, User, "image_filename", ".jpg"),
+        ):
+            # Rows sharing a legacy file follow it to the blob it was moved to
+            moved = {}
+            rows = await db.execute(select(model).where(getattr(model, column).is_not(None)))
+            for row in rows.scalars():
+                legacy_name = getattr(row, column)
+                if BLOB_NAME.match(legacy_name):
+                    continue
+                if legacy_name in moved:
+                    report["deduplicated"] += 1
+                    setattr(row, column, moved[legacy_name])
+                    await crud.add_blob_reference(db, moved[legacy_name], store.kind)
+                    await db.commit()
+                    continue
+                legacy_path = os.path.join(store.root, legacy_name)
+                if not os.path.exists(legacy_path):
+                    report["missing"] += 1
+                    continue
+                digest = hashlib.sha256()
+                with open(legacy_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(64 * 1024), b""):
+                        digest.update(chunk)
+                name = store.name_for(digest.hexdigest(), extension)
+                report["deduplicated" if os.path.exists(store.path_for(name)) else "moved"] += 1
+                store.put(legacy_path, digest.hexdigest(), extension)
+                moved[legacy_name] = name
+                setattr(row, column, name)
+                await crud.add_blob_reference(db, name, store.kind)
+                # Commit per file so the rows never point at a file that was moved away
+                await db.commit()
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the content-addressed upload store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    gc = commands.add_parser("gc", help="delete blobs that no row references")
+    gc.add_argument("--grace-minutes", type=float, default=60)
+    gc.add_argument("--dry-run", action="store_true")
+    commands.add_parser("import-legacy", help="move uuid-named uploads into the store")
+    args = parser.parse_args()
+
+    if args.command == "gc":
+        print(asyncio.run(collect_garbage(args.grace_minutes, args.dry_run)))
+    else:
+        print(asyncio.run(import_legacy_files()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Request body size caps for upload endpoints, as a plain ASGI middleware.
+
+Starlette spools a multipart body in full before the endpoint sees the file,
+so a size check in the endpoint (service.store_upload) only runs after an
+oversized upload has already been received. This middleware rejects it up
+front instead:
+
+* a Content-Length over the path's cap gets a 413 without the app running;
+* a body without one (chunked) is counted as it streams, and the read that
+  crosses the cap raises a 413, so at most the cap is ever spooled.
+
+Caps are per path, given as the largest file the endpoint accepts; FORM_OVERHEAD
+is added for the multipart framing and the endpoint's other form fields.
+"""
+from typing import Dict
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+FORM_OVERHEAD = 64 * 1024
+
+
+def too_large(limit: int) -> str:
+    return f"Request body exceeds the {limit} byte limit."
+
+
+class BodySizeLimitMiddleware:
+    def __init__(self, app: ASGIApp, max_file_sizes: Dict[str, int]):
+        self.app = app
+        # path -> largest accepted request body in bytes
+        self.limits = {path: size + FORM_OVERHEAD for path, size in max_file_sizes.items()}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > limit:
+                    response = JSONResponse({"detail": too_large(limit)}, status_code=413)
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def receive_within_limit() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside the app, so FastAPI turns it into the 413 response
+                    raise HTTPException(status_code=413, detail=too_large(limit))
+            return message
+
+        await self.app(scope, receive_within_limit, send)
@@ -0,0 +1,141 @@
+"""Parsing and validation for bulk roster imports (CSV or NDJSON bodies).
+
+The request body is consumed as a stream and turned into rows one line at a
+time, so a roster of any size is never held in memory as a whole. Rows are
+validated in chunks against the same pydantic schema the single-row endpoint
+uses; valid ones are handed back for insertion and invalid ones are reported
+by their 1-based row number.
+
+A line longer than MAX_LINE_LENGTH characters is skipped and reported as a
+failed row without being buffered, and only the first MAX_REPORTED_ERRORS
+failures are listed in detail; the rest are only counted.
+
+Each chunk is inserted and committed on its own (see main.import_roster), so
+an import is not one transaction: if the database fails on a chunk, the
+chunks before it stay imported, the import stops there and the response
+says which rows did not make it.
+"""
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Optional, Type
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+
+CHUNK_SIZE = 1000
+MAX_LINE_LENGTH = 64 * 1024
+MAX_REPORTED_ERRORS = 100
+LINE_TOO_LONG = f"Line is longer than {MAX_LINE_LENGTH} characters"
+
+
+async def iter_lines(body: AsyncIterator[bytes], max_length: int = MAX_LINE_LENGTH) -> AsyncIterator[Optional[str]]:
+    """Yield the body's lines; a line over `max_length` is dropped as it streams and yields None."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    # Pieces of the unfinished last line, kept apart so each chunk is only split once
+    pending = []
+    pending_length = 0
+    too_long = False
+
+    async for data in body:
+        *lines, rest = decoder.decode(data).split("\n")
+        for line in lines:
+            if pending:
+                line = "".join(pending) + line
+                pending, pending_length = [], 0
+            if too_long or len(line) > max_length:
+                too_long = False
+                yield None
+            else:
+                yield line.rstrip("\r")
+        if too_long:
+            continue
+        pending_length += len(rest)
+        if pending_length > max_length:
+            too_long = True
+            pending, pending_length = [], 0
+        elif rest:
+            pending.append(rest)
+
+    line = "".join(pending) + decoder.decode(b"", final=True)
+    if too_long or len(line) > max_length:
+        yield None
+    elif line:
+        yield line.rstrip("\r")
+
+
+async def iter_csv_rows(body: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    """First line is the header; quoted fields may not contain newlines."""
+    header = None
+    async for line in iter_lines(body):
+        if line is None:
+            if header is None:
+                raise HTTPException(status_code=413, detail=f"CSV header: {LINE_TOO_LONG}.")
+            yield {"__error__": LINE_TOO_LONG}
+            continue
+        if not line.strip():
+            continue
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        # Empty cells count as missing, so optional fields fall back to None
+        yield {name: value for name, value in zip(header, values) if value != ""}
+
+
+async def iter_ndjson_rows(body: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    async for line in iter_lines(body):
+        if line is None:
+            yield {"__error__": LINE_TOO_LONG}
+            continue
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            row = {"__error__": f"Invalid JSON: {e.msg}"}
+        yield row if isinstance(row, dict) else {"__error__": "Each line must be a JSON object"}
+
+
+def rows_for_content_type(content_type: str, body: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in ("text/csv", "application/csv"):
+        return iter_csv_rows(body)
+    if media_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return iter_ndjson_rows(body)
+    raise HTTPException(status_code=415, detail="Send the roster as text/csv or application/x-ndjson.")
+
+
+def record_failure(report: dict, row_number: int, messages: list, max_errors: int = MAX_REPORTED_ERRORS):
+    report["failed"] += 1
+    if len(report["errors"]) < max_errors:
+        report["errors"].append({"row": row_number, "errors": messages})
+
+
+async def validated_chunks(rows: AsyncIterator[dict], schema: Type[BaseModel], report: dict,
+                           chunk_size: int = CHUNK_SIZE) -> AsyncIterator[list]:
+    """Yield (first_row, last_row, rows) with the validated rows (as dicts) read
+    from row numbers first_row to last_row; count failures in `report`.
+
+    `report` is {"failed": 0, "errors": []}; "errors" keeps the first
+    MAX_REPORTED_ERRORS failures with their row numbers.
+    """
+    chunk = []
+    row_number = 0
+    first_row = 1
+    async for row in rows:
+        row_number += 1
+        if "__error__" in row:
+            record_failure(report, row_number, [row["__error__"]])
+            continue
+        try:
+            chunk.append(schema.model_validate(row).model_dump())
+        except ValidationError as e:
+            record_failure(report, row_number, [
+                f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+            ])
+        if len(chunk) >= chunk_size:
+            yield first_row, row_number, chunk
+            chunk = []
+            first_row = row_number + 1
+    if chunk:
+        yield first_row, row_number, chunk
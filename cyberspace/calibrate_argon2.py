@@ -0,0 +1,119 @@
+"""Pick argon2 costs that meet a latency and memory budget on this machine.
+
+    python calibrate_argon2.py --target-ms 250 --memory-mb 512 --login-p99-ms 1000
+
+Run it on the hardware the app runs on. It hashes with one process per
+hashing worker at once, the way the app's pool does under load, and:
+
+1. starts from the largest memory cost the budget allows (--memory-mb is
+   shared by all HASH_WORKERS hashing at the same time) and halves it while
+   even one pass is slower than --target-ms, down to 19 MiB;
+2. adds passes (time cost) while the median hash still meets --target-ms.
+
+Memory is filled first because it is what makes argon2 expensive to
+attack; passes only use up the time that is left. Parallelism is 1: the
+pool already keeps every CPU busy with separate hashes.
+
+It prints a [HASHING] section for config.ini, and a HASH_MAX_QUEUE that
+keeps an admitted login within --login-p99-ms: a login may wait behind
+HASH_MAX_QUEUE / HASH_WORKERS other hashes, and anything beyond that is
+rejected with a 429 (see hashing.py). Existing hashes keep working and
+are rehashed with the new costs on each user's next login.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+# RFC 9106 / OWASP floor for argon2id: 19 MiB
+MIN_MEMORY_KIB = 19 * 1024
+
+
+def parse_args():
+    from settings import settings
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target-ms", type=float, default=250, help="median time of one hash")
+    parser.add_argument("--memory-mb", type=float, default=512,
+                        help="memory all hashing workers may use together")
+    parser.add_argument("--login-p99-ms", type=float, default=1000,
+                        help="longest an admitted login should wait for argon2")
+    parser.add_argument("--workers", type=int,
+                        default=settings['DEFAULT'].getint('HASH_WORKERS', fallback=None) or os.cpu_count() or 1)
+    parser.add_argument("--samples", type=int, default=5, help="rounds of concurrent hashes per setting")
+    return parser.parse_args()
+
+
+def time_hash(time_cost: int, memory_cost: int) -> float:
+    """Runs in a worker process: seconds for one hash with these costs."""
+    from hashing import build_context
+
+    context = build_context(time_cost=time_cost, memory_cost=memory_cost, parallelism=1)
+    start = time.perf_counter()
+    context.hash("calibration password")
+    return time.perf_counter() - start
+
+
+def median_ms(pool: ProcessPoolExecutor, workers: int, samples: int, time_cost: int, memory_cost: int) -> float:
+    timings = []
+    for _ in range(samples):
+        timings.extend(pool.map(time_hash, [time_cost] * workers, [memory_cost] * workers))
+    timings.sort()
+    milliseconds = timings[len(timings) // 2] * 1000
+    print(f"  time_cost={time_cost:<3} memory_cost={memory_cost // 1024:>5} MiB  {milliseconds:7.1f} ms")
+    return milliseconds
+
+
+def calibrate(pool: ProcessPoolExecutor, args) -> tuple:
+    memory_cost = max(int(args.memory_mb * 1024 / args.workers) // 1024 * 1024, MIN_MEMORY_KIB)
+    # Warm the workers up so process start-up is not timed
+    list(pool.map(time_hash, [1] * args.workers, [MIN_MEMORY_KIB] * args.workers))
+
+    milliseconds = median_ms(pool, args.workers, args.samples, 1, memory_cost)
+    while milliseconds > args.target_ms and memory_cost > MIN_MEMORY_KIB:
+        memory_cost = max(memory_cost // 2 // 1024 * 1024, MIN_MEMORY_KIB)
+        milliseconds = median_ms(pool, args.workers, args.samples, 1, memory_cost)
+
+    time_cost = 1
+    while True:
+        slower = median_ms(pool, args.workers, args.samples, time_cost + 1, memory_cost)
+        if slower > args.target_ms:
+            break
+        time_cost, milliseconds = time_cost + 1, slower
+    return time_cost, memory_cost, milliseconds
+
+
+def main() -> int:
+    args = parse_args()
+    print(f"calibrating with {args.workers} concurrent workers, target {args.target_ms:g} ms, "
+          f"{args.memory_mb:g} MiB for all workers")
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        time_cost, memory_cost, milliseconds = calibrate(pool, args)
+
+    if memory_cost * args.workers > args.memory_mb * 1024:
+        print(f"warning: {args.workers} workers at the {MIN_MEMORY_KIB // 1024} MiB minimum exceed the {args.memory_mb:g} MiB budget")
+    if milliseconds > args.target_ms:
+        print(f"warning: even the minimum cost takes {milliseconds:.0f} ms here, over the {args.target_ms:g} ms target")
+    # A login admitted with a full queue waits for queue/workers hashes before its own
+    max_queue = max(int((args.login_p99_ms / milliseconds - 1) * args.workers), 0)
+
+    print(f"\nOne hash takes {milliseconds:.0f} ms and {memory_cost // 1024} MiB "
+          f"({args.workers * memory_cost // 1024} MiB with every worker busy).")
+    print(f"With HASH_MAX_QUEUE = {max_queue}, an admitted login waits at most "
+          f"~{(1 + max_queue / args.workers) * milliseconds:.0f} ms for argon2.\n")
+    print("# in [DEFAULT]")
+    print(f"HASH_WORKERS = {args.workers}")
+    print(f"HASH_MAX_QUEUE = {max_queue}\n")
+    print("[HASHING]")
+    print(f"TIME_COST = {time_cost}")
+    print(f"MEMORY_COST = {memory_cost}")
+    print("PARALLELISM = 1")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
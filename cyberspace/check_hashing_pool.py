@@ -0,0 +1,79 @@
+"""Check that the argon2 pool recovers when a worker process dies.
+
+    python check_hashing_pool.py
+
+Starts a HashingExecutor, kills one of its worker processes with SIGKILL
+(what the OOM killer does) while hashes are in flight and again while it is
+idle, and expects every hash and verify to still succeed on a rebuilt pool.
+Exits non-zero if any of them fails.
+"""
+import asyncio
+import os
+import signal
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+
+def setup_environment(workdir: str):
+    with open(os.path.join(workdir, "config.ini"), "w") as f:
+        # Cheap costs: the check is about the pool, not argon2
+        f.write("[HASHING]\nTIME_COST = 1\nMEMORY_COST = 8192\nPARALLELISM = 1\n")
+    # settings.py reads config.ini relative to the working directory
+    os.chdir(workdir)
+
+
+def kill_a_worker(executor) -> int:
+    pid = next(iter(executor._pool._processes))
+    os.kill(pid, signal.SIGKILL)
+    return pid
+
+
+async def run_checks() -> list:
+    from hashing import HashingExecutor
+
+    failures = []
+
+    def expect(case: str, ok: bool):
+        print(f"{'ok  ' if ok else 'FAIL'} {case}")
+        if not ok:
+            failures.append(case)
+
+    executor = HashingExecutor(max_workers=2, max_queue=16)
+    await executor.warm_up()
+    hashed = await executor.hash("pool-check")
+
+    # In flight: every queued call fails with BrokenProcessPool and is retried once
+    calls = [asyncio.ensure_future(executor.verify("pool-check", hashed)) for _ in range(8)]
+    await asyncio.sleep(0.05)
+    first_pool = executor._pool
+    kill_a_worker(executor)
+    results = await asyncio.gather(*calls, return_exceptions=True)
+    expect("calls in flight when a worker dies succeed", results == [True] * 8)
+    expect("the broken pool is replaced once", executor._pool is not first_pool and executor.stats()["restarts"] == 1)
+
+    # Idle: the next call finds the pool broken
+    kill_a_worker(executor)
+    await asyncio.sleep(0.5)
+    try:
+        ok = await executor.verify("pool-check", await executor.hash("pool-check"))
+    except Exception as e:
+        print(f"     {type(e).__name__}: {e}")
+        ok = False
+    expect("a call after an idle worker died succeeds", ok and executor.stats()["restarts"] == 2)
+
+    executor.shutdown()
+    return failures
+
+
+def main() -> int:
+    setup_environment(tempfile.mkdtemp(prefix="hashing_pool_"))
+    failures = asyncio.run(run_checks())
+    print(f"{len(failures)} failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Check the read/write session routing against two local SQLite files.
+
+    python check_replica_routing.py
+
+A scratch primary database is built from the Alembic migrations and a second
+file plays the replica; "replication" is a sqlite3 backup of the primary onto
+it, done whenever the check wants the replica to catch up. The check then
+walks the router through its cases: no lag measured yet, a caught-up
+replica, a user who just wrote, a row that has not replicated, a lagging
+replica and an unreachable one, and fetches /user/profile through the app
+while reads go to the replica. Exits non-zero if any case routes wrongly.
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+MAX_LAG = 0.5
+
+
+def setup_environment(workdir: str) -> tuple:
+    primary = os.path.join(workdir, "primary.db")
+    replica = os.path.join(workdir, "replica.db")
+    with open(os.path.join(workdir, "config.ini"), "w") as f:
+        f.write(
+            "[DEFAULT]\nALGORITHM = HS256\nSECRET_KEY = replica-check\n"
+            "EMAIL_FROM = check@example.com\nEMAIL_PASSWORD = check\n\n"
+            f"[DATABASE]\nURL = sqlite+aiosqlite:///{primary}\n"
+            f"REPLICA_URL = sqlite+aiosqlite:///{replica}\n"
+            f"REPLICA_MAX_LAG = {MAX_LAG}\nREPLICA_HEARTBEAT_INTERVAL = 0.1\n\n"
+            "[APP]\nWARM_UP = false\n"
+        )
+    # settings.py reads config.ini relative to the working directory
+    os.chdir(workdir)
+    return primary, replica
+
+
+def migrate():
+    from alembic import command
+    from alembic.config import Config
+
+    alembic_config = Config(os.path.join(HERE, "alembic.ini"))
+    alembic_config.set_main_option("script_location", os.path.join(HERE, "migrations"))
+    command.upgrade(alembic_config, "head")
+
+
+def replicate(primary: str, replica: str):
+    source, target = sqlite3.connect(primary), sqlite3.connect(replica)
+    source.backup(target)
+    source.close()
+    target.close()
+
+
+async def run_checks(primary: str, replica: str) -> list:
+    import httpx
+    from database import session_router as router
+    from service import hasher
+    import crud
+    import main
+    import schemas
+
+    failures = []
+
+    def expect(case: str, ok: bool):
+        print(f"{'ok  ' if ok else 'FAIL'} {case}")
+        if not ok:
+            failures.append(case)
+
+    def routed_to_replica(**kwargs) -> bool:
+        return router.reader(**kwargs).info.get("replica", False)
+
+    async def catch_up():
+        # Copy the heartbeat the previous check stamped on the primary, then measure
+        replicate(primary, replica)
+        await router.check_lag()
+
+    expect("reads go to the primary before any lag is measured", not routed_to_replica())
+    # The migrations' placeholder heartbeat replicates first; the lag check stamps the real one
+    await catch_up()
+    expect("reads go to the primary until a heartbeat has replicated", not routed_to_replica())
+
+    await catch_up()
+    expect(f"a replica {router.lag * 1000:.0f}ms behind takes the reads", routed_to_replica())
+
+    async with router.writer() as db:
+        user = await crud.create_user(db, schemas.UserCreate(
+            first_name="Replica", last_name="Check", email_id="replica@example.com",
+            mobile_number="0000000000", college_name="Test", password="replica-check",
+        ))
+    token = crud.create_access_token({"sub": user.id})
+    async with router.reader() as db:
+        principal = await router.read(db, crud.get_principal, token)
+    expect("a user missing on the replica is read from the primary",
+           principal.id == user.id and router.missing_on_replica == 1)
+
+    router.wrote(user.id)
+    expect("a user who just wrote reads from the primary", not routed_to_replica(user_id=user.id))
+    expect("other users still read from the replica", routed_to_replica(user_id=user.id + 1))
+
+    # Once their write window is over, the caught-up replica serves the user again
+    await asyncio.sleep(MAX_LAG)
+    await router.check_lag()
+    await catch_up()
+    crud.principal_cache.clear()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+        before = router.replica_reads
+        response = await client.get("/user/profile", headers={"Authorization": f"Bearer {token}"})
+    expect("/user/profile is served from the replica",
+           response.status_code == 200 and response.json()["email_id"] == "replica@example.com"
+           and router.replica_reads > before)
+
+    # Replication stops; the heartbeat on the replica ages past the limit
+    await asyncio.sleep(MAX_LAG * 2)
+    await router.check_lag()
+    expect(f"a replica lagging {router.lag:.1f}s is skipped", not routed_to_replica())
+
+    os.remove(replica)
+    os.mkdir(replica)  # sqlite cannot open a directory
+    try:
+        await router.check_lag()
+    except Exception:
+        pass
+    expect("an unreachable replica is skipped", not routed_to_replica() and router.lag_check_failures == 1)
+
+    hasher.shutdown()
+    return failures
+
+
+def main() -> int:
+    workdir = tempfile.mkdtemp(prefix="replica_routing_")
+    primary, replica = setup_environment(workdir)
+    migrate()
+    started = time.perf_counter()
+    failures = asyncio.run(run_checks(primary, replica))
+    print(f"{len(failures)} failed ({time.perf_counter() - started:.1f}s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Group commit for the single-row registration inserts.
+
+When many requests insert at the same moment, each paying for its own
+transaction commit is the bottleneck. WriteCoalescer collects inserts from
+concurrent requests for up to `window_ms` (the latency budget a request may
+spend waiting) or until `max_batch` rows are queued, writes them all in one
+transaction and hands every waiting request the id generated for its row.
+
+Enabled with [COALESCER] ENABLED = true in config.ini.
+"""
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+
+class WriteCoalescer:
+    def __init__(self, session_factory, window_ms: float = 5, max_batch: int = 100):
+        self.session_factory = session_factory
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        # Strong references, so a batch being written is not garbage collected mid-flight
+        self._tasks = set()
+        self.batches = 0
+        self.rows = 0
+
+    async def insert(self, model, values: dict,
+                     extra: Optional[Callable[..., Awaitable]] = None) -> int:
+        """Queue one row and wait for the batch holding it to commit.
+
+        `extra(db, row)` runs in the same transaction right after the row is
+        added, for bookkeeping that must commit together with it.
+        Returns the new row's primary key.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((model, values, extra, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush_now)
+        return await future
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, batch: list):
+        try:
+            ids = await self._write_transaction(batch)
+        except Exception:
+            # One bad row must not fail its neighbours: retry each on its own
+            for item in batch:
+                future = item[-1]
+                try:
+                    (row_id,) = await self._write_transaction([item])
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(row_id)
+            return
+
+        self.batches += 1
+        self.rows += len(batch)
+        for (_, _, _, future), row_id in zip(batch, ids):
+            # A caller that was cancelled while waiting has already given up on its row
+            if not future.done():
+                future.set_result(row_id)
+
+    async def _write_transaction(self, batch: list) -> list:
+        async with self.session_factory() as db:
+            try:
+                objects = []
+                for model, values, extra, _ in batch:
+                    obj = model(**values)
+                    db.add(obj)
+                    if extra is not None:
+                        await extra(db, obj)
+                    # Flushed one at a time so ids are assigned and extras see earlier rows
+                    await db.flush()
+                    objects.append(obj)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+            return [obj.id for obj in objects]
@@ -0,0 +1,71 @@
+"""CORS as a plain ASGI middleware.
+
+Unlike a BaseHTTPMiddleware subclass this adds no task or stream per request:
+actual requests pass straight through with the CORS headers appended to the
+response start message, so streamed bodies are never buffered, and preflight
+requests are answered here without entering the app at all.
+
+Allowed origins are a set looked up with the raw header bytes; every header
+tuple is built once when the middleware is created.
+"""
+from typing import Iterable
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+ALLOW_METHODS = "GET, POST, PUT, DELETE"
+ALLOW_HEADERS = "X-Custom-Header, Content-Type, Authorization"
+MAX_AGE = 86400
+
+VARY_ORIGIN = (b"vary", b"Origin")
+
+
+class CORSMiddleware:
+    def __init__(self, app: ASGIApp, allowed_origins: Iterable[str], allow_methods: str = ALLOW_METHODS,
+                 allow_headers: str = ALLOW_HEADERS, max_age: int = MAX_AGE):
+        self.app = app
+        common = [(b"access-control-allow-credentials", b"true"), VARY_ORIGIN]
+        # origin bytes -> headers for actual responses / for preflight responses
+        self.simple_headers = {}
+        self.preflight_headers = {}
+        for origin in allowed_origins:
+            allow_origin = (b"access-control-allow-origin", origin.encode("latin-1"))
+            self.simple_headers[origin.encode("latin-1")] = [allow_origin] + common
+            self.preflight_headers[origin.encode("latin-1")] = [
+                allow_origin,
+                (b"access-control-allow-methods", allow_methods.encode("latin-1")),
+                (b"access-control-allow-headers", allow_headers.encode("latin-1")),
+                (b"access-control-max-age", str(max_age).encode("latin-1")),
+                (b"content-length", b"0"),
+            ] + common
+        self.rejected_preflight_headers = [(b"content-length", b"0"), VARY_ORIGIN]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        is_preflight = False
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                is_preflight = True
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        if is_preflight and scope["method"] == "OPTIONS":
+            # Unknown origins get no CORS headers, so the browser blocks the request
+            headers = self.preflight_headers.get(origin, self.rejected_preflight_headers)
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        extra = self.simple_headers.get(origin, (VARY_ORIGIN,))
+
+        async def send_with_cors(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + list(extra)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
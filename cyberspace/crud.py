@@ -1,52 +1,78 @@
-import configparser
+import asyncio
 import datetime
-import random
-import string
 from typing import Optional
 from fastapi import HTTPException, UploadFile
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from service import hash_password, save_image, save_pdf
+from cache import TTLCache
+from coalescer import WriteCoalescer
+from database import SessionLocal, session_router
+from ingest import STAGES as INGEST_STAGES, enqueue_ingest
+from otp_store import create_backend
+from refresh_tokens import RefreshTokenStore
+from search import search_papers
+from metrics import ARGON2_REHASHED
+from service import hash_password, password_needs_rehash, verify_password, save_image, save_pdf
+from settings import settings
 from models import (
     User as UserModel,
     VirtualInternship as VirtualInternshipModel,
     Seminar as SeminarModel,
     Webinar as WebinarModel,
     ResearchPaper as ResearchPaperModel,
-    OTP as OTPModel
+    IngestJob as IngestJobModel,
+    Blob as BlobModel
 )
 from schemas import (
     UserCreate,
     VirtualInternship as VirtualInternshipSchema,
     Seminar as SeminarSchema,
     Webinar as WebinarSchema,
-    ResearchPaper as ResearchPaperSchema
+    ResearchPaper as ResearchPaperSchema,
+    UserProfile as UserProfileSchema,
+    Principal as PrincipalSchema
 )
 import jwt
 from jwt.exceptions import PyJWTError as JWTError
-from passlib.context import CryptContext
 
 
+algorithm = settings['DEFAULT']['ALGORITHM']
+secret_key = settings['DEFAULT']['SECRET_KEY']
 
+otp_backend = create_backend(
+    settings.get('OTP', 'BACKEND', fallback="sql"),
+    secret_key,
+    ttl_minutes=settings.getfloat('OTP', 'TTL_MINUTES', fallback=5),
+)
 
-# Load the configuration from config.ini
-config = configparser.ConfigParser()
-config.read('config.ini')
-
-
-algorithm = config['DEFAULT']['ALGORITHM']
-secret_key = config['DEFAULT']['SECRET_KEY']
+# Access tokens are short-lived; clients renew them with a refresh token (see refresh_tokens.py)
+access_token_minutes = settings.getfloat('AUTH', 'ACCESS_TOKEN_MINUTES', fallback=15)
+refresh_tokens = RefreshTokenStore(
+    secret_key,
+    ttl_days=settings.getfloat('AUTH', 'REFRESH_TOKEN_DAYS', fallback=30),
+)
 
+# Broader SQLite searches are returned newest first instead of ranked (see search.py)
+search_rank_candidates = settings.getint('SEARCH', 'RANK_CANDIDATES', fallback=20000)
 
+# Opt-in group commit for the single-row registration inserts (see coalescer.py)
+write_coalescer = None
+if settings.getboolean('COALESCER', 'ENABLED', fallback=False):
+    write_coalescer = WriteCoalescer(
+        SessionLocal,
+        window_ms=settings.getfloat('COALESCER', 'WINDOW_MS', fallback=5),
+        max_batch=settings.getint('COALESCER', 'MAX_BATCH', fallback=100),
+    )
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 
-def create_user(db: Session, user: UserCreate, image: Optional[UploadFile] = None):
+async def create_user(db: AsyncSession, user: UserCreate, image: Optional[UploadFile] = None):
     # Check if a user with the same email or mobile number already exists
-    existing_user = db.query(UserModel).filter(
+    result = await db.execute(select(UserModel).filter(
         (UserModel.email_id == user.email_id) | 
         (UserModel.mobile_number == user.mobile_number)
-    ).first()
+    ))
+    existing_user = result.scalars().first()
 
     if existing_user:
         raise HTTPException(
@@ -56,7 +82,7 @@ def create_user(db: Session, user: UserCreate, image: Optional[UploadFile] = Non
 
     image_filename = None
     if image:
-        image_filename = save_image(image)
+        image_filename = await save_image(image)
 
     db_user = UserModel(
         first_name=user.first_name,
@@ -64,172 +90,370 @@ def create_user(db: Session, user: UserCreate, image: Optional[UploadFile] = Non
         email_id=user.email_id,
         mobile_number=user.mobile_number,
         college_name=user.college_name,
-        hashed_password=hash_password(user.password),
+        hashed_password=await hash_password(user.password),
         image_filename=image_filename
     )
 
     try:
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        if image_filename:
+            await add_blob_reference(db, image_filename, "image")
+        await db.commit()
+        await db.refresh(db_user)
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=400, 
             detail="A user with this email or mobile number already exists."
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
     return db_user
 
-def get_user(db: Session, user_id: int):
-    return db.query(UserModel).filter(UserModel.id == user_id).first()
-
-def authenticate_user(db: Session, email_id: str, password: str):
-    user = db.query(UserModel).filter(UserModel.email_id == email_id).first()
-    if user and pwd_context.verify(password, user.hashed_password):
+async def get_user(db: AsyncSession, user_id: int):
+    result = await db.execute(select(UserModel).filter(UserModel.id == user_id))
+    return result.scalars().first()
+
+async def authenticate_user(db: AsyncSession, email_id: str, password: str):
+    user = await get_user_by_email(db, email_id)
+    if user and await verify_password(password, user.hashed_password):
+        if password_needs_rehash(user.hashed_password):
+            # The sign-in does not wait for the new hash
+            task = asyncio.create_task(rehash_password(user.id, password, user.hashed_password))
+            rehash_tasks.add(task)
+            task.add_done_callback(rehash_tasks.discard)
         return user
     return None
 
 
+# Rehashes started by authenticate_user, referenced until they finish
+rehash_tasks = set()
+
+
+async def rehash_password(user_id: int, password: str, old_hash: str):
+    """Store `password` hashed with the current argon2 costs, unless the hash changed meanwhile."""
+    try:
+        new_hash = await hash_password(password)
+    except HTTPException:
+        return  # argon2 is busy; the user's next sign-in tries again
+    try:
+        async with SessionLocal() as db:
+            # A password reset since the login wins over the rehash
+            result = await db.execute(
+                update(UserModel)
+                .where(UserModel.id == user_id, UserModel.hashed_password == old_hash)
+                .values(hashed_password=new_hash)
+            )
+            await db.commit()
+        if result.rowcount:
+            ARGON2_REHASHED.inc()
+    except Exception as e:
+        print(f"Rehashing the password of user {user_id} failed: {e}")
+
+
 def create_access_token(data: dict, expires_delta: Optional[datetime.timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.datetime.now(datetime.timezone.utc) + expires_delta
     else:
-        expire = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=15)
+        expire = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=access_token_minutes)
     to_encode.update({"exp": expire, "sub": data.get("sub")})  # Ensure 'sub' is included
     encoded_jwt = jwt.encode(to_encode, secret_key, algorithm=algorithm)
     return encoded_jwt
 
- 
-def get_user_profile(db: Session, token: str):
+
+async def create_refresh_token(db: AsyncSession, user_id: int) -> str:
+    return await refresh_tokens.issue(db, user_id)
+
+
+async def refresh_access_token(db: AsyncSession, refresh_token: str) -> tuple:
+    """Rotate the refresh token and return (access token, new refresh token)."""
+    user_id, new_refresh_token = await refresh_tokens.rotate(db, refresh_token)
+    return create_access_token({"sub": user_id}), new_refresh_token
+
+
+async def revoke_refresh_token(db: AsyncSession, refresh_token: str):
+    await refresh_tokens.revoke(db, refresh_token)
+
+
+def get_user_id_from_token(token: str):
+    # Decode the token to get user data
     try:
-        # Decode the token to get user data
         payload = jwt.decode(token, secret_key, algorithms=[algorithm])
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token has expired")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = payload.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return user_id
+
+
+async def get_user_profile(db: AsyncSession, token: str):
+    try:
+        user_id = get_user_id_from_token(token)
 
         # Fetch user from the database
-        user = db.query(UserModel).filter(UserModel.id == user_id).first()
+        user = await get_user(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         return user
 
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token has expired")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving user profile: {str(e)}")
 
-def get_user_by_email(db: Session, email_id: str):
-    return db.query(UserModel).filter(UserModel.email_id == email_id).first()
-
-def create_virtual_internship(db: Session, internship: VirtualInternshipSchema, user_id: int):
-    db_internship = VirtualInternshipModel(**internship.model_dump(), user_id=user_id)
-    db.add(db_internship)
-    db.commit()
-    db.refresh(db_internship)
-    return db_internship
-
-def create_seminar(db: Session, seminar: SeminarSchema, user_id: int):
-    db_seminar = SeminarModel(**seminar.model_dump(), user_id=user_id)
-    db.add(db_seminar)
-    db.commit()
-    db.refresh(db_seminar)
-    return db_seminar
-
-def create_webinar(db: Session, webinar: WebinarSchema, user_id: int):
-    db_webinar = WebinarModel(**webinar.model_dump(), user_id=user_id)
-    db.add(db_webinar)
-    db.commit()
-    db.refresh(db_webinar)
-    return db_webinar
-
-def create_research_paper(db: Session, research_paper: ResearchPaperSchema, user_id: int):
-    db_paper = ResearchPaperModel(
-        **research_paper.model_dump(),
-        user_id=user_id
-    )
-    db.add(db_paper)
-    db.commit()
-    db.refresh(db_paper)
-
-    return db_paper
 
+# Authenticated principals per user id, so most requests skip the users lookup.
+# crud.update_user_password drops the entry; other workers catch up within the TTL.
+principal_cache = TTLCache(maxsize=10000, ttl=60)
 
 
+async def get_principal(db: AsyncSession, token: str) -> PrincipalSchema:
+    user_id = get_user_id_from_token(token)
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
 
+    result = await db.execute(select(UserModel.id, UserModel.email_id).where(UserModel.id == user_id))
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    principal = PrincipalSchema(id=row.id, email_id=row.email_id)
+    principal_cache.set(user_id, principal)
+    return principal
 
-def generate_otp() -> str:
-    """Generate a 6-digit OTP."""
-    return ''.join(random.choices(string.digits, k=6))
 
-def create_otp(db: Session, user_id: int) -> OTPModel:
-    otp_value = generate_otp()
-    expiry_time = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=5)  # OTP valid for 5 minutes
+def invalidate_principal(user_id: int):
+    principal_cache.invalidate(user_id)
 
-    otp = OTPModel(user_id=user_id, otp=otp_value, expiry=expiry_time)
-    try:
-        db.add(otp)
-        db.commit()
-        db.refresh(otp)
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-    return otp
+# Registration counts per user id. Invalidated by the create_* functions below,
+# but only in this process; other workers see new registrations once the TTL
+# runs out, so it is kept as short as principal_cache's.
+profile_counts_cache = TTLCache(maxsize=10000, ttl=60)
 
+PROFILE_COLUMNS = (
+    UserModel.id,
+    UserModel.first_name,
+    UserModel.last_name,
+    UserModel.email_id,
+    UserModel.mobile_number,
+    UserModel.college_name,
+    UserModel.image_filename,
+)
 
-
-def get_otp(db: Session, otp_value: str) -> OTPModel:
-    otp = db.query(OTPModel).filter(OTPModel.otp == otp_value, OTPModel.used == False).first()
-    
-    if otp is None:
-        raise HTTPException(status_code=404, detail="OTP not found or already used")
-
-    current_time = datetime.datetime.now(datetime.timezone.utc)
-    if otp.expiry.tzinfo is None:
-        otp_expiry_time = otp.expiry.replace(tzinfo=datetime.timezone.utc)
+PROFILE_COUNTS = {
+    "virtual_internships_count": VirtualInternshipModel,
+    "seminars_count": SeminarModel,
+    "webinars_count": WebinarModel,
+    "research_papers_count": ResearchPaperModel,
+}
+
+
+async def get_user_profile_with_counts(db: AsyncSession, token: str) -> UserProfileSchema:
+    """Build the profile in a single round trip.
+
+    With cached counts only the user columns are read; otherwise the counts
+    come back as correlated subqueries in the same SELECT and are cached.
+    """
+    user_id = get_user_id_from_token(token)
+    counts = profile_counts_cache.get(user_id)
+
+    if counts is None:
+        count_columns = [
+            select(func.count()).select_from(model).where(model.user_id == UserModel.id)
+            .scalar_subquery().label(name)
+            for name, model in PROFILE_COUNTS.items()
+        ]
+        result = await db.execute(select(*PROFILE_COLUMNS, *count_columns).where(UserModel.id == user_id))
     else:
-        otp_expiry_time = otp.expiry
+        result = await db.execute(select(*PROFILE_COLUMNS).where(UserModel.id == user_id))
 
+    row = result.mappings().first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="User not found")
 
-    if otp_expiry_time  < current_time:
-        raise HTTPException(status_code=400, detail="OTP has expired")
+    profile = dict(row)
+    if counts is None:
+        counts = {name: profile[name] for name in PROFILE_COUNTS}
+        profile_counts_cache.set(user_id, counts)
+    profile.update(counts)
+    return UserProfileSchema(**profile)
+
+async def get_user_by_email(db: AsyncSession, email_id: str):
+    result = await db.execute(select(UserModel).filter(UserModel.email_id == email_id))
+    return result.scalars().first()
+
+async def insert_registration(db: AsyncSession, model, values: dict, extra=None):
+    """Insert one registration row, through the write coalescer when it is enabled.
+
+    `extra(db, row)` is awaited in the same transaction before the commit.
+    """
+    if write_coalescer is not None:
+        row_id = await write_coalescer.insert(model, values, extra)
+        db_row = model(id=row_id, **values)
+    else:
+        db_row = model(**values)
+        db.add(db_row)
+        if extra is not None:
+            await extra(db, db_row)
+        await db.commit()
+        await db.refresh(db_row)
+    profile_counts_cache.invalidate(values["user_id"])
+    # Their next listings and profile come from the primary, which has the new row
+    session_router.wrote(values["user_id"])
+    return db_row
+
+async def create_virtual_internship(db: AsyncSession, internship: VirtualInternshipSchema, user_id: int):
+    return await insert_registration(db, VirtualInternshipModel, {**internship.model_dump(), "user_id": user_id})
+
+async def create_seminar(db: AsyncSession, seminar: SeminarSchema, user_id: int):
+    return await insert_registration(db, SeminarModel, {**seminar.model_dump(), "user_id": user_id})
+
+async def create_webinar(db: AsyncSession, webinar: WebinarSchema, user_id: int):
+    return await insert_registration(db, WebinarModel, {**webinar.model_dump(), "user_id": user_id})
+
+async def bulk_create_registrations(db: AsyncSession, model, rows: list, user_id: int) -> int:
+    """Insert validated rows in one batched INSERT and a single commit.
+
+    Passed as executemany parameters so the statement is compiled once and
+    cached; the MySQL driver rewrites it into a multi-row VALUES insert.
+    """
+    if not rows:
+        return 0
+    await db.execute(insert(model), [{**row, "user_id": user_id} for row in rows])
+    await db.commit()
+    profile_counts_cache.invalidate(user_id)
+    session_router.wrote(user_id)
+    return len(rows)
+
+async def create_research_paper(db: AsyncSession, research_paper: ResearchPaperSchema, user_id: int):
+    values = {**research_paper.model_dump(), "user_id": user_id}
+
+    async def reference_and_queue(session: AsyncSession, paper: ResearchPaperModel):
+        await add_blob_reference(session, values["paper_pdf"], "paper")
+        # The ingestion job commits with the paper, so no upload is ever left unprocessed
+        await enqueue_ingest(session, paper)
+
+    return await insert_registration(db, ResearchPaperModel, values, reference_and_queue)
+
+async def get_research_paper_pdf(db: AsyncSession, paper_id: int) -> Optional[str]:
+    """Stored blob name of a paper's PDF, or None if there is no such paper."""
+    return await db.scalar(select(ResearchPaperModel.paper_pdf).where(ResearchPaperModel.id == paper_id))
+
+async def get_ingest_job(db: AsyncSession, job_id: int, user_id: int) -> Optional[dict]:
+    """Progress of a paper's ingestion job (the job id is the paper id), or None if not the user's."""
+    result = await db.execute(
+        select(
+            IngestJobModel.paper_id, IngestJobModel.status, IngestJobModel.stage, IngestJobModel.stages_done,
+            IngestJobModel.attempts, IngestJobModel.last_error, IngestJobModel.created_at,
+            IngestJobModel.finished_at, ResearchPaperModel.page_count, ResearchPaperModel.checksum,
+        )
+        .join(ResearchPaperModel, ResearchPaperModel.id == IngestJobModel.paper_id)
+        .where(IngestJobModel.paper_id == job_id, ResearchPaperModel.user_id == user_id)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    return {
+        "job_id": row.paper_id,
+        "status": row.status,
+        "stage": row.stage,
+        "stages_done": row.stages_done,
+        "stages_total": len(INGEST_STAGES),
+        "attempts": row.attempts,
+        "error": row.last_error,
+        "page_count": row.page_count,
+        "checksum": row.checksum,
+        "created_at": row.created_at,
+        "finished_at": row.finished_at,
+    }
+
+async def search_research_papers(db: AsyncSession, query: str, limit: int = 20, offset: int = 0) -> list:
+    """Ranked full-text search over every paper; the index is maintained on insert (see search.py)."""
+    return await search_papers(db, query, limit, offset, rank_candidates=search_rank_candidates)
+
+
+
+
+
+# Columns returned by the per-user registration listings
+REGISTRATION_LIST_COLUMNS = {
+    VirtualInternshipModel: (
+        VirtualInternshipModel.id,
+        VirtualInternshipModel.preferred_internship,
+        VirtualInternshipModel.field_of_study,
+        VirtualInternshipModel.available_start_date,
+    ),
+    SeminarModel: (SeminarModel.id, SeminarModel.seminar_topic, SeminarModel.course, SeminarModel.year_of_study),
+    WebinarModel: (WebinarModel.id, WebinarModel.webinar_topic, WebinarModel.course, WebinarModel.year_of_study),
+    ResearchPaperModel: (
+        ResearchPaperModel.id,
+        ResearchPaperModel.paper_title,
+        ResearchPaperModel.paper_category,
+        ResearchPaperModel.keywords,
+        ResearchPaperModel.paper_pdf,
+    ),
+}
+
+
+async def stream_registrations(db: AsyncSession, model, user_id: int, before_id: Optional[int], limit: int):
+    """Yield one page of a user's registrations, newest first.
+
+    Keyset pagination: the next page starts below the last id seen, so the
+    cost stays the same however deep the client pages.
+    """
+    stmt = select(*REGISTRATION_LIST_COLUMNS[model]).where(model.user_id == user_id)
+    if before_id is not None:
+        stmt = stmt.where(model.id < before_id)
+    result = await db.stream(stmt.order_by(model.id.desc()).limit(limit))
+    async for row in result.mappings():
+        yield dict(row)
+
+
+async def add_blob_reference(db: AsyncSession, name: str, kind: str):
+    # Counted in the caller's transaction so the reference and its row commit together
+    result = await db.execute(
+        update(BlobModel).where(BlobModel.name == name).values(ref_count=BlobModel.ref_count + 1)
+    )
+    if result.rowcount == 0:
+        db.add(BlobModel(name=name, kind=kind, ref_count=1))
 
-    return otp
 
+async def create_otp(db: AsyncSession, user_id: int) -> str:
+    """Issue a new OTP for the user and return it (only its hash is stored)."""
+    return await otp_backend.issue(db, user_id)
 
 
-def delete_otp(db: Session, otp_id: int):
-    otp = db.query(OTPModel).filter(OTPModel.id == otp_id).first()
+async def find_otp_user(db: AsyncSession, otp_value: str) -> int:
+    """The id of the user an OTP was issued to, for reset requests without an email (deprecated)."""
+    return await otp_backend.find_user(db, otp_value)
 
-    if otp is None:
-        raise HTTPException(status_code=404, detail="OTP not found")
 
-    try:
-        db.delete(otp)
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Error deleting OTP: {str(e)}")
+async def verify_otp(db: AsyncSession, user_id: int, otp_value: str):
+    """Check and consume the user's OTP; raises HTTPException if it is invalid or expired."""
+    await otp_backend.verify(db, user_id, otp_value)
 
 
 
-def update_user_password(db: Session, user_id: int, new_password: str):
-    user = get_user(db, user_id)
+async def update_user_password(db: AsyncSession, user_id: int, new_password: str):
+    user = await get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    hashed_password = hash_password(new_password)
+    hashed_password = await hash_password(new_password)
     user.hashed_password = hashed_password
     try:
-        db.commit()
+        # Sessions signed in with the old password cannot be renewed
+        await refresh_tokens.revoke_all(db, user_id)
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error updating password: {str(e)}")
+
+    invalidate_principal(user_id)
@@ -1,18 +1,72 @@
-import configparser
-from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from db_router import SessionRouter, register_metrics
+from metrics import instrument_engine, timed_pool_class
+from settings import settings
 
-config = configparser.ConfigParser()
-config.read('config.ini')
+# An explicit URL (e.g. sqlite+aiosqlite:///./cyberspace.db for local runs) takes
+# precedence over the MySQL credentials below.
+SQLALCHEMY_DATABASE_URL = settings['DATABASE'].get('URL')
 
-db_user = config['DATABASE']['USER']
-db_password = config['DATABASE']['PASSWORD']
-db_host = config['DATABASE']['HOST']
-db_name = config['DATABASE']['DB_NAME']
+if not SQLALCHEMY_DATABASE_URL:
+    db_user = settings['DATABASE']['USER']
+    db_password = settings['DATABASE']['PASSWORD']
+    db_host = settings['DATABASE']['HOST']
+    db_name = settings['DATABASE']['DB_NAME']
 
-SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{db_user}:{db_password}@{db_host}/{db_name}"
+    SQLALCHEMY_DATABASE_URL = f"mysql+aiomysql://{db_user}:{db_password}@{db_host}/{db_name}"
+
+# Optional read replica; reads are routed to it while it is caught up (see db_router.py)
+REPLICA_URL = settings['DATABASE'].get('REPLICA_URL')
+
+# Pool settings, used for both engines:
+#   POOL_SIZE/MAX_OVERFLOW  connections kept open / extra ones allowed during spikes
+#   POOL_TIMEOUT            seconds to wait for a free connection before erroring
+#   POOL_RECYCLE            replace connections older than this many seconds, before
+#                           the server (MySQL wait_timeout) closes them on its side
+#   POOL_PRE_PING           test each reused connection with a ping on checkout
+# SQLite's pools keep no fixed set of connections, so only the last two apply there.
+POOL_SIZE = settings['DATABASE'].getint('POOL_SIZE', fallback=5)
+MAX_OVERFLOW = settings['DATABASE'].getint('MAX_OVERFLOW', fallback=10)
+POOL_TIMEOUT = settings['DATABASE'].getfloat('POOL_TIMEOUT', fallback=30)
+POOL_RECYCLE = settings['DATABASE'].getint('POOL_RECYCLE', fallback=1800)
+POOL_PRE_PING = settings['DATABASE'].getboolean('POOL_PRE_PING', fallback=True)
+
+
+def build_engine(url: str, name: str) -> AsyncEngine:
+    url = make_url(url)
+    # The dialect's usual pool, extended to time checkouts for /metrics
+    pool_class = url.get_dialect().get_pool_class(url)
+    options = {"pool_recycle": POOL_RECYCLE, "pool_pre_ping": POOL_PRE_PING}
+    if issubclass(pool_class, QueuePool):
+        options.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT)
+    engine = create_async_engine(url, poolclass=timed_pool_class(pool_class, name), **options)
+    instrument_engine(engine, name)
+    return engine
+
+
+engine = build_engine(SQLALCHEMY_DATABASE_URL, "primary")
+# expire_on_commit=False so returned ORM objects can still be read after commit
+# without triggering an implicit (and, under asyncio, illegal) lazy refresh.
+SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+replica_engine = None
+ReplicaSessionLocal = None
+if REPLICA_URL:
+    replica_engine = build_engine(REPLICA_URL, "replica")
+    ReplicaSessionLocal = async_sessionmaker(
+        bind=replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False,
+        info={"replica": True},
+    )
+
+session_router = SessionRouter(
+    SessionLocal,
+    ReplicaSessionLocal,
+    max_lag=settings['DATABASE'].getfloat('REPLICA_MAX_LAG', fallback=5.0),
+    heartbeat_interval=settings['DATABASE'].getfloat('REPLICA_HEARTBEAT_INTERVAL', fallback=1.0),
+)
+register_metrics(session_router)
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -0,0 +1,129 @@
+"""Read/write session routing between the primary database and a replica.
+
+Writes always go to the primary. Read-only paths (the authenticated
+principal, /user/profile, search and the registration listings) ask the
+router for a reader, which is a replica session while the replica is caught
+up and a primary session otherwise:
+
+* Lag is measured with a heartbeat: every app worker reads the db_heartbeat
+  row from the replica and then stamps it on the primary with time.time(),
+  so the age of the row on the replica is the replication lag (to within
+  one heartbeat interval, and assuming the workers' clocks agree).
+* The replica is used only while that lag is at most [DATABASE]
+  REPLICA_MAX_LAG and was measured recently. An unreachable replica or a
+  stopped monitor therefore sends reads back to the primary.
+* A user who wrote something in this worker reads from the primary for the
+  next REPLICA_MAX_LAG seconds, so they see their own registrations.
+* A row the replica does not have yet (a user who signed up a moment ago,
+  through any worker) is re-read from the primary (SessionRouter.read).
+
+Without [DATABASE] REPLICA_URL every reader is a primary session and no
+heartbeat runs.
+"""
+import asyncio
+import math
+import time
+from typing import Optional
+from fastapi import HTTPException
+from prometheus_client import Gauge
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from cache import TTLCache
+
+
+class SessionRouter:
+    def __init__(self, primary: async_sessionmaker, replica: Optional[async_sessionmaker] = None,
+                 max_lag: float = 5.0, heartbeat_interval: float = 1.0):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.heartbeat_interval = heartbeat_interval
+        self.lag = None
+        self.checked_at = None
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.missing_on_replica = 0
+        self.lag_check_failures = 0
+        # Users who wrote through this worker within the last max_lag seconds
+        self._recent_writers = TTLCache(maxsize=10000, ttl=max_lag)
+
+    def replica_usable(self) -> bool:
+        if self.replica is None or self.lag is None:
+            return False
+        # An old measurement is no better than a high one: the replica may have stalled since
+        fresh = time.monotonic() - self.checked_at <= max(self.max_lag, 3 * self.heartbeat_interval)
+        return fresh and self.lag <= self.max_lag
+
+    def writer(self) -> AsyncSession:
+        return self.primary()
+
+    def reader(self, user_id: Optional[int] = None) -> AsyncSession:
+        """A replica session if it is caught up (and `user_id` has not just written), else a primary one."""
+        if self.replica_usable() and (user_id is None or self._recent_writers.get(user_id) is None):
+            self.replica_reads += 1
+            return self.replica()
+        self.primary_reads += 1
+        return self.primary()
+
+    def wrote(self, user_id: int):
+        """Send `user_id`'s reads to the primary until the write has surely replicated."""
+        if self.replica is not None:
+            self._recent_writers.set(user_id, True)
+
+    async def read(self, db: AsyncSession, fn, *args):
+        """await fn(db, *args), again on the primary if the replica answered 404."""
+        try:
+            return await fn(db, *args)
+        except HTTPException as e:
+            if e.status_code != 404 or not db.info.get("replica"):
+                raise
+        self.missing_on_replica += 1
+        async with self.primary() as primary_db:
+            return await fn(primary_db, *args)
+
+    async def check_lag(self):
+        from models import DBHeartbeat
+
+        # Read the replica before stamping, or the lag would only ever show the last interval
+        try:
+            async with self.replica() as db:
+                result = await db.execute(select(DBHeartbeat.beat_at).where(DBHeartbeat.id == 1))
+                beat_at = result.scalar_one_or_none()
+            self.lag = None if beat_at is None else max(time.time() - beat_at, 0.0)
+            self.checked_at = time.monotonic()
+        except Exception:
+            self.lag = None
+            self.lag_check_failures += 1
+            raise
+        finally:
+            async with self.primary() as db:
+                await db.execute(update(DBHeartbeat).where(DBHeartbeat.id == 1).values(beat_at=time.time()))
+                await db.commit()
+
+    async def run_monitor(self):
+        while True:
+            try:
+                await self.check_lag()
+            except Exception as e:
+                print(f"Replica lag check failed: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+
+    def stats(self) -> dict:
+        return {
+            "replica_configured": self.replica is not None,
+            "replica_usable": self.replica_usable(),
+            "lag_seconds": self.lag,
+            "max_lag_seconds": self.max_lag,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "missing_on_replica": self.missing_on_replica,
+            "lag_check_failures": self.lag_check_failures,
+        }
+
+
+def register_metrics(router: SessionRouter):
+    lag = Gauge("db_replica_lag_seconds", "Replication lag measured by the heartbeat.")
+    # NaN until the first heartbeat has been read from the replica
+    lag.set_function(lambda: math.nan if router.lag is None else router.lag)
+    usable = Gauge("db_replica_usable", "1 while reads go to the replica.")
+    usable.set_function(lambda: float(router.replica_usable()))
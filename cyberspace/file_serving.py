@@ -0,0 +1,175 @@
+"""Cache-aware responses for stored files (profile images and papers).
+
+serve_file adds what StaticFiles/FileResponse leave out:
+
+* a strong ETag from the file's SHA-256. Content-addressed blob names embed
+  the digest, so those cost nothing; other files are hashed once and the
+  result is kept per (path, mtime, size).
+* If-None-Match, answered with 304 before the file is opened.
+* single byte-range requests (Range / If-Range) with 206 and 416, so large
+  PDFs can be resumed and seeked.
+* Cache-Control chosen by the caller: immutable for content-addressed names,
+  revalidate-every-time otherwise.
+
+Bodies go out through the ASGI zero-copy extension (sendfile) or pathsend
+when the server offers one, and are read in chunks otherwise.
+"""
+import asyncio
+import hashlib
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+from typing import Optional
+import anyio
+from fastapi import HTTPException, Request, Response
+from starlette.types import Receive, Scope, Send
+from blobstore import BLOB_NAME
+from cache import TTLCache
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+PRIVATE_IMMUTABLE = "private, max-age=31536000, immutable"
+PRIVATE_REVALIDATE = "private, no-cache"
+
+CHUNK_SIZE = 64 * 1024
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# (path, mtime_ns, size) -> ETag for files whose name does not carry their digest
+content_etags = TTLCache(maxsize=4096, ttl=3600)
+
+
+def digest_etag(digest: str) -> str:
+    return f'"{digest}"'
+
+
+def name_etag(name: str, variant: str = "") -> Optional[str]:
+    """The ETag of a content-addressed blob name, or None for any other name.
+
+    `variant` tells apart files derived from the blob, e.g. "-w128" for a resized image.
+    """
+    if BLOB_NAME.match(name):
+        return digest_etag(name.rsplit("/", 1)[-1].split(".", 1)[0] + variant)
+    return None
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def content_etag(path: str, stat_result: os.stat_result) -> str:
+    key = (path, stat_result.st_mtime_ns, stat_result.st_size)
+    etag = content_etags.get(key)
+    if etag is None:
+        etag = digest_etag(await asyncio.to_thread(_hash_file, path))
+        content_etags.set(key, etag)
+    return etag
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so a W/ prefix is ignored
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def parse_range(header: str, size: int) -> Optional[tuple]:
+    """(start, end) inclusive for a single byte range; None to send the whole file."""
+    match = RANGE.match(header.strip())
+    if match is None:
+        # Multiple or malformed ranges: serving the whole file is always allowed
+        return None
+    first, last = match.groups()
+    if first == "" and last == "":
+        return None
+    if first == "":
+        length = int(last)
+        if length == 0:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+class StoredFileResponse(Response):
+    """Sends all of a file or one byte range of it, zero-copy where the server allows."""
+
+    def __init__(self, path: str, start: int, end: int, size: int, status_code: int,
+                 headers: dict, media_type: Optional[str]):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.count = end - start + 1
+        self.size = size
+        self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        extensions = scope.get("extensions") or {}
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.pathsend" in extensions and self.count == self.size:
+            await send({"type": "http.response.pathsend", "path": self.path})
+        elif "http.response.zerocopy" in extensions:
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopy", "file": file,
+                            "offset": self.start, "count": self.count, "more_body": False})
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.start)
+                remaining = self.count
+                while remaining:
+                    chunk = await file.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining or not self.count:
+                    # Empty file, or it shrank under us: still end the response
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def serve_file(request: Request, path: str, etag: Optional[str] = None,
+                     cache_control: str = REVALIDATE, media_type: Optional[str] = None,
+                     filename: Optional[str] = None) -> Response:
+    """Respond with the file at `path`, honouring If-None-Match, Range and If-Range."""
+    try:
+        stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    if etag is None:
+        etag = await content_etag(path, stat_result)
+    if media_type is None:
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+    }
+    if filename:
+        headers["Content-Disposition"] = f'inline; filename="{filename}"'
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    size = stat_result.st_size
+    byte_range = None
+    range_header = request.headers.get("range")
+    # If-Range: only honour the range if the client's copy is this exact version
+    if range_header and size and request.headers.get("if-range", etag) == etag:
+        byte_range = parse_range(range_header, size)
+
+    if byte_range is None:
+        return StoredFileResponse(path, 0, size - 1, size, 200, headers, media_type)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StoredFileResponse(path, start, end, size, 206, headers, media_type)
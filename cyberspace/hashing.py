@@ -0,0 +1,175 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from metrics import ARGON2_DURATION, ARGON2_REJECTED
+from settings import settings
+
+
+def build_context(time_cost: Optional[int] = None, memory_cost: Optional[int] = None,
+                  parallelism: Optional[int] = None) -> CryptContext:
+    """An argon2 context with these costs (memory_cost in KiB); None keeps the library default."""
+    options = {}
+    if time_cost:
+        options["argon2__rounds"] = time_cost
+    if memory_cost:
+        options["argon2__memory_cost"] = memory_cost
+    if parallelism:
+        options["argon2__parallelism"] = parallelism
+    return CryptContext(schemes=["argon2"], deprecated="auto", **options)
+
+
+# The one context used for every hash and verify. Its costs come from [HASHING]
+# (pick them with `python calibrate_argon2.py`); hashes made with other costs are
+# still verified and get rehashed on the user's next login.
+# Lives at module level so worker processes build their own copy on import
+pwd_context = build_context(
+    time_cost=settings.getint('HASHING', 'TIME_COST', fallback=None),
+    memory_cost=settings.getint('HASHING', 'MEMORY_COST', fallback=None),
+    parallelism=settings.getint('HASHING', 'PARALLELISM', fallback=None),
+)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+class HashingExecutor:
+    """Runs argon2 in a process pool so request handlers never burn CPU inline.
+
+    At most `max_workers + max_queue` operations are admitted at once, across
+    all endpoints. Calls beyond that are turned away at once with a 429 and a
+    Retry-After estimated from the backlog: waiting for a slot would only hold
+    the request until the client gave up, while the queue ahead of it kept
+    the CPUs busy.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 latency_window: int = 1024):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue if max_queue is not None else self.max_workers * 4
+        self._pool = None
+        self._admitted = 0
+        self._rejected = 0
+        self._restarts = 0
+        self._latencies = {"hash": deque(maxlen=latency_window), "verify": deque(maxlen=latency_window)}
+        self._counts = {"hash": 0, "verify": 0}
+
+    def _ensure_started(self):
+        # Created lazily so importing the module never forks worker processes
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    def busy(self) -> bool:
+        """True while a new hash/verify would be rejected."""
+        return self._admitted >= self.max_workers + self.max_queue
+
+    def retry_after(self) -> int:
+        """Seconds until the work already admitted has likely drained, at least 1."""
+        recent = self._latencies["verify"] or self._latencies["hash"]
+        typical = _percentile(sorted(recent), 0.50) if recent else 0.5
+        return max(1, math.ceil(self._admitted / self.max_workers * typical))
+
+    def reject(self):
+        self._rejected += 1
+        ARGON2_REJECTED.inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Password hashing is busy, please retry shortly",
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    async def _run(self, op: str, fn, *args):
+        self._ensure_started()
+        if self.busy():
+            self.reject()
+
+        self._admitted += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            pool = self._pool
+            try:
+                return await loop.run_in_executor(pool, fn, *args)
+            except BrokenProcessPool:
+                # A worker died (OOM kill, crash) and took the whole pool with it;
+                # start a fresh one and retry once, hashing has no side effects
+                self._restart(pool)
+                if self._pool is None:  # shut down meanwhile
+                    raise
+                return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            self._admitted -= 1
+            elapsed = time.perf_counter() - start
+            self._latencies[op].append(elapsed)
+            ARGON2_DURATION.labels(op).observe(elapsed)
+            self._counts[op] += 1
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        # Every call in flight on the broken pool lands here; only the first replaces it
+        if self._pool is broken:
+            broken.shutdown(wait=False)
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._restarts += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run("verify", _verify, password, hashed_password)
+
+    async def warm_up(self):
+        """Start every worker process and load argon2 in each, outside the request stats.
+
+        The pool only forks a worker when a task finds none idle, so one
+        concurrent hash per worker brings them all up.
+        """
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._pool, _hash, "warm-up") for _ in range(self.max_workers)
+        ))
+
+    def stats(self) -> dict:
+        """Snapshot of queue depth and recent hash/verify latency (seconds)."""
+        latency = {}
+        for op, samples in self._latencies.items():
+            ordered = sorted(samples)
+            latency[op] = {
+                "count": self._counts[op],
+                "p50": _percentile(ordered, 0.50),
+                "p95": _percentile(ordered, 0.95),
+                "p99": _percentile(ordered, 0.99),
+                "max": ordered[-1] if ordered else 0.0,
+            }
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": min(self._admitted, self.max_workers),
+            "queue_depth": max(self._admitted - self.max_workers, 0),
+            "rejected": self._rejected,
+            "restarts": self._restarts,
+            "latency": latency,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def _percentile(ordered: list, fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(int(len(ordered) * fraction), len(ordered) - 1)
+    return ordered[index]
@@ -0,0 +1,187 @@
+"""Resized variants of stored profile images.
+
+`GET /images/{name}?w=N` serves a derivative instead of the original upload:
+
+* w in THUMBNAIL_SIZES - an N x N centre-cropped thumbnail for avatars
+* w == COMPRESSED_WIDTH - the whole image scaled to fit N x N and re-encoded
+  as a progressive JPEG, for full-size views
+
+Variants are made on first request and kept in an on-disk cache outside the
+public images directory. The cache is bounded to [IMAGES] CACHE_MAX_MB and
+evicts least recently used files first. Recency is tracked in memory, so a
+hit never touches the file and its mtime (and with it Last-Modified and the
+ETag of a non content-addressed variant) stays that of the render; after a
+restart the order starts from those mtimes. A variant used within the last
+[IMAGES] EVICT_GRACE_SECONDS is never evicted, so a response that is about to
+stream it still finds the file; the cache may overshoot its bound until then. Concurrent requests for a variant that is still being made wait
+for the same resize.
+
+Originals Pillow cannot decode, or whose pixel count exceeds Pillow's
+decompression bomb limit, get a 422 instead of a server error.
+"""
+import asyncio
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from fastapi import HTTPException
+from blobstore import BlobStore, image_store
+from settings import settings
+
+CACHE_DIR = settings.get('IMAGES', 'CACHE_DIR', fallback="cache/images")
+CACHE_MAX_BYTES = settings.getint('IMAGES', 'CACHE_MAX_MB', fallback=256) * 1024 * 1024
+EVICT_GRACE_SECONDS = settings.getfloat('IMAGES', 'EVICT_GRACE_SECONDS', fallback=60)
+
+THUMBNAIL_SIZES = (64, 128, 256)
+COMPRESSED_WIDTH = 1024
+THUMBNAIL_QUALITY = 80
+COMPRESSED_QUALITY = 75
+
+
+def render_variant(source: str, target: str, width: int):
+    """Write the `width` variant of the image at `source` to `target` (runs on a thread)."""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        # Let the JPEG decoder downscale while decoding; far cheaper than a full decode
+        image.draft("RGB", (width * 2, width * 2))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        if width in THUMBNAIL_SIZES:
+            image = ImageOps.fit(image, (width, width), Image.LANCZOS)
+            options = {"quality": THUMBNAIL_QUALITY, "optimize": True}
+        else:
+            image.thumbnail((width, width), Image.LANCZOS)
+            options = {"quality": COMPRESSED_QUALITY, "optimize": True, "progressive": True}
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".variant-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                image.save(out, "JPEG", **options)
+            os.replace(temp_path, target)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+class VariantCache:
+    def __init__(self, store: BlobStore = image_store, root: str = CACHE_DIR,
+                 max_bytes: int = CACHE_MAX_BYTES, evict_grace: float = EVICT_GRACE_SECONDS):
+        self.store = store
+        self.root = root
+        self.max_bytes = max_bytes
+        self.evict_grace = evict_grace
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # relative path -> size in bytes, least recently used first
+        self._entries = None
+        # relative path -> time.monotonic() of its last render or hit in this process
+        self._last_used = {}
+        self._size = 0
+        self._rendering = {}
+
+    def _load(self):
+        # Rebuild the LRU order from mtimes left by earlier runs
+        files = []
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    if filename.startswith(".variant-"):
+                        os.remove(path)
+                        continue
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, os.path.relpath(path, self.root), stat.st_size))
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(files))
+        self._size = sum(self._entries.values())
+
+    def source_path(self, name: str) -> str:
+        """Path of the original image, rejecting names that escape the store."""
+        path = self.store.resolve(name)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Image not found")
+        return path
+
+    async def get(self, name: str, width: int) -> str:
+        """Return the path of the cached `width` variant of image `name`, making it if needed."""
+        if width not in THUMBNAIL_SIZES and width != COMPRESSED_WIDTH:
+            sizes = ", ".join(str(w) for w in THUMBNAIL_SIZES + (COMPRESSED_WIDTH,))
+            raise HTTPException(status_code=400, detail=f"w must be one of {sizes}")
+        if self._entries is None:
+            self._load()
+        from PIL import Image, UnidentifiedImageError
+
+        source = self.source_path(name)
+        key = os.path.join(str(width), os.path.relpath(source, self.store.root))
+        path = os.path.join(self.root, key)
+
+        if key in self._entries and os.path.exists(path):
+            self.hits += 1
+            self._entries.move_to_end(key)
+            self._last_used[key] = time.monotonic()
+            return path
+
+        self.misses += 1
+        pending = self._rendering.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._render(source, key, path, width))
+            self._rendering[key] = pending
+            pending.add_done_callback(lambda _: self._rendering.pop(key, None))
+        try:
+            await asyncio.shield(pending)
+        except Image.DecompressionBombError:
+            raise HTTPException(status_code=422, detail="Image is too large to resize")
+        except (UnidentifiedImageError, OSError):
+            # Pillow raises OSError for truncated or otherwise undecodable files
+            raise HTTPException(status_code=422, detail="Image could not be resized")
+        return path
+
+    async def _render(self, source: str, key: str, path: str, width: int):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        await asyncio.to_thread(render_variant, source, path, width)
+        self._size -= self._entries.pop(key, 0)
+        self._entries[key] = os.path.getsize(path)
+        self._size += self._entries[key]
+        self._last_used[key] = time.monotonic()
+        self._evict()
+
+    def _evict(self):
+        recent = time.monotonic() - self.evict_grace
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if self._last_used.get(key, float("-inf")) > recent:
+                # Even the least recently used variant may still be about to be served
+                break
+            try:
+                os.remove(os.path.join(self.root, key))
+            except FileNotFoundError:
+                pass
+            self._size -= self._entries.pop(key)
+            self._last_used.pop(key, None)
+            self.evictions += 1
+
+    def discard(self, name: str):
+        """Drop every variant of `name`, e.g. after its original was deleted."""
+        relative = os.path.join(*name.split("/"))
+        for width in THUMBNAIL_SIZES + (COMPRESSED_WIDTH,):
+            key = os.path.join(str(width), relative)
+            if self._entries is not None:
+                self._size -= self._entries.pop(key, 0)
+            self._last_used.pop(key, None)
+            try:
+                os.remove(os.path.join(self.root, key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries or ()),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+image_variants = VariantCache()
@@ -0,0 +1,305 @@
+"""Background ingestion of uploaded research paper PDFs.
+
+POST /research-paper/ only stores the upload and queues a row in
+`ingest_jobs` in the same transaction as the paper, so the request returns at
+once and a restart never loses a job. IngestPipeline, started with the app,
+claims due jobs and runs each through four stages:
+
+1. validate  - the file parses as a PDF, is not encrypted and has pages
+2. extract   - page count and text (capped at MAX_TEXT_CHARS)
+3. checksum  - SHA-256 of the stored file, checked against its blob name
+4. index     - page count, checksum and text written to the paper row, which
+               also updates the full-text search index (see search.py)
+
+The CPU-bound stages run in a process pool so request handlers stay
+responsive. Backpressure comes from two limits: a process only claims as
+many jobs as it has workers, leaving the rest queued in the database, and
+uploads are refused with 503 while more than MAX_BACKLOG jobs are waiting.
+
+Claimed jobs hold a lease that every stage renews; jobs whose worker died
+(crash, deploy, restart) are claimed again once the lease runs out. Invalid
+PDFs fail at once; other errors are retried with exponential backoff.
+"""
+import asyncio
+import datetime
+import hashlib
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from blobstore import BLOB_NAME, BlobStore, paper_store
+from models import IngestJob, ResearchPaper
+from settings import settings
+
+WORKERS = settings.getint('INGEST', 'WORKERS', fallback=1)
+MAX_BACKLOG = settings.getint('INGEST', 'MAX_BACKLOG', fallback=1000)
+MAX_ATTEMPTS = settings.getint('INGEST', 'MAX_ATTEMPTS', fallback=3)
+BACKOFF_SECONDS = settings.getfloat('INGEST', 'BACKOFF_SECONDS', fallback=30)
+POLL_INTERVAL = settings.getfloat('INGEST', 'POLL_INTERVAL', fallback=5.0)
+MAX_PAGES = settings.getint('INGEST', 'MAX_PAGES', fallback=2000)
+MAX_TEXT_CHARS = settings.getint('INGEST', 'MAX_TEXT_CHARS', fallback=200000)
+# A claimed job is hidden from other workers this long after its latest stage
+LEASE_SECONDS = 300
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+STAGES = ("validate", "extract", "checksum", "index")
+
+
+class InvalidPDF(Exception):
+    """The file is not a usable PDF; retrying will not help."""
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+# Stage functions run in worker processes, so they take and return plain values
+def _open_pdf(path: str):
+    from pypdf import PdfReader
+    from pypdf.errors import PyPdfError
+
+    try:
+        reader = PdfReader(path)
+        if reader.is_encrypted and not reader.decrypt(""):
+            raise InvalidPDF("PDF is encrypted")
+        page_count = len(reader.pages)
+    except InvalidPDF:
+        raise
+    except (PyPdfError, ValueError, KeyError, TypeError) as e:
+        raise InvalidPDF(f"Unreadable PDF: {e}")
+    if page_count == 0:
+        raise InvalidPDF("PDF has no pages")
+    if page_count > MAX_PAGES:
+        raise InvalidPDF(f"PDF has {page_count} pages; the limit is {MAX_PAGES}")
+    return reader, page_count
+
+
+def _validate(path: str) -> int:
+    return _open_pdf(path)[1]
+
+
+def _extract(path: str, max_chars: int) -> tuple:
+    reader, page_count = _open_pdf(path)
+    parts = []
+    length = 0
+    for page in reader.pages:
+        try:
+            page_text = page.extract_text() or ""
+        except Exception:
+            # One page pypdf cannot decode should not lose the rest of the paper
+            continue
+        parts.append(page_text)
+        length += len(page_text)
+        if length >= max_chars:
+            break
+    return page_count, "\n".join(parts)[:max_chars]
+
+
+def _checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def enqueue_ingest(db: AsyncSession, paper: ResearchPaper):
+    """Queue `paper` for ingestion; committed by the caller together with the paper."""
+    db.add(IngestJob(paper=paper, status="queued", stages_done=0, attempts=0, next_attempt_at=utcnow()))
+
+
+class IngestPipeline:
+    def __init__(self, session_factory, store: BlobStore = paper_store, workers: int = WORKERS,
+                 max_backlog: int = MAX_BACKLOG, max_attempts: int = MAX_ATTEMPTS,
+                 backoff_seconds: float = BACKOFF_SECONDS, poll_interval: float = POLL_INTERVAL,
+                 max_text_chars: int = MAX_TEXT_CHARS):
+        self.session_factory = session_factory
+        self.store = store
+        self.workers = workers
+        self.max_backlog = max_backlog
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.poll_interval = poll_interval
+        self.max_text_chars = max_text_chars
+        self.backlog = 0
+        self.in_flight = 0
+        self.done = 0
+        self.failed = 0
+        self._pool = None
+        self._wakeup = None
+        self._durations = deque(maxlen=1024)
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        # Created lazily so importing the module never forks worker processes
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def accepting(self) -> bool:
+        """False while the queued backlog is over MAX_BACKLOG; uploads should back off."""
+        return self.backlog < self.max_backlog
+
+    def wake(self):
+        """Start on newly queued jobs now instead of at the next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def claim(self, limit: int) -> list:
+        """Lease up to `limit` due jobs to this process, counting an attempt for each."""
+        now = utcnow()
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(IngestJob.paper_id, ResearchPaper.paper_pdf, IngestJob.attempts)
+                .join(ResearchPaper, ResearchPaper.id == IngestJob.paper_id)
+                # "running" jobs past their lease belong to a worker that went away
+                .where(or_(IngestJob.status == "queued", IngestJob.status == "running"),
+                       IngestJob.next_attempt_at <= now)
+                .order_by(IngestJob.next_attempt_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True, of=IngestJob)
+            )
+            jobs = []
+            for job in result.all():
+                if job.attempts >= self.max_attempts:
+                    # Abandoned mid-run on its last attempt, e.g. the PDF took the process down
+                    self.failed += 1
+                    await db.execute(
+                        update(IngestJob).where(IngestJob.paper_id == job.paper_id)
+                        .values(status="failed", finished_at=now,
+                                last_error="Worker stopped while processing; attempts exhausted")
+                    )
+                    continue
+                await db.execute(
+                    update(IngestJob).where(IngestJob.paper_id == job.paper_id)
+                    .values(status="running", stages_done=0, attempts=job.attempts + 1,
+                            next_attempt_at=now + datetime.timedelta(seconds=LEASE_SECONDS))
+                )
+                jobs.append((job.paper_id, job.paper_pdf, job.attempts + 1))
+            await db.commit()
+            return jobs
+
+    async def count_backlog(self) -> int:
+        async with self.session_factory() as db:
+            self.backlog = await db.scalar(
+                select(func.count()).select_from(IngestJob).where(IngestJob.status == "queued")
+            )
+        return self.backlog
+
+    async def _update_job(self, paper_id: int, **values):
+        async with self.session_factory() as db:
+            await db.execute(update(IngestJob).where(IngestJob.paper_id == paper_id).values(**values))
+            await db.commit()
+
+    async def _enter_stage(self, paper_id: int, index: int):
+        await self._update_job(
+            paper_id, stage=STAGES[index], stages_done=index,
+            next_attempt_at=utcnow() + datetime.timedelta(seconds=LEASE_SECONDS),
+        )
+
+    async def _run_stages(self, paper_id: int, paper_pdf: str, pool: ProcessPoolExecutor):
+        loop = asyncio.get_running_loop()
+        path = self.store.path_for(paper_pdf)
+        if not os.path.exists(path):
+            raise InvalidPDF("Stored PDF is missing")
+
+        await self._enter_stage(paper_id, 0)
+        await loop.run_in_executor(pool, _validate, path)
+
+        await self._enter_stage(paper_id, 1)
+        page_count, text = await loop.run_in_executor(pool, _extract, path, self.max_text_chars)
+
+        await self._enter_stage(paper_id, 2)
+        checksum = await loop.run_in_executor(pool, _checksum, path)
+        # Content-addressed names embed the digest; legacy uuid names carry none
+        if BLOB_NAME.match(paper_pdf) and not paper_pdf.split("/")[-1].startswith(checksum):
+            raise InvalidPDF("Stored PDF does not match its checksum")
+
+        await self._enter_stage(paper_id, 3)
+        async with self.session_factory() as db:
+            await db.execute(
+                update(ResearchPaper).where(ResearchPaper.id == paper_id)
+                .values(page_count=page_count, checksum=checksum, full_text=text)
+            )
+            await db.execute(
+                update(IngestJob).where(IngestJob.paper_id == paper_id)
+                .values(status="done", stage=None, stages_done=len(STAGES),
+                        last_error=None, finished_at=utcnow())
+            )
+            await db.commit()
+
+    async def process(self, paper_id: int, paper_pdf: str, attempts: int):
+        start = time.perf_counter()
+        pool = self._ensure_pool()
+        try:
+            await self._run_stages(paper_id, paper_pdf, pool)
+            self.done += 1
+            self._durations.append(time.perf_counter() - start)
+        except InvalidPDF as e:
+            self.failed += 1
+            await self._update_job(paper_id, status="failed", last_error=str(e)[:300], finished_at=utcnow())
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and self._pool is pool:
+                # A worker process died; start a fresh pool for the retries. Every job
+                # running on the broken pool lands here, only the first replaces it
+                pool.shutdown(wait=False)
+                self._pool = None
+            values = {"last_error": f"{type(e).__name__}: {e}"[:300]}
+            if attempts >= self.max_attempts:
+                self.failed += 1
+                values.update(status="failed", finished_at=utcnow())
+            else:
+                backoff = self.backoff_seconds * 2 ** (attempts - 1)
+                values.update(status="queued",
+                              next_attempt_at=utcnow() + datetime.timedelta(seconds=backoff))
+            await self._update_job(paper_id, **values)
+
+    async def run_forever(self):
+        self._wakeup = asyncio.Event()
+        tasks = set()
+
+        async def run_job(paper_id, paper_pdf, attempts):
+            try:
+                await self.process(paper_id, paper_pdf, attempts)
+            finally:
+                self.in_flight -= 1
+                self._wakeup.set()
+
+        while True:
+            try:
+                await self.count_backlog()
+                # Never hold more jobs than there are workers; the rest wait in the table
+                free = self.workers - self.in_flight
+                for job in (await self.claim(free) if free > 0 else []):
+                    self.in_flight += 1
+                    task = asyncio.create_task(run_job(*job))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            except Exception as e:
+                print(f"Ingest pipeline poll failed: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        ordered = sorted(self._durations)
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "backlog": self.backlog,
+            "done": self.done,
+            "failed": self.failed,
+            "duration_p50": ordered[len(ordered) // 2] if ordered else 0.0,
+            "duration_max": ordered[-1] if ordered else 0.0,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
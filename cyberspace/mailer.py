@@ -0,0 +1,342 @@
+"""Durable outbox for outgoing email and the worker that delivers it.
+
+Request handlers only insert rows into `email_outbox` (see enqueue_email), so
+a crash or restart never loses queued mail. Delivery happens in a separate
+process:
+
+    python mailer.py
+
+The worker keeps a small pool of authenticated SMTP connections open, claims
+due messages in batches, spreads each batch over the pooled connections and
+retries failures with exponential backoff.
+
+Bodies can hold secrets (OTP emails carry the code in the clear), so a
+message's body is blanked as soon as it is sent or has finally failed, and
+finished rows are deleted after [SMTP] KEEP_FINISHED_HOURS (default 24).
+
+Send latency and failures are recorded in metrics.py; set [SMTP]
+METRICS_PORT to have this process serve them for Prometheus
+(prometheus_client's HTTP server, on a thread).
+"""
+import asyncio
+import datetime
+import queue
+import smtplib
+import time
+from collections import deque
+from email.message import EmailMessage
+from typing import Optional
+from prometheus_client import start_http_server
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from metrics import SMTP_SEND_DURATION, SMTP_SEND_FAILURES
+from models import EmailOutbox
+from settings import settings
+
+email_from = settings['DEFAULT']['EMAIL_FROM']
+email_password = settings['DEFAULT']['EMAIL_PASSWORD']
+
+SMTP_HOST = settings.get('SMTP', 'HOST', fallback="smtp.gmail.com")
+SMTP_PORT = settings.getint('SMTP', 'PORT', fallback=587)
+SMTP_STARTTLS = settings.getboolean('SMTP', 'STARTTLS', fallback=True)
+SMTP_LOGIN = settings.getboolean('SMTP', 'LOGIN', fallback=True)
+SMTP_POOL_SIZE = settings.getint('SMTP', 'POOL_SIZE', fallback=2)
+BATCH_SIZE = settings.getint('SMTP', 'BATCH_SIZE', fallback=50)
+MAX_ATTEMPTS = settings.getint('SMTP', 'MAX_ATTEMPTS', fallback=5)
+BACKOFF_SECONDS = settings.getfloat('SMTP', 'BACKOFF_SECONDS', fallback=30)
+POLL_INTERVAL = settings.getfloat('SMTP', 'POLL_INTERVAL', fallback=1.0)
+# When set, `python mailer.py` serves its send metrics at http://host:METRICS_PORT/metrics
+METRICS_PORT = settings.getint('SMTP', 'METRICS_PORT', fallback=None)
+# Claimed messages are hidden from other polls for this long; a worker that dies
+# mid-batch therefore has its messages picked up again once the lease runs out.
+CLAIM_LEASE_SECONDS = 300
+# Sent and failed rows are kept this long for inspection, then purged
+KEEP_FINISHED_HOURS = settings.getfloat('SMTP', 'KEEP_FINISHED_HOURS', fallback=24)
+PURGE_INTERVAL_SECONDS = 600
+# Latency samples kept for stats(); the oldest drop out, however long a report period is
+LATENCY_SAMPLES = 1024
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def as_utc(value: datetime.datetime) -> datetime.datetime:
+    # MySQL and SQLite hand DateTime(timezone=True) back without tzinfo
+    return value if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+
+
+async def enqueue_email(db: AsyncSession, to_email: str, subject: str, body: str) -> EmailOutbox:
+    now = utcnow()
+    message = EmailOutbox(
+        to_email=to_email, subject=subject, body=body,
+        status="pending", attempts=0, next_attempt_at=now, created_at=now,
+    )
+    db.add(message)
+    await db.commit()
+    return message
+
+
+class SMTPConnectionPool:
+    """A fixed number of logged-in SMTP sessions, reused across messages."""
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, size: int = SMTP_POOL_SIZE,
+                 starttls: bool = SMTP_STARTTLS, username: Optional[str] = None,
+                 password: Optional[str] = None, idle_check_seconds: float = 30):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.starttls = starttls
+        self.username = username
+        self.password = password
+        self.idle_check_seconds = idle_check_seconds
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put((None, 0.0))
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        return server
+
+    def acquire(self) -> smtplib.SMTP:
+        server, last_used = self._idle.get()
+        try:
+            if server is not None and time.monotonic() - last_used > self.idle_check_seconds:
+                # The server may have dropped an idle session; probe before reuse
+                try:
+                    server.noop()
+                except smtplib.SMTPException:
+                    self._discard(server)
+                    server = None
+            return server or self._connect()
+        except BaseException:
+            self._idle.put((None, 0.0))
+            raise
+
+    def release(self, server: Optional[smtplib.SMTP]):
+        self._idle.put((server, time.monotonic()))
+
+    def send(self, server: smtplib.SMTP, message: EmailMessage) -> smtplib.SMTP:
+        """Send over `server`, reconnecting once if the session went away."""
+        try:
+            server.send_message(message)
+            return server
+        except smtplib.SMTPServerDisconnected:
+            self._discard(server)
+            server = self._connect()
+            server.send_message(message)
+            return server
+
+    @staticmethod
+    def _discard(server: smtplib.SMTP):
+        try:
+            server.close()
+        except Exception:
+            pass
+
+    def close(self):
+        while not self._idle.empty():
+            server, _ = self._idle.get_nowait()
+            if server is not None:
+                try:
+                    server.quit()
+                except smtplib.SMTPException:
+                    self._discard(server)
+
+
+class DeliveryWorker:
+    def __init__(self, session_factory, pool: SMTPConnectionPool, batch_size: int = BATCH_SIZE,
+                 max_attempts: int = MAX_ATTEMPTS, backoff_seconds: float = BACKOFF_SECONDS,
+                 poll_interval: float = POLL_INTERVAL, sender: str = email_from):
+        self.session_factory = session_factory
+        self.pool = pool
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.poll_interval = poll_interval
+        self.sender = sender
+        self.sent = 0
+        self.failed = 0
+        self._send_latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._delivery_latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    async def _claim_batch(self) -> list:
+        now = utcnow()
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(EmailOutbox)
+                .where(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now)
+                .order_by(EmailOutbox.next_attempt_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            batch = result.scalars().all()
+            if batch:
+                lease = now + datetime.timedelta(seconds=CLAIM_LEASE_SECONDS)
+                await db.execute(
+                    update(EmailOutbox)
+                    .where(EmailOutbox.id.in_([m.id for m in batch]))
+                    .values(next_attempt_at=lease)
+                )
+            await db.commit()
+            return batch
+
+    def _build(self, outbox: EmailOutbox) -> EmailMessage:
+        msg = EmailMessage()
+        msg.set_content(outbox.body)
+        msg["Subject"] = outbox.subject
+        msg["From"] = self.sender
+        msg["To"] = outbox.to_email
+        return msg
+
+    def _send_chunk(self, chunk: list) -> list:
+        """Runs on a worker thread: deliver `chunk` over one pooled connection."""
+        results = []
+        try:
+            server = self.pool.acquire()
+        except Exception as e:
+            return [(message.id, None, str(e)) for message in chunk]
+        try:
+            for message in chunk:
+                start = time.perf_counter()
+                try:
+                    server = self.pool.send(server, self._build(message))
+                    elapsed = time.perf_counter() - start
+                    SMTP_SEND_DURATION.observe(elapsed)
+                    results.append((message.id, elapsed, None))
+                except Exception as e:
+                    SMTP_SEND_FAILURES.inc()
+                    results.append((message.id, None, str(e)))
+        finally:
+            self.pool.release(server)
+        return results
+
+    async def run_once(self) -> int:
+        batch = await self._claim_batch()
+        if not batch:
+            return 0
+
+        chunks = [batch[i::self.pool.size] for i in range(self.pool.size)]
+        chunk_results = await asyncio.gather(
+            *(asyncio.to_thread(self._send_chunk, chunk) for chunk in chunks if chunk)
+        )
+
+        by_id = {message.id: message for message in batch}
+        now = utcnow()
+        async with self.session_factory() as db:
+            for results in chunk_results:
+                for message_id, send_latency, error in results:
+                    message = by_id[message_id]
+                    if error is None:
+                        self.sent += 1
+                        self._send_latencies.append(send_latency)
+                        self._delivery_latencies.append((now - as_utc(message.created_at)).total_seconds())
+                        # The body is not needed once delivered and may hold an OTP
+                        values = {"status": "sent", "sent_at": now, "attempts": message.attempts + 1,
+                                  "body": "", "next_attempt_at": now}
+                    else:
+                        attempts = message.attempts + 1
+                        backoff = self.backoff_seconds * 2 ** (attempts - 1)
+                        values = {
+                            "attempts": attempts,
+                            "last_error": error[:300],
+                            "next_attempt_at": now + datetime.timedelta(seconds=backoff),
+                        }
+                        if attempts >= self.max_attempts:
+                            self.failed += 1
+                            values.update(status="failed", body="", next_attempt_at=now)
+                    await db.execute(update(EmailOutbox).where(EmailOutbox.id == message_id).values(**values))
+            await db.commit()
+        return len(batch)
+
+    async def purge(self, keep_hours: float = KEEP_FINISHED_HOURS, batch_size: int = 500) -> int:
+        """Delete sent and failed messages last touched more than `keep_hours` ago."""
+        cutoff = utcnow() - datetime.timedelta(hours=keep_hours)
+        removed = 0
+        async with self.session_factory() as db:
+            while True:
+                # Finished rows have next_attempt_at set to when they finished (see run_once),
+                # so ix_email_outbox_due serves this; select then delete by id: MySQL rejects
+                # LIMIT inside an IN subquery
+                result = await db.execute(
+                    select(EmailOutbox.id)
+                    .where(EmailOutbox.status.in_(("sent", "failed")), EmailOutbox.next_attempt_at < cutoff)
+                    .limit(batch_size)
+                )
+                ids = result.scalars().all()
+                if not ids:
+                    break
+                await db.execute(delete(EmailOutbox).where(EmailOutbox.id.in_(ids)))
+                await db.commit()
+                removed += len(ids)
+                if len(ids) < batch_size:
+                    break
+        return removed
+
+    def stats(self) -> dict:
+        """Delivery counters plus send and enqueue-to-delivery latency (seconds)."""
+        def summary(samples):
+            ordered = sorted(samples)
+            if not ordered:
+                return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+            return {
+                "p50": ordered[len(ordered) // 2],
+                "p95": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+                "max": ordered[-1],
+            }
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "send_latency": summary(self._send_latencies),
+            "delivery_latency": summary(self._delivery_latencies),
+        }
+
+    async def run_forever(self, report_every: float = 60):
+        last_report = time.monotonic()
+        last_purge = 0.0
+        while True:
+            if time.monotonic() - last_purge >= PURGE_INTERVAL_SECONDS:
+                try:
+                    removed = await self.purge()
+                    if removed:
+                        print(f"mailer: purged {removed} finished messages")
+                except Exception as e:
+                    print(f"mailer: purge failed: {e}")
+                last_purge = time.monotonic()
+            delivered = await self.run_once()
+            if time.monotonic() - last_report >= report_every:
+                print(f"mailer: {self.stats()}")
+                self._send_latencies.clear()
+                self._delivery_latencies.clear()
+                last_report = time.monotonic()
+            if delivered < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+
+def main():
+    from database import SessionLocal
+
+    pool = SMTPConnectionPool(
+        username=email_from if SMTP_LOGIN else None,
+        password=email_password if SMTP_LOGIN else None,
+    )
+    worker = DeliveryWorker(SessionLocal, pool)
+
+    async def run():
+        if METRICS_PORT:
+            # The app's /metrics is another process; Prometheus scrapes this one directly
+            start_http_server(METRICS_PORT)
+        await worker.run_forever()
+
+    try:
+        asyncio.run(run())
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
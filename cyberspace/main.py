@@ -1,14 +1,34 @@
+# Imported first so the start-up timings include every other import
+from startup import FirstRequestTimer, prepare, startup_timer
+import asyncio
+import json
 from datetime import datetime, date
 import os
+import time
 from typing import Optional
-from fastapi import FastAPI, Depends, Form, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import FastAPI, Depends, Form, HTTPException, Query, Request, UploadFile, File
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
-from fastapi.staticfiles import StaticFiles
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import EmailStr
-from sqlalchemy.orm import Session
-from service import add_custom_cors_middleware, save_pdf, send_congratulation_email, send_otp_email
-from database import SessionLocal, engine
-from models import Base, VirtualInternship, Seminar, Webinar, ResearchPaper
+from sqlalchemy.ext.asyncio import AsyncSession
+from service import (MAX_IMAGE_SIZE, MAX_PDF_SIZE, add_custom_cors_middleware, hasher, save_pdf,
+                     send_congratulation_email, send_otp_email)
+from bulk_import import rows_for_content_type, validated_chunks
+from blobstore import paper_store
+from body_limit import BodySizeLimitMiddleware
+from database import SessionLocal, engine, replica_engine, session_router
+from file_serving import IMMUTABLE, PRIVATE_IMMUTABLE, PRIVATE_REVALIDATE, REVALIDATE, name_etag, serve_file
+from image_variants import image_variants
+from metrics import MetricsMiddleware
+from ingest import IngestPipeline
+from models import VirtualInternship, Seminar, Webinar, ResearchPaper
+from otp_store import run_sweeper
+from rate_limit import rate_limiter
+from refresh_tokens import run_sweeper as run_refresh_token_sweeper
+from settings import settings
+from sql_profiler import SQLProfilerMiddleware, sql_profiler
 import schemas, crud
 
 
@@ -17,31 +37,109 @@ import schemas, crud
 
 app = FastAPI()
 
+# Inside CORS, so a 413 for an oversized upload still carries the CORS headers
+app.add_middleware(BodySizeLimitMiddleware, max_file_sizes={
+    "/users/": MAX_IMAGE_SIZE,
+    "/research-paper/": MAX_PDF_SIZE,
+})
 add_custom_cors_middleware(app)
-
-Base.metadata.create_all(bind=engine)
+app.add_middleware(FirstRequestTimer)
+if sql_profiler.enabled:
+    # Opt-in ([SQL_PROFILER] ENABLED); no statement is hooked otherwise
+    sql_profiler.install(engine)
+    if replica_engine is not None:
+        sql_profiler.install(replica_engine)
+    app.add_middleware(SQLProfilerMiddleware)
+# Outermost, so request latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-app.mount("/images", StaticFiles(directory="images"), name="images")
+ingest_pipeline = IngestPipeline(SessionLocal)
+
+@app.on_event("startup")
+async def prepare_to_serve():
+    # Runs before the other startup hooks: migrations (development only), then warm-up
+    await prepare(engine, hasher)
+
+@app.on_event("startup")
+async def start_otp_sweeper():
+    app.state.otp_sweeper = asyncio.create_task(run_sweeper(
+        crud.otp_backend,
+        SessionLocal,
+        interval=settings.getfloat('OTP', 'SWEEP_INTERVAL', fallback=60),
+        batch_size=settings.getint('OTP', 'SWEEP_BATCH', fallback=500),
+    ))
+
+@app.on_event("startup")
+async def start_refresh_token_sweeper():
+    app.state.refresh_token_sweeper = asyncio.create_task(run_refresh_token_sweeper(
+        crud.refresh_tokens,
+        SessionLocal,
+        interval=settings.getfloat('AUTH', 'SWEEP_INTERVAL', fallback=3600),
+        batch_size=settings.getint('AUTH', 'SWEEP_BATCH', fallback=500),
+    ))
+
+@app.on_event("startup")
+async def start_ingest_pipeline():
+    # Picks up where the last run stopped: unfinished jobs are still queued in the database
+    app.state.ingest_pipeline = asyncio.create_task(ingest_pipeline.run_forever())
+
+@app.on_event("startup")
+async def start_replica_monitor():
+    # Measures replication lag so reads only go to a caught-up replica (see db_router.py)
+    app.state.replica_monitor = None
+    if session_router.replica is not None:
+        app.state.replica_monitor = asyncio.create_task(session_router.run_monitor())
+
+BACKGROUND_TASKS = ("otp_sweeper", "refresh_token_sweeper", "ingest_pipeline", "replica_monitor")
+
+def background_tasks() -> list:
+    """The tasks the startup hooks above started (none for hooks that did not run)."""
+    tasks = (getattr(app.state, name, None) for name in BACKGROUND_TASKS)
+    return [task for task in tasks if task is not None]
+
+@app.on_event("shutdown")
+def stop_background_work():
+    for task in background_tasks():
+        task.cancel()
+    hasher.shutdown()
+    ingest_pipeline.shutdown()
+    sql_profiler.close()
+
+# Profile images; ?w= selects a cached resized variant (see image_variants.py).
+# Content-addressed names never change, so browsers may keep them forever.
+@app.api_route("/images/{name:path}", methods=["GET", "HEAD"])
+async def get_image(request: Request, name: str, w: Optional[int] = None):
+    source = image_variants.source_path(name)
+    etag = name_etag(name)
+    cache_control = IMMUTABLE if etag else REVALIDATE
+    if w is None:
+        return await serve_file(request, source, etag, cache_control)
+    # A variant is fixed by the original's digest and its width, so it is just as immutable
+    return await serve_file(request, await image_variants.get(name, w), name_etag(name, f"-w{w}"),
+                            cache_control, "image/jpeg")
 
 UPLOAD_DIRECTORY = "./uploads/papers/"
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
+# For read-only endpoints: the replica when it is caught up, otherwise the primary
+async def get_read_db():
+    async with session_router.reader() as db:
+        yield db
 
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_read_db)):
     try:
-        # Use the token to get user details
-        user = crud.get_user_profile(db, token)
+        # Resolve the token to a cached principal; hits need no database round trip.
+        # A user who signed up moments ago may not be on the replica yet: read() retries on the primary
+        user = await session_router.read(db, crud.get_principal, token)
         if user is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
         return user
@@ -52,7 +150,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
 
 @app.post("/users/", response_model=schemas.User)
 async def create_user(
-    background_tasks: BackgroundTasks,
+    http_request: Request,
     first_name: str = Form(...),
     last_name: str = Form(...),
     email_id: EmailStr = Form(...),
@@ -60,8 +158,12 @@ async def create_user(
     college_name: str = Form(...),
     password: str = Form(...),
     image: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    # Turned away before any database or argon2 work (see rate_limit.py)
+    await rate_limiter.check("signup", http_request)
+    if hasher.busy():
+        hasher.reject()
     try:
         user_create = schemas.UserCreate(
             first_name=first_name,
@@ -71,10 +173,10 @@ async def create_user(
             college_name=college_name,
             password=password
         )
-        created_user = crud.create_user(db=db, user=user_create, image=image)
+        created_user = await crud.create_user(db=db, user=user_create, image=image)
 
-        # Send the email in the background
-        background_tasks.add_task(send_congratulation_email, email_id, first_name)
+        # Queue the email in the outbox; the mailer worker delivers it
+        await send_congratulation_email(db, email_id, first_name)
 
         return created_user
     except HTTPException as http_error:
@@ -84,39 +186,77 @@ async def create_user(
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 @app.post("/login", response_model=schemas.Token)
-def login(
+async def login(
     login: schemas.Login,
-    db: Session = Depends(get_db)
+    http_request: Request,
+    db: AsyncSession = Depends(get_db)
 ):
+    await rate_limiter.check("login", http_request, email=login.username)
+    if hasher.busy():
+        hasher.reject()
     try:
-        user = crud.authenticate_user(db, login.username, login.password)
+        user = await crud.authenticate_user(db, login.username, login.password)
         
         if not user:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
         access_token = crud.create_access_token(data={"sub": user.id})
-        return {"access_token": access_token, "token_type": "bearer"}
+        refresh_token = await crud.create_refresh_token(db, user.id)
+        return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
     
+    except HTTPException:
+        # 401 for bad credentials, 429 if argon2 filled up since the check above
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+
+# Renews an expired access token without the password, so only /login pays for argon2.
+# The refresh token is rotated: the one presented stops working (see refresh_tokens.py)
+@app.post("/token/refresh", response_model=schemas.Token)
+async def refresh_token(
+    request: schemas.RefreshRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        access_token, refresh_token = await crud.refresh_access_token(db, request.refresh_token)
+        return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+
+@app.post("/token/revoke")
+async def revoke_token(
+    request: schemas.RefreshRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        await crud.revoke_refresh_token(db, request.refresh_token)
+        return {"message": "Refresh token revoked"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
     
 
 
 @app.post("/forgot-password/")
-def forgot_password(
+async def forgot_password(
     request: schemas.EmailRequest,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    http_request: Request,
+    db: AsyncSession = Depends(get_db)
 ):
+    # Each accepted request emails an OTP, so the target address is limited too
+    await rate_limiter.check("forgot_password", http_request, email=request.email)
     try:
         email = request.email
         print(email)
-        user = crud.get_user_by_email(db, email)
+        user = await crud.get_user_by_email(db, email)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        otp = crud.create_otp(db, user.id)  # Create OTP and return the OTP value
-        background_tasks.add_task(send_otp_email, email, otp.otp)
+        otp = await crud.create_otp(db, user.id)  # Create OTP and return the OTP value
+        await send_otp_email(db, email, otp)
         
         return {"message": "OTP sent"}
     except Exception as e:
@@ -124,38 +264,92 @@ def forgot_password(
     
     
 @app.post("/reset-password/")
-def reset_password(
+async def reset_password(
     reset_password_request: schemas.ResetPassword,
-    db: Session = Depends(get_db)
+    http_request: Request,
+    db: AsyncSession = Depends(get_db)
 ):
+    # Six-digit OTPs can be guessed, so attempts are limited per IP and per account
+    await rate_limiter.check("reset_password", http_request, email=reset_password_request.email)
     try:
-        otp = crud.get_otp(db, otp_value=reset_password_request.otp)
-        if not otp:
-            raise HTTPException(status_code=400, detail="Invalid or expired OTP")
-        
         if reset_password_request.new_password != reset_password_request.confirm_password:
             raise HTTPException(status_code=400, detail="Passwords do not match")
         
-        user = crud.get_user(db, otp.user_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+        if reset_password_request.email is None:
+            # Deprecated: clients from before the email field was added
+            user_id = await crud.find_otp_user(db, reset_password_request.otp)
+        else:
+            user = await crud.get_user_by_email(db, reset_password_request.email)
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+            user_id = user.id
         
-        crud.update_user_password(db, user.id, reset_password_request.new_password)
-        crud.delete_otp(db, otp.id)  # Assuming delete_otp is used here
+        await crud.verify_otp(db, user_id, reset_password_request.otp)  # Consumes the OTP
+        await crud.update_user_password(db, user_id, reset_password_request.new_password)
         
         return {"message": "Password reset successful"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
 
+@app.get("/metrics")
+def prometheus_metrics():
+    # Request, database, argon2, upload and SMTP metrics in the Prometheus text format (see metrics.py)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/metrics/hashing")
+def hashing_metrics():
+    # Queue depth and hash/verify latency of the argon2 process pool
+    return hasher.stats()
+
+
+@app.get("/metrics/rate-limit")
+def rate_limit_metrics():
+    # Configured limits and how many requests each one rejected
+    return rate_limiter.stats()
+
+
+@app.get("/metrics/images")
+def image_metrics():
+    # Size and hit rate of the resized image variant cache
+    return image_variants.stats()
+
+
+@app.get("/metrics/ingest")
+def ingest_metrics():
+    # Backlog, in-flight jobs and processing time of the PDF ingestion pipeline
+    return ingest_pipeline.stats()
+
+
+@app.get("/metrics/database")
+def database_metrics():
+    # Replication lag and how many reads went to the replica (see db_router.py)
+    return session_router.stats()
+
+
+@app.get("/metrics/sql")
+def sql_metrics():
+    # Queries per request by route while the SQL profiler is enabled (see sql_profiler.py)
+    if not sql_profiler.enabled:
+        raise HTTPException(status_code=404, detail="The SQL profiler is not enabled")
+    return sql_profiler.stats()
+
+
+@app.get("/metrics/startup")
+def startup_metrics():
+    # Import, migration and warm-up time of this worker, and how soon it first responded
+    return startup_timer.stats()
+
+
 # @app.get("/users/{user_id}", response_model=schemas.User)
-# def read_user(
+# async def read_user(
 #     user_id: int,
-#     db: Session = Depends(get_db),
-#     user: schemas.User = Depends(get_current_user)  # Authentication applied
+#     db: AsyncSession = Depends(get_db),
+#     user: schemas.Principal = Depends(get_current_user)  # Authentication applied
 # ):
 #     try:
-#         db_user = crud.get_user(db, user_id)
+#         db_user = await crud.get_user(db, user_id)
 #         if db_user is None:
 #             raise HTTPException(status_code=404, detail="User not found")
 #         return db_user
@@ -165,38 +359,16 @@ def reset_password(
 
 
 @app.get("/user/profile", response_model=schemas.UserProfile)
-def get_user_profile(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+async def get_user_profile(
+    token: str = Depends(oauth2_scheme)
 ):
     try:
-        user = crud.get_user_profile(db, token)
-        if user is None:
-            raise HTTPException(status_code=404, detail="User profile not found")
-        
-        # Retrieve counts
-        virtual_internships_count = db.query(VirtualInternship).filter(VirtualInternship.user_id == user.id).count()
-        seminars_count = db.query(Seminar).filter(Seminar.user_id == user.id).count()
-        webinars_count = db.query(Webinar).filter(Webinar.user_id == user.id).count()
-        # research_papers_count = db.query(ResearchPaper).filter(ResearchPaper.user_id == user.id).count()
-
-       
-        # Create and return the UserProfile response model
-        user_profile = schemas.UserProfile(
-            id=user.id,
-            first_name=user.first_name,
-            last_name=user.last_name,
-            email_id=user.email_id,
-            mobile_number=user.mobile_number,
-            college_name=user.college_name,
-            image_filename=user.image_filename,
-            virtual_internships_count=virtual_internships_count,
-            seminars_count=seminars_count,
-            webinars_count=webinars_count,
-            research_papers_count= 0     #research_papers_count
-        )
-        return user_profile
-
+        # User columns and registration counts in one query (counts are cached per user),
+        # from the replica unless this user has just registered for something
+        async with session_router.reader(crud.get_user_id_from_token(token)) as db:
+            return await session_router.read(db, crud.get_user_profile_with_counts, token)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
@@ -217,8 +389,8 @@ async def register_virtual_internship_user(
     available_start_date: str = Form(...),  # Use str to receive date
     preferred_internship: str = Form(...),
     additional_info: Optional[str] = Form(None),  # Optional field
-    db: Session = Depends(get_db),
-    dbuser: schemas.User = Depends(get_current_user)  # Authentication applied
+    db: AsyncSession = Depends(get_db),
+    dbuser: schemas.Principal = Depends(get_current_user)  # Authentication applied
 ):
     try:
         # Convert available_start_date to date
@@ -244,7 +416,7 @@ async def register_virtual_internship_user(
         )
         
         # Register the virtual internship user
-        registered_user = crud.create_virtual_internship(db=db,  internship=virtual_internship, user_id=dbuser.id )
+        registered_user = await crud.create_virtual_internship(db=db,  internship=virtual_internship, user_id=dbuser.id )
         if not registered_user:
             raise HTTPException(status_code=400, detail="Failed to register virtual internship user")
         
@@ -255,7 +427,7 @@ async def register_virtual_internship_user(
 
 
 @app.post("/seminar/")
-def create_seminar(
+async def create_seminar(
     first_name: str = Form(...),
     last_name: Optional[str] = Form(None),
     email_id: EmailStr = Form(...),
@@ -264,8 +436,8 @@ def create_seminar(
     year_of_study: str = Form(...),
     seminar_topic: str = Form(...),
     additional_comments: Optional[str] = Form(None),
-    db: Session = Depends(get_db),
-    dbuser: schemas.User = Depends(get_current_user)  # Authentication applied
+    db: AsyncSession = Depends(get_db),
+    dbuser: schemas.Principal = Depends(get_current_user)  # Authentication applied
 ):
     try:
         seminar = schemas.Seminar(
@@ -278,13 +450,13 @@ def create_seminar(
             seminar_topic=seminar_topic,
             additional_comments=additional_comments
         )
-        created_seminar = crud.create_seminar(db=db, seminar=seminar, user_id=dbuser.id)
+        created_seminar = await crud.create_seminar(db=db, seminar=seminar, user_id=dbuser.id)
         return created_seminar
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
 @app.post("/webinar/")
-def create_webinar(
+async def create_webinar(
     first_name: str = Form(...),
     last_name: Optional[str] = Form(None),
     email_id: EmailStr = Form(...),
@@ -293,8 +465,8 @@ def create_webinar(
     year_of_study: str = Form(...),
     webinar_topic: str = Form(...),
     additional_comments: Optional[str] = Form(None),
-    db: Session = Depends(get_db),
-    dbuser: schemas.User = Depends(get_current_user)  # Authentication applied
+    db: AsyncSession = Depends(get_db),
+    dbuser: schemas.Principal = Depends(get_current_user)  # Authentication applied
 ):
     try:
         webinar = schemas.Webinar(
@@ -307,15 +479,67 @@ def create_webinar(
             webinar_topic=webinar_topic,
             additional_comments=additional_comments
         )
-        created_webinar = crud.create_webinar(db=db, webinar=webinar, user_id=dbuser.id)
+        created_webinar = await crud.create_webinar(db=db, webinar=webinar, user_id=dbuser.id)
         return created_webinar
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
     
 
 
+# Bulk roster import: CSV (with a header row) or NDJSON, streamed
+async def import_roster(request: Request, model, schema, user_id: int, db: AsyncSession) -> dict:
+    rows = rows_for_content_type(request.headers.get("content-type", ""), request.stream())
+    report = {"failed": 0, "errors": []}
+    inserted = 0
+    async for first_row, last_row, chunk in validated_chunks(rows, schema, report):
+        try:
+            inserted += await crud.bulk_create_registrations(db, model, chunk, user_id)
+        except Exception as e:
+            # Each chunk commits on its own: the ones before this stay imported, so
+            # stop and tell the client where to resume instead of a bare 500
+            await db.rollback()
+            raise HTTPException(status_code=500, detail={
+                "message": f"Import stopped by a database error: {str(e)}",
+                "inserted": inserted,
+                "not_imported_from_row": first_row,
+                "failed_chunk": {"first_row": first_row, "last_row": last_row},
+                **report,
+            })
+    # "errors" lists at most the first MAX_REPORTED_ERRORS of the "failed" rows
+    return {"inserted": inserted, **report}
+
+
+@app.post("/seminar/bulk")
+async def bulk_import_seminars(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    dbuser: schemas.Principal = Depends(get_current_user)
+):
+    try:
+        return await import_roster(request, Seminar, schemas.Seminar, dbuser.id, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+
+@app.post("/webinar/bulk")
+async def bulk_import_webinars(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    dbuser: schemas.Principal = Depends(get_current_user)
+):
+    try:
+        return await import_roster(request, Webinar, schemas.Webinar, dbuser.id, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+
+
 @app.post("/research-paper/")
-def create_research_paper(
+async def create_research_paper(
     first_name: str = Form(...),
     last_name: Optional[str] = Form(None),
     email_id: EmailStr = Form(...),
@@ -326,12 +550,18 @@ def create_research_paper(
     keywords: str = Form(...),
     paper_category: str = Form(...),
     paper_pdf: UploadFile = File(...),  # Handling PDF upload
-    db: Session = Depends(get_db),
-    dbuser: schemas.User = Depends(get_current_user) 
+    db: AsyncSession = Depends(get_db),
+    dbuser: schemas.Principal = Depends(get_current_user) 
 ):
+    if not ingest_pipeline.accepting():
+        raise HTTPException(
+            status_code=503,
+            detail="Paper processing is backed up, please retry shortly",
+            headers={"Retry-After": str(int(ingest_pipeline.poll_interval * 6))},
+        )
     try:
         # Save the uploaded PDF using the save_pdf function
-        pdf_filename = save_pdf(paper_pdf)
+        pdf_filename = await save_pdf(paper_pdf)
         # Create the research paper object
         research_paper = schemas.ResearchPaper(
             first_name=first_name,
@@ -347,9 +577,119 @@ def create_research_paper(
         )
 
         # Call the CRUD function to save the research paper in the database
-        created_research_paper = crud.create_research_paper(db=db, research_paper=research_paper, user_id= dbuser.id )
+        created_research_paper = await crud.create_research_paper(db=db, research_paper=research_paper, user_id= dbuser.id )
+        ingest_pipeline.wake()
 
-        return created_research_paper
+        # The PDF is processed in the background; poll /research-paper/jobs/{job_id} for progress
+        return {**jsonable_encoder(created_research_paper), "job_id": created_research_paper.id, "job_status": "queued"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+
+
+# Per-user registration listings (keyset-paginated, streamed as JSON)
+def stream_registration_page(model, user_id: int, before_id: Optional[int], limit: int) -> StreamingResponse:
+    async def body():
+        # The request's own session is closed before a streamed body is sent,
+        # so the generator opens its own (on the replica unless the user has just written)
+        async with session_router.reader(user_id) as db:
+            yield '{"items":['
+            last_id = None
+            count = 0
+            async for row in crud.stream_registrations(db, model, user_id, before_id, limit):
+                yield ("," if count else "") + json.dumps(jsonable_encoder(row))
+                last_id = row["id"]
+                count += 1
+            next_cursor = last_id if count == limit else None
+            yield f'],"next_cursor":{json.dumps(next_cursor)}}}'
+
+    return StreamingResponse(body(), media_type="application/json")
+
+
+@app.get("/virtualInternship/")
+async def list_virtual_internships(
+    before_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    dbuser: schemas.Principal = Depends(get_current_user)
+):
+    return stream_registration_page(VirtualInternship, dbuser.id, before_id, limit)
+
+
+@app.get("/seminar/")
+async def list_seminars(
+    before_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    dbuser: schemas.Principal = Depends(get_current_user)
+):
+    return stream_registration_page(Seminar, dbuser.id, before_id, limit)
+
+
+@app.get("/webinar/")
+async def list_webinars(
+    before_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    dbuser: schemas.Principal = Depends(get_current_user)
+):
+    return stream_registration_page(Webinar, dbuser.id, before_id, limit)
+
+
+@app.get("/research-paper/jobs/{job_id}")
+async def get_ingest_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+    dbuser: schemas.Principal = Depends(get_current_user)
+):
+    job = await crud.get_ingest_job(db, job_id, dbuser.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.api_route("/research-paper/{paper_id}/pdf", methods=["GET", "HEAD"])
+async def download_research_paper(
+    request: Request,
+    paper_id: int,
+    db: AsyncSession = Depends(get_db),
+    dbuser: schemas.Principal = Depends(get_current_user)
+):
+    paper_pdf = await crud.get_research_paper_pdf(db, paper_id)
+    path = paper_store.resolve(paper_pdf) if paper_pdf else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Paper not found")
+    etag = name_etag(paper_pdf)
+    return await serve_file(
+        request, path, etag, PRIVATE_IMMUTABLE if etag else PRIVATE_REVALIDATE,
+        "application/pdf", filename=f"paper-{paper_id}.pdf",
+    )
+
+
+@app.get("/research-paper/search")
+async def search_research_papers(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    db: AsyncSession = Depends(get_read_db),
+    dbuser: schemas.Principal = Depends(get_current_user)
+):
+    try:
+        # One extra row tells us whether another page exists without counting every match
+        hits = await crud.search_research_papers(db, q, limit + 1, offset)
+        return {"results": hits[:limit], "offset": offset, "limit": limit, "has_more": len(hits) > limit}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+
+@app.get("/research-paper/")
+async def list_research_papers(
+    before_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    dbuser: schemas.Principal = Depends(get_current_user)
+):
+    return stream_registration_page(ResearchPaper, dbuser.id, before_id, limit)
+
+
+startup_timer.imported_at = time.perf_counter()
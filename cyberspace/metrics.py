@@ -0,0 +1,166 @@
+"""Prometheus metrics, served at GET /metrics.
+
+Metrics live in prometheus_client's default registry, which also carries the
+client's process and GC collectors. This module defines them and adds what
+the client does not provide: the ASGI middleware that times requests, and
+the SQLAlchemy pool/cursor hooks behind the database metrics.
+
+What is measured:
+
+* HTTP: latency histogram and status counter per method and route template
+  (MetricsMiddleware). Paths that match no route share route="unmatched" so
+  scanners cannot blow up the label set.
+* Database, per engine (primary/replica): pool checkout wait
+  (TimedCheckout), connections checked out and pool size, and query
+  count/duration per statement kind via the cursor events (instrument_engine).
+* argon2 hash/verify durations and busy rejections (hashing.py).
+* Upload size and duration of save_image/save_pdf (service.py).
+* SMTP send latency and failures (mailer.py). The standalone mailer process
+  serves its own metrics when [SMTP] METRICS_PORT is set.
+"""
+import time
+from prometheus_client import Counter, Gauge, Histogram, disable_created_metrics
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# The *_created series would double the counters and histograms without telling us anything
+disable_created_metrics()
+
+# In seconds; HTTP and uploads use the client's default buckets
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+ARGON2_BUCKETS = (0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0, 10.0)
+SIZE_BUCKETS = tuple(16 * 1024 * 4 ** i for i in range(8))  # 16 KiB .. 256 MiB
+
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds", "Time from request start to the end of the response body.",
+    ("method", "route"),
+)
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP responses by status code.", ("method", "route", "status"))
+
+# engine is "primary" or "replica" (see database.py)
+DB_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent getting a connection from the pool, including connecting.",
+    ("engine",), buckets=QUERY_BUCKETS,
+)
+DB_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the pool.", ("engine",))
+DB_POOL_SIZE = Gauge("db_pool_size", "Connections the pool keeps open (excluding overflow).", ("engine",))
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Statement execution time by statement kind.", ("engine", "operation"),
+    buckets=QUERY_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "Statements that raised.", ("engine", "operation"))
+
+ARGON2_DURATION = Histogram(
+    "argon2_duration_seconds", "argon2 hash/verify time once admitted to the worker pool.",
+    ("operation",), buckets=ARGON2_BUCKETS,
+)
+ARGON2_REJECTED = Counter("argon2_rejected_total", "Hash/verify calls turned away with a 429 when busy.")
+ARGON2_REHASHED = Counter(
+    "argon2_rehashed_total", "Password hashes upgraded to the current argon2 costs on login."
+)
+RATE_LIMITED = Counter("rate_limited_total", "Requests rejected by a rate limit.", ("limit",))
+
+UPLOAD_BYTES = Histogram("upload_size_bytes", "Size of stored uploads.", ("kind",), buckets=SIZE_BUCKETS)
+UPLOAD_DURATION = Histogram(
+    "upload_duration_seconds", "Time to stream, check and store an upload.", ("kind",),
+)
+
+SMTP_SEND_DURATION = Histogram("smtp_send_duration_seconds", "Time to hand one message to the SMTP server.")
+SMTP_SEND_FAILURES = Counter("smtp_send_failures_total", "Messages the SMTP server did not accept.")
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and counts responses by route template and status."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route in the (shared) scope on the way in
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_DURATION.labels(method, path).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, path, str(status)).inc()
+
+
+class TimedCheckout:
+    """Pool mixin that records how long each checkout waited for a connection.
+
+    Pools have no "before checkout" event, so the wait is timed around
+    _do_get, which is where a pool blocks (or connects) to hand one out.
+    """
+
+    metrics_engine = "primary"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_CHECKOUT_WAIT.labels(self.metrics_engine).observe(time.perf_counter() - start)
+
+
+def timed_pool_class(pool_class: type, name: str = "primary") -> type:
+    return type(f"Timed{pool_class.__name__}", (TimedCheckout, pool_class), {"metrics_engine": name})
+
+
+QUERY_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "PRAGMA", "EXPLAIN"}
+
+
+def _operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    keyword = words[0].upper() if words else ""
+    return keyword if keyword in QUERY_OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine: AsyncEngine, name: str = "primary"):
+    """Hook query timing and pool gauges onto `engine`, labelled engine=`name`."""
+    sync_engine = engine.sync_engine
+    checked_out_gauge = DB_CHECKED_OUT.labels(name)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERY_DURATION.labels(name, _operation(statement)).observe(
+            time.perf_counter() - context._metrics_started
+        )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def failed_query(exception_context):
+        if exception_context.statement is not None:
+            DB_QUERY_ERRORS.labels(name, _operation(exception_context.statement)).inc()
+
+    # engine.dispose() replaces the pool, so the checkout events go on the engine
+    @event.listens_for(sync_engine, "checkout")
+    def checked_out(dbapi_connection, connection_record, connection_proxy):
+        checked_out_gauge.inc()
+
+    @event.listens_for(sync_engine, "checkin")
+    def checked_in(dbapi_connection, connection_record):
+        checked_out_gauge.dec()
+
+    # NullPool and StaticPool keep no fixed number of connections, so they get no sample
+    if callable(getattr(engine.pool, "size", None)):
+        DB_POOL_SIZE.labels(name).set_function(lambda: engine.pool.size())
+
@@ -0,0 +1,137 @@
+"""baseline schema
+
+Matches what Base.metadata.create_all produced before migrations were
+introduced: the original six tables and nothing else. Databases created that
+way should be marked as up to date with `alembic stamp 0001` and then
+upgraded normally, which adds every later table.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 05:54:41.703985
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('first_name', sa.String(length=50), nullable=True),
+    sa.Column('last_name', sa.String(length=50), nullable=True),
+    sa.Column('email_id', sa.String(length=100), nullable=True),
+    sa.Column('mobile_number', sa.String(length=20), nullable=True),
+    sa.Column('college_name', sa.String(length=50), nullable=True),
+    sa.Column('hashed_password', sa.String(length=255), nullable=True),
+    sa.Column('image_filename', sa.String(length=100), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email_id'),
+    sa.UniqueConstraint('mobile_number')
+    )
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+
+    op.create_table('virtual_internships',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('first_name', sa.String(length=50), nullable=True),
+    sa.Column('last_name', sa.String(length=50), nullable=True),
+    sa.Column('email_id', sa.String(length=100), nullable=True),
+    sa.Column('phone_number', sa.String(length=20), nullable=True),
+    sa.Column('address', sa.String(length=100), nullable=True),
+    sa.Column('highest_qualification', sa.String(length=50), nullable=True),
+    sa.Column('field_of_study', sa.String(length=50), nullable=True),
+    sa.Column('skills_and_strengths', sa.String(length=300), nullable=True),
+    sa.Column('experience', sa.String(length=300), nullable=True),
+    sa.Column('available_start_date', sa.DateTime(), nullable=True),
+    sa.Column('preferred_internship', sa.String(length=100), nullable=True),
+    sa.Column('additional_info', sa.String(length=300), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_virtual_internships_id'), 'virtual_internships', ['id'], unique=False)
+
+    op.create_table('seminars',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('first_name', sa.String(length=50), nullable=True),
+    sa.Column('last_name', sa.String(length=50), nullable=True),
+    sa.Column('email_id', sa.String(length=100), nullable=True),
+    sa.Column('phone_number', sa.String(length=20), nullable=True),
+    sa.Column('course', sa.String(length=50), nullable=True),
+    sa.Column('year_of_study', sa.String(length=10), nullable=True),
+    sa.Column('seminar_topic', sa.String(length=300), nullable=True),
+    sa.Column('additional_comments', sa.String(length=300), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_seminars_id'), 'seminars', ['id'], unique=False)
+
+    op.create_table('webinars',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('first_name', sa.String(length=50), nullable=True),
+    sa.Column('last_name', sa.String(length=50), nullable=True),
+    sa.Column('email_id', sa.String(length=100), nullable=True),
+    sa.Column('phone_number', sa.String(length=20), nullable=True),
+    sa.Column('course', sa.String(length=50), nullable=True),
+    sa.Column('year_of_study', sa.String(length=10), nullable=True),
+    sa.Column('webinar_topic', sa.String(length=300), nullable=True),
+    sa.Column('additional_comments', sa.String(length=300), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_webinars_id'), 'webinars', ['id'], unique=False)
+
+    op.create_table('research_papers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('first_name', sa.String(length=50), nullable=True),
+    sa.Column('last_name', sa.String(length=50), nullable=True),
+    sa.Column('email_id', sa.String(length=100), nullable=True),
+    sa.Column('phone_number', sa.String(length=20), nullable=True),
+    sa.Column('student_id', sa.String(length=50), nullable=True),
+    sa.Column('paper_title', sa.String(length=300), nullable=True),
+    sa.Column('abstract', sa.String(length=1000), nullable=True),
+    sa.Column('keywords', sa.String(length=300), nullable=True),
+    sa.Column('paper_category', sa.String(length=100), nullable=True),
+    sa.Column('paper_pdf', sa.String(length=100), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_research_papers_id'), 'research_papers', ['id'], unique=False)
+
+    op.create_table('otps',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('otp', sa.String(length=6), nullable=True),
+    sa.Column('expiry', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('used', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_otps_id'), 'otps', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_otps_id'), table_name='otps')
+    op.drop_table('otps')
+    op.drop_index(op.f('ix_research_papers_id'), table_name='research_papers')
+    op.drop_table('research_papers')
+    op.drop_index(op.f('ix_webinars_id'), table_name='webinars')
+    op.drop_table('webinars')
+    op.drop_index(op.f('ix_seminars_id'), table_name='seminars')
+    op.drop_table('seminars')
+    op.drop_index(op.f('ix_virtual_internships_id'), table_name='virtual_internships')
+    op.drop_table('virtual_internships')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_table('users')
@@ -0,0 +1,60 @@
+"""blobs and email outbox
+
+Adds blobs, the reference counts of the content-addressed upload store, and
+email_outbox, the queue the mailer sends from. Neither existed before
+migrations were introduced, so a database stamped at 0001 gets them here.
+Each table is only created if it does not exist yet.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-17 05:48:30.502117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001a'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('blobs'):
+        op.create_table('blobs',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=True),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+        )
+
+    if not inspector.has_table('email_outbox'):
+        op.create_table('email_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('to_email', sa.String(length=100), nullable=True),
+        sa.Column('subject', sa.String(length=200), nullable=True),
+        sa.Column('body', sa.String(length=5000), nullable=True),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_error', sa.String(length=300), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_email_outbox_id'), 'email_outbox', ['id'], unique=False)
+        op.create_index('ix_email_outbox_due', 'email_outbox', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_email_outbox_due', table_name='email_outbox')
+    op.drop_index(op.f('ix_email_outbox_id'), table_name='email_outbox')
+    op.drop_table('email_outbox')
+    op.drop_table('blobs')
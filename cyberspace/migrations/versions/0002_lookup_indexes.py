@@ -0,0 +1,39 @@
+"""indexes for the hot lookup columns
+
+crud.get_otp filters otps by otp, and the profile counts / per-user reads
+filter every registration table by user_id.
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-17 06:02:13.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LOOKUP_INDEXES = [
+    ('otps', 'otp'),
+    ('otps', 'user_id'),
+    ('virtual_internships', 'user_id'),
+    ('seminars', 'user_id'),
+    ('webinars', 'user_id'),
+    ('research_papers', 'user_id'),
+]
+
+
+def upgrade() -> None:
+    for table, column in LOOKUP_INDEXES:
+        op.create_index(op.f(f'ix_{table}_{column}'), table, [column], unique=False)
+
+
+def downgrade() -> None:
+    for table, column in reversed(LOOKUP_INDEXES):
+        op.drop_index(op.f(f'ix_{table}_{column}'), table_name=table)
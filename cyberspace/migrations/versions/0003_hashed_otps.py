@@ -0,0 +1,42 @@
+"""store OTPs as per-user HMACs
+
+Replaces the plaintext otps.otp column with otp_hash, looked up together with
+user_id, and indexes expiry for the sweeper. Outstanding OTPs are dropped:
+they live for minutes and cannot be converted without the plaintext.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 06:31:50.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("DELETE FROM otps")
+    op.drop_index(op.f('ix_otps_otp'), table_name='otps')
+    with op.batch_alter_table('otps', schema=None) as batch_op:
+        batch_op.drop_column('otp')
+        batch_op.add_column(sa.Column('otp_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_otps_user_id_otp_hash', 'otps', ['user_id', 'otp_hash'], unique=False)
+    op.create_index(op.f('ix_otps_expiry'), 'otps', ['expiry'], unique=False)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM otps")
+    op.drop_index(op.f('ix_otps_expiry'), table_name='otps')
+    op.drop_index('ix_otps_user_id_otp_hash', table_name='otps')
+    with op.batch_alter_table('otps', schema=None) as batch_op:
+        batch_op.drop_column('otp_hash')
+        batch_op.add_column(sa.Column('otp', sa.String(length=6), nullable=True))
+    op.create_index(op.f('ix_otps_otp'), 'otps', ['otp'], unique=False)
@@ -0,0 +1,63 @@
+"""full-text index over research papers
+
+MySQL gets an InnoDB FULLTEXT index; SQLite gets an external-content FTS5
+table kept in sync with research_papers by triggers. Existing papers are
+indexed as part of the upgrade.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 09:12:40.117503
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = ['paper_title', 'abstract', 'keywords', 'paper_category']
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.create_index('ft_research_papers_text', 'research_papers', COLUMNS, mysql_prefix='FULLTEXT')
+    elif dialect == 'sqlite':
+        columns = ', '.join(COLUMNS)
+        new_values = ', '.join(f'new.{c}' for c in COLUMNS)
+        old_values = ', '.join(f'old.{c}' for c in COLUMNS)
+        op.execute(
+            f"CREATE VIRTUAL TABLE research_papers_fts USING fts5("
+            f"{columns}, content='research_papers', content_rowid='id')"
+        )
+        op.execute(
+            f"CREATE TRIGGER research_papers_fts_ai AFTER INSERT ON research_papers BEGIN "
+            f"INSERT INTO research_papers_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER research_papers_fts_ad AFTER DELETE ON research_papers BEGIN "
+            f"INSERT INTO research_papers_fts(research_papers_fts, rowid, {columns}) "
+            f"VALUES ('delete', old.id, {old_values}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER research_papers_fts_au AFTER UPDATE ON research_papers BEGIN "
+            f"INSERT INTO research_papers_fts(research_papers_fts, rowid, {columns}) "
+            f"VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO research_papers_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        )
+        op.execute("INSERT INTO research_papers_fts(research_papers_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.drop_index('ft_research_papers_text', table_name='research_papers')
+    elif dialect == 'sqlite':
+        for trigger in ('research_papers_fts_ai', 'research_papers_fts_ad', 'research_papers_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS research_papers_fts")
@@ -0,0 +1,111 @@
+"""paper ingestion jobs and extracted text
+
+Adds ingest_jobs, the page_count/checksum/full_text columns the pipeline
+fills in, and extends the full-text index from 0004 to cover full_text.
+Every existing paper gets a queued job so it is ingested too.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 11:03:27.640918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OLD_COLUMNS = ['paper_title', 'abstract', 'keywords', 'paper_category']
+NEW_COLUMNS = OLD_COLUMNS + ['full_text']
+TRIGGERS = ('research_papers_fts_ai', 'research_papers_fts_ad', 'research_papers_fts_au')
+
+
+def drop_search_index(dialect: str) -> None:
+    if dialect == 'mysql':
+        op.drop_index('ft_research_papers_text', table_name='research_papers')
+    elif dialect == 'sqlite':
+        for trigger in TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS research_papers_fts")
+
+
+def create_search_index(dialect: str, columns: list) -> None:
+    # Same layout as 0004, over `columns`
+    if dialect == 'mysql':
+        op.create_index('ft_research_papers_text', 'research_papers', columns, mysql_prefix='FULLTEXT')
+    elif dialect == 'sqlite':
+        names = ', '.join(columns)
+        new_values = ', '.join(f'new.{c}' for c in columns)
+        old_values = ', '.join(f'old.{c}' for c in columns)
+        op.execute(
+            f"CREATE VIRTUAL TABLE research_papers_fts USING fts5("
+            f"{names}, content='research_papers', content_rowid='id')"
+        )
+        op.execute(
+            f"CREATE TRIGGER research_papers_fts_ai AFTER INSERT ON research_papers BEGIN "
+            f"INSERT INTO research_papers_fts(rowid, {names}) VALUES (new.id, {new_values}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER research_papers_fts_ad AFTER DELETE ON research_papers BEGIN "
+            f"INSERT INTO research_papers_fts(research_papers_fts, rowid, {names}) "
+            f"VALUES ('delete', old.id, {old_values}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER research_papers_fts_au AFTER UPDATE ON research_papers BEGIN "
+            f"INSERT INTO research_papers_fts(research_papers_fts, rowid, {names}) "
+            f"VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO research_papers_fts(rowid, {names}) VALUES (new.id, {new_values}); END"
+        )
+        op.execute("INSERT INTO research_papers_fts(research_papers_fts) VALUES ('rebuild')")
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    drop_search_index(dialect)
+
+    # Plain ADD COLUMN: a batch copy of research_papers would drop the FTS triggers
+    op.add_column('research_papers', sa.Column('page_count', sa.Integer(), nullable=True))
+    op.add_column('research_papers', sa.Column('checksum', sa.String(length=64), nullable=True))
+    op.add_column('research_papers', sa.Column(
+        'full_text', sa.Text().with_variant(mysql.MEDIUMTEXT(), 'mysql'), nullable=True))
+
+    op.create_table('ingest_jobs',
+        sa.Column('paper_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('stage', sa.String(length=10), nullable=True),
+        sa.Column('stages_done', sa.Integer(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_error', sa.String(length=300), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['paper_id'], ['research_papers.id'], ),
+        sa.PrimaryKeyConstraint('paper_id')
+    )
+    op.create_index('ix_ingest_jobs_due', 'ingest_jobs', ['status', 'next_attempt_at'], unique=False)
+    op.execute(
+        "INSERT INTO ingest_jobs (paper_id, status, stages_done, attempts, next_attempt_at) "
+        "SELECT id, 'queued', 0, 0, CURRENT_TIMESTAMP FROM research_papers"
+    )
+
+    create_search_index(dialect, NEW_COLUMNS)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    drop_search_index(dialect)
+
+    op.drop_index('ix_ingest_jobs_due', table_name='ingest_jobs')
+    op.drop_table('ingest_jobs')
+    op.drop_column('research_papers', 'full_text')
+    op.drop_column('research_papers', 'checksum')
+    op.drop_column('research_papers', 'page_count')
+
+    create_search_index(dialect, OLD_COLUMNS)
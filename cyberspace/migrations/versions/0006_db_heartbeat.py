@@ -0,0 +1,35 @@
+"""replication heartbeat
+
+Adds db_heartbeat with its single row. App workers stamp it on the primary
+and read it back from the replica to measure replication lag (db_router.py).
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 14:12:08.517203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    heartbeat = op.create_table(
+        'db_heartbeat',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('beat_at', sa.Double(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.bulk_insert(heartbeat, [{'id': 1, 'beat_at': 0.0}])
+
+
+def downgrade() -> None:
+    op.drop_table('db_heartbeat')
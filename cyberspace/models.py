@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Double, ForeignKey, Index, Text
+from sqlalchemy.dialects.mysql import MEDIUMTEXT
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from database import Base
 
@@ -25,7 +26,7 @@ class VirtualInternship(Base):
     __tablename__ = "virtual_internships"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     first_name = Column(String(50))
     last_name = Column(String(50) , nullable=True)
     email_id = Column(String(100))
@@ -45,7 +46,7 @@ class Seminar(Base):
     __tablename__ = "seminars"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     first_name = Column(String(50))
     last_name = Column(String(50))
     email_id = Column(String(100))
@@ -61,7 +62,7 @@ class Webinar(Base):
     __tablename__ = "webinars"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     first_name = Column(String(50))
     last_name = Column(String(50))
     email_id = Column(String(100))
@@ -77,7 +78,7 @@ class ResearchPaper(Base):
     __tablename__ = "research_papers"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     first_name = Column(String(50))
     last_name = Column(String(50))
     email_id = Column(String(100))
@@ -88,17 +89,88 @@ class ResearchPaper(Base):
     keywords = Column(String(300))
     paper_category = Column(String(100))
     paper_pdf = Column(String(100))  # Path or filename for the uploaded PDF
+    # Filled in by the ingestion pipeline (ingest.py) once the PDF is processed
+    page_count = Column(Integer, nullable=True)
+    checksum = Column(String(64), nullable=True)
+    # Extracted text, only read by the search index; deferred so row loads stay small
+    full_text = deferred(Column(Text().with_variant(MEDIUMTEXT(), "mysql"), nullable=True))
 
     user = relationship("User", back_populates="research_papers")
 
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+
+    # One ingestion job per paper, so the job id is the paper id
+    paper_id = Column(Integer, ForeignKey('research_papers.id'), primary_key=True)
+    status = Column(String(10), default="queued", nullable=False)  # queued, running, done or failed
+    stage = Column(String(10), nullable=True)  # stage being run, see ingest.STAGES
+    stages_done = Column(Integer, default=0, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime(timezone=True))
+    last_error = Column(String(300), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    paper = relationship("ResearchPaper")
+
+    # The pipeline polls for due jobs by (status, next_attempt_at)
+    __table_args__ = (Index("ix_ingest_jobs_due", "status", "next_attempt_at"),)
+
 class OTP(Base):
     __tablename__ = "otps"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
-    otp = Column(String(6))
-    expiry = Column(DateTime(timezone=True))  # Ensure timezone-aware
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    otp_hash = Column(String(64))  # HMAC of user id + OTP, see otp_store.py
+    expiry = Column(DateTime(timezone=True), index=True)  # Ensure timezone-aware
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     used = Column(Boolean, default=False)
 
-    user = relationship("User", back_populates="otps")
\ No newline at end of file
+    user = relationship("User", back_populates="otps")
+
+    # Lookups are always for one user's OTP
+    __table_args__ = (Index("ix_otps_user_id_otp_hash", "user_id", "otp_hash"),)
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    token_hash = Column(String(64), unique=True, nullable=False)  # HMAC of the token, see refresh_tokens.py
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)  # set on rotation, logout or password change
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    # Relative path inside its store, e.g. "3e/03/3e037c...c7.pdf"
+    name = Column(String(100), primary_key=True)
+    kind = Column(String(10))  # "paper" or "image"
+    ref_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String(100))
+    subject = Column(String(200))
+    body = Column(String(5000))
+    status = Column(String(10), default="pending", nullable=False)  # pending, sent or failed
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime(timezone=True))
+    last_error = Column(String(300), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    # The delivery worker polls for due messages by (status, next_attempt_at)
+    __table_args__ = (Index("ix_email_outbox_due", "status", "next_attempt_at"),)
+
+class DBHeartbeat(Base):
+    __tablename__ = "db_heartbeat"
+
+    # A single row (id 1) that every app worker stamps on the primary; how old
+    # it is on the replica is the replication lag (see db_router.py)
+    id = Column(Integer, primary_key=True)
+    beat_at = Column(Double, nullable=False)  # time.time() of the last stamp (a MySQL FLOAT is too coarse)
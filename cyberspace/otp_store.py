@@ -0,0 +1,209 @@
+"""One-time password storage for the password reset flow.
+
+OTPs are never stored in the clear: each one is kept as an HMAC of
+(user id, otp) and looked up by (user_id, otp_hash), so issuing and verifying
+cost one keyed lookup no matter how many OTPs other users hold.
+
+Two backends are available, selected with [OTP] BACKEND in config.ini:
+
+* "sql" (default) keeps OTPs in the `otps` table and works across workers.
+* "memory" keeps them in a process-local TTL map; only for single-process runs.
+
+A user holds at most one OTP: issuing a new one deletes the previous ones,
+and a successful verify deletes it. Expired ones are purged in batches by
+`run_sweeper`, which the app starts on startup.
+
+`find_user` serves reset requests that still omit the email (deprecated, see
+schemas.ResetPassword): it has to try the OTP against every user holding an
+unexpired one, which stays cheap only because there is one OTP per user and
+they live for minutes.
+"""
+import abc
+import asyncio
+import datetime
+import hashlib
+import hmac
+import secrets
+import string
+import time
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import OTP as OTPModel
+
+OTP_LENGTH = 6
+
+
+def generate_otp() -> str:
+    """Generate a 6-digit OTP."""
+    return ''.join(secrets.choice(string.digits) for _ in range(OTP_LENGTH))
+
+
+class OTPBackend(abc.ABC):
+    def __init__(self, secret_key: str, ttl_minutes: float = 5):
+        self._key = secret_key.encode()
+        self.ttl = datetime.timedelta(minutes=ttl_minutes)
+
+    def otp_hash(self, user_id: int, otp: str) -> str:
+        return hmac.new(self._key, f"{user_id}:{otp}".encode(), hashlib.sha256).hexdigest()
+
+    @abc.abstractmethod
+    async def issue(self, db: AsyncSession, user_id: int) -> str:
+        """Store a fresh OTP for the user and return it in the clear (for the email)."""
+
+    @abc.abstractmethod
+    async def verify(self, db: AsyncSession, user_id: int, otp: str):
+        """Consume the user's OTP; raises HTTPException if it is wrong or expired."""
+
+    @abc.abstractmethod
+    async def find_user(self, db: AsyncSession, otp: str) -> int:
+        """The id of the one user holding the unexpired `otp`; raises HTTPException otherwise."""
+
+    def _only_match(self, otp: str, user_ids) -> int:
+        matches = {user_id for user_id, otp_hash in user_ids
+                   if hmac.compare_digest(otp_hash, self.otp_hash(user_id, otp))}
+        if not matches:
+            raise HTTPException(status_code=404, detail="OTP not found or already used")
+        if len(matches) > 1:
+            # Two users were sent the same six digits; only the email can tell them apart
+            raise HTTPException(status_code=400, detail="Include the account email with the OTP")
+        return matches.pop()
+
+    @abc.abstractmethod
+    async def sweep(self, db: Optional[AsyncSession], batch_size: int) -> int:
+        """Delete expired OTPs (used ones are deleted on verify), returning how many were removed."""
+
+
+class SQLOTPBackend(OTPBackend):
+    async def issue(self, db: AsyncSession, user_id: int) -> str:
+        otp_value = generate_otp()
+        expiry_time = datetime.datetime.now(datetime.timezone.utc) + self.ttl
+        # Only the newest OTP stays valid; replaced in the same transaction
+        await db.execute(delete(OTPModel).where(OTPModel.user_id == user_id))
+        db.add(OTPModel(user_id=user_id, otp_hash=self.otp_hash(user_id, otp_value), expiry=expiry_time, used=False))
+        try:
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        return otp_value
+
+    async def verify(self, db: AsyncSession, user_id: int, otp: str):
+        result = await db.execute(
+            select(OTPModel.id, OTPModel.expiry).where(
+                OTPModel.user_id == user_id,
+                OTPModel.otp_hash == self.otp_hash(user_id, otp),
+                OTPModel.used == False,
+            )
+        )
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="OTP not found or already used")
+
+        expiry = row.expiry if row.expiry.tzinfo else row.expiry.replace(tzinfo=datetime.timezone.utc)
+        if expiry < datetime.datetime.now(datetime.timezone.utc):
+            raise HTTPException(status_code=400, detail="OTP has expired")
+
+        # A successful reset invalidates every outstanding OTP for the user
+        try:
+            await db.execute(delete(OTPModel).where(OTPModel.user_id == user_id))
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail=f"Error deleting OTP: {str(e)}")
+
+    async def find_user(self, db: AsyncSession, otp: str) -> int:
+        result = await db.execute(
+            select(OTPModel.user_id, OTPModel.otp_hash).where(
+                OTPModel.expiry >= datetime.datetime.now(datetime.timezone.utc),
+                OTPModel.used == False,
+            )
+        )
+        return self._only_match(otp, result.all())
+
+    async def sweep(self, db: AsyncSession, batch_size: int) -> int:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        removed = 0
+        while True:
+            # Select then delete by id: MySQL rejects LIMIT inside an IN subquery
+            result = await db.execute(
+                select(OTPModel.id).where(OTPModel.expiry < now).limit(batch_size)
+            )
+            ids = result.scalars().all()
+            if not ids:
+                break
+            await db.execute(delete(OTPModel).where(OTPModel.id.in_(ids)))
+            await db.commit()
+            removed += len(ids)
+            if len(ids) < batch_size:
+                break
+        return removed
+
+
+class MemoryOTPBackend(OTPBackend):
+    def __init__(self, secret_key: str, ttl_minutes: float = 5):
+        super().__init__(secret_key, ttl_minutes)
+        # user_id -> {otp_hash: monotonic expiry}
+        self._entries = {}
+
+    async def issue(self, db: Optional[AsyncSession], user_id: int) -> str:
+        otp_value = generate_otp()
+        expires_at = time.monotonic() + self.ttl.total_seconds()
+        # Only the newest OTP stays valid
+        self._entries[user_id] = {self.otp_hash(user_id, otp_value): expires_at}
+        return otp_value
+
+    async def verify(self, db: Optional[AsyncSession], user_id: int, otp: str):
+        expires_at = self._entries.get(user_id, {}).get(self.otp_hash(user_id, otp))
+        if expires_at is None:
+            raise HTTPException(status_code=404, detail="OTP not found or already used")
+        if expires_at < time.monotonic():
+            raise HTTPException(status_code=400, detail="OTP has expired")
+        del self._entries[user_id]
+
+    async def find_user(self, db: Optional[AsyncSession], otp: str) -> int:
+        now = time.monotonic()
+        return self._only_match(otp, [
+            (user_id, otp_hash)
+            for user_id, otps in list(self._entries.items())
+            for otp_hash, expires_at in otps.items() if expires_at >= now
+        ])
+
+    async def sweep(self, db: Optional[AsyncSession], batch_size: int) -> int:
+        now = time.monotonic()
+        removed = 0
+        for user_id in list(self._entries):
+            otps = self._entries[user_id]
+            for otp_hash in [h for h, expires_at in otps.items() if expires_at < now]:
+                del otps[otp_hash]
+                removed += 1
+            if not otps:
+                del self._entries[user_id]
+        return removed
+
+
+BACKENDS = {
+    "sql": SQLOTPBackend,
+    "memory": MemoryOTPBackend,
+}
+
+
+def create_backend(name: str, secret_key: str, ttl_minutes: float = 5) -> OTPBackend:
+    try:
+        return BACKENDS[name](secret_key, ttl_minutes)
+    except KeyError:
+        raise ValueError(f"Unknown OTP backend {name!r}; expected one of {sorted(BACKENDS)}")
+
+
+async def run_sweeper(backend: OTPBackend, session_factory, interval: float = 60, batch_size: int = 500):
+    """Periodically purge expired OTPs so the table stays small."""
+    while True:
+        try:
+            async with session_factory() as db:
+                removed = await backend.sweep(db, batch_size)
+            if removed:
+                print(f"OTP sweeper removed {removed} expired OTPs")
+        except Exception as e:
+            print(f"OTP sweeper failed: {e}")
+        await asyncio.sleep(interval)
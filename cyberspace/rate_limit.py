@@ -0,0 +1,167 @@
+"""Rate limits for the endpoints that cost the most CPU, send email or check OTPs.
+
+/login and /users/ run argon2, /forgot-password/ sends an OTP email and
+/reset-password/ accepts a guessable six-digit OTP. Each has limits per
+client IP and, except sign-up, per target email address, so one scripted
+client can neither saturate the argon2 workers, flood an inbox nor work
+through the OTP space. A request over any of its limits gets a 429 with Retry-After before
+it touches the database or the hashing pool.
+
+Limits are token buckets: "5/60" allows a burst of 5 and refills one token
+every 12 seconds. They are set with [RATE_LIMIT] in config.ini:
+
+    ENABLED                    false turns every limit off (default true)
+    BACKEND                    where buckets live; "memory" (default) is per process
+    LOGIN_PER_IP               default 30/60
+    LOGIN_PER_EMAIL            default 10/300
+    SIGNUP_PER_IP              default 10/600
+    FORGOT_PASSWORD_PER_IP     default 10/600
+    FORGOT_PASSWORD_PER_EMAIL  default 3/900
+    RESET_PASSWORD_PER_IP      default 10/600
+    RESET_PASSWORD_PER_EMAIL   default 5/900
+
+The memory backend counts per worker process, so with N workers a client
+gets up to N times the limit; a shared backend only has to implement
+RateLimitBackend.take. Behind a reverse proxy, run uvicorn with
+--proxy-headers/--forwarded-allow-ips so the client IP is the real one.
+"""
+import abc
+import math
+import time
+from typing import Optional
+from fastapi import HTTPException, Request
+from metrics import RATE_LIMITED
+from settings import settings
+
+
+class Limit:
+    def __init__(self, count: int, seconds: float):
+        self.count = count
+        self.seconds = seconds
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        """'5/60' -> 5 requests per 60 seconds."""
+        count, seconds = value.split("/")
+        return cls(int(count), float(seconds))
+
+    @property
+    def rate(self) -> float:
+        return self.count / self.seconds
+
+
+class RateLimitBackend(abc.ABC):
+    @abc.abstractmethod
+    async def take(self, key: str, limit: Limit) -> float:
+        """Spend one token from `key`'s bucket; return 0 if there was one, else seconds until there is."""
+
+    @abc.abstractmethod
+    def size(self) -> int:
+        """Buckets currently tracked."""
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # key -> (tokens left, monotonic time they were counted, monotonic time the bucket is full again)
+        self._buckets = {}
+
+    async def take(self, key: str, limit: Limit) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._prune(now)
+            tokens = limit.count
+        else:
+            tokens = min(limit.count, bucket[0] + (now - bucket[1]) * limit.rate)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now, now + (limit.count - tokens) / limit.rate)
+        return 0.0 if allowed else (1 - tokens) / limit.rate
+
+    def _prune(self, now: float):
+        # A bucket that has refilled is the same as no bucket; drop those first, then the oldest
+        for key, (_, _, full_at) in list(self._buckets.items()):
+            if full_at <= now:
+                del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            for key in list(self._buckets)[:self.max_keys // 2]:
+                del self._buckets[key]
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+BACKENDS = {
+    "memory": MemoryRateLimitBackend,
+}
+
+
+def create_backend(name: str) -> RateLimitBackend:
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown rate limit backend {name!r}; expected one of {sorted(BACKENDS)}")
+
+
+class RateLimiter:
+    def __init__(self, backend: RateLimitBackend, limits: dict, enabled: bool = True):
+        self.backend = backend
+        # e.g. {"login_per_ip": Limit(30, 60)}
+        self.limits = limits
+        self.enabled = enabled
+        self._rejected = {name: 0 for name in limits}
+
+    async def check(self, endpoint: str, request: Request, email: Optional[str] = None):
+        """Raise HTTPException 429 if the client IP or `email` is over `endpoint`'s limits."""
+        if not self.enabled:
+            return
+        keys = {"per_ip": request.client.host if request.client else "unknown"}
+        if email:
+            keys["per_email"] = email.strip().lower()
+
+        for kind, value in keys.items():
+            name = f"{endpoint}_{kind}"
+            limit = self.limits.get(name)
+            if limit is None:
+                continue
+            retry_after = await self.backend.take(f"{name}:{value}", limit)
+            if retry_after:
+                self._rejected[name] += 1
+                RATE_LIMITED.labels(name).inc()
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many requests, please retry later",
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "limits": {name: f"{limit.count}/{limit.seconds:g}" for name, limit in self.limits.items()},
+            "rejected": dict(self._rejected),
+            "buckets": self.backend.size(),
+        }
+
+
+DEFAULT_LIMITS = {
+    "login_per_ip": "30/60",
+    "login_per_email": "10/300",
+    "signup_per_ip": "10/600",
+    "forgot_password_per_ip": "10/600",
+    "forgot_password_per_email": "3/900",
+    "reset_password_per_ip": "10/600",
+    "reset_password_per_email": "5/900",
+}
+
+rate_limiter = RateLimiter(
+    create_backend(settings.get('RATE_LIMIT', 'BACKEND', fallback="memory")),
+    {
+        name: Limit.parse(settings.get('RATE_LIMIT', name.upper(), fallback=default))
+        for name, default in DEFAULT_LIMITS.items()
+    },
+    enabled=settings.getboolean('RATE_LIMIT', 'ENABLED', fallback=True),
+)
@@ -0,0 +1,144 @@
+"""Rotating refresh tokens, so clients renew access tokens without a password.
+
+/login hands out a short-lived JWT access token together with an opaque
+refresh token. When the access token expires the client posts the refresh
+token to /token/refresh and gets a new pair back; only /login runs argon2.
+
+* Refresh tokens are random and stored only as an HMAC, looked up through
+  the unique index on token_hash, so a refresh costs one indexed read and
+  no password hashing.
+* Every refresh rotates: the presented token is revoked and a new one is
+  issued. Presenting a revoked token again means it was copied, so all of
+  that user's tokens are revoked and they have to sign in again.
+* A password change revokes every refresh token of the user
+  (crud.update_user_password), and /token/revoke revokes one on logout.
+
+Revoked tokens are kept until they expire, so reuse is still recognised;
+`run_sweeper` deletes expired ones in batches.
+"""
+import asyncio
+import datetime
+import hashlib
+import hmac
+import secrets
+from fastapi import HTTPException
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import RefreshToken as RefreshTokenModel
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class RefreshTokenStore:
+    def __init__(self, secret_key: str, ttl_days: float = 30):
+        self._key = secret_key.encode()
+        self.ttl = datetime.timedelta(days=ttl_days)
+
+    def token_hash(self, token: str) -> str:
+        return hmac.new(self._key, token.encode(), hashlib.sha256).hexdigest()
+
+    def add(self, db: AsyncSession, user_id: int) -> str:
+        """Add a new refresh token for the user to `db`'s transaction and return it in the clear."""
+        token = secrets.token_urlsafe(32)
+        db.add(RefreshTokenModel(
+            user_id=user_id, token_hash=self.token_hash(token), expires_at=utcnow() + self.ttl,
+        ))
+        return token
+
+    async def issue(self, db: AsyncSession, user_id: int) -> str:
+        token = self.add(db, user_id)
+        try:
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        return token
+
+    async def rotate(self, db: AsyncSession, token: str) -> tuple:
+        """Revoke `token` and return (user_id, new refresh token); raises HTTPException 401 if it is not valid."""
+        result = await db.execute(
+            select(RefreshTokenModel.id, RefreshTokenModel.user_id, RefreshTokenModel.expires_at,
+                   RefreshTokenModel.revoked_at)
+            .where(RefreshTokenModel.token_hash == self.token_hash(token))
+        )
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=401, detail="Invalid refresh token")
+
+        if row.revoked_at is not None:
+            await self.revoke_all(db, row.user_id)
+            await db.commit()
+            raise HTTPException(status_code=401, detail="Refresh token has been revoked")
+
+        expires_at = row.expires_at if row.expires_at.tzinfo else row.expires_at.replace(tzinfo=datetime.timezone.utc)
+        if expires_at < utcnow():
+            raise HTTPException(status_code=401, detail="Refresh token has expired")
+
+        # Only one of two concurrent refreshes with the same token may win
+        revoked = await db.execute(
+            update(RefreshTokenModel)
+            .where(RefreshTokenModel.id == row.id, RefreshTokenModel.revoked_at.is_(None))
+            .values(revoked_at=utcnow())
+        )
+        if revoked.rowcount == 0:
+            await db.rollback()
+            raise HTTPException(status_code=401, detail="Refresh token has been revoked")
+
+        new_token = self.add(db, row.user_id)
+        try:
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        return row.user_id, new_token
+
+    async def revoke(self, db: AsyncSession, token: str):
+        """Revoke a single refresh token (logout); unknown or already revoked tokens are ignored."""
+        await db.execute(
+            update(RefreshTokenModel)
+            .where(RefreshTokenModel.token_hash == self.token_hash(token), RefreshTokenModel.revoked_at.is_(None))
+            .values(revoked_at=utcnow())
+        )
+        await db.commit()
+
+    async def revoke_all(self, db: AsyncSession, user_id: int):
+        """Revoke every live refresh token of the user, in the caller's transaction."""
+        await db.execute(
+            update(RefreshTokenModel)
+            .where(RefreshTokenModel.user_id == user_id, RefreshTokenModel.revoked_at.is_(None))
+            .values(revoked_at=utcnow())
+        )
+
+    async def sweep(self, db: AsyncSession, batch_size: int) -> int:
+        """Delete expired refresh tokens, returning how many were removed."""
+        now = utcnow()
+        removed = 0
+        while True:
+            # Select then delete by id: MySQL rejects LIMIT inside an IN subquery
+            result = await db.execute(
+                select(RefreshTokenModel.id).where(RefreshTokenModel.expires_at < now).limit(batch_size)
+            )
+            ids = result.scalars().all()
+            if not ids:
+                break
+            await db.execute(delete(RefreshTokenModel).where(RefreshTokenModel.id.in_(ids)))
+            await db.commit()
+            removed += len(ids)
+            if len(ids) < batch_size:
+                break
+        return removed
+
+
+async def run_sweeper(store: RefreshTokenStore, session_factory, interval: float = 3600, batch_size: int = 500):
+    """Periodically purge expired refresh tokens so the table stays small."""
+    while True:
+        try:
+            async with session_factory() as db:
+                removed = await store.sweep(db, batch_size)
+            if removed:
+                print(f"Refresh token sweeper removed {removed} expired tokens")
+        except Exception as e:
+            print(f"Refresh token sweeper failed: {e}")
+        await asyncio.sleep(interval)
@@ -31,18 +31,30 @@ class User(UserBase):
             return f"/images/{self.image_filename}"
         return None
 
+class Principal(BaseModel):
+    # What authenticated endpoints need to know about the caller; cached per user
+    id: int
+    email_id: str
+
 class Login(BaseModel):
     username: EmailStr
     password: str
 
 class Token(BaseModel):
     access_token: str
+    refresh_token: str
     token_type: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class EmailRequest(BaseModel):
     email: EmailStr
 
 class ResetPassword(BaseModel):
+    # OTPs are looked up per user. Optional for one more release so older clients keep
+    # working; without it the OTP is matched against every user (see otp_store.find_user)
+    email: Optional[EmailStr] = None
     otp: str
     new_password: str
     confirm_password: str
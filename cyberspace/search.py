@@ -0,0 +1,121 @@
+"""Full-text search over research papers.
+
+The index lives in the database so it is shared by every worker and kept up
+to date in the same transaction as every write (migrations 0004 and 0005):
+
+* MySQL: an InnoDB FULLTEXT index over the searchable columns, maintained by
+  the server on every write and queried with MATCH ... AGAINST.
+* SQLite: an external-content FTS5 table kept in sync by triggers on
+  research_papers, ranked with bm25().
+
+Besides the submitted metadata the index covers full_text, the text the
+ingestion pipeline (ingest.py) extracts from each PDF.
+
+A paper matches when it contains every query term (the last one as a
+prefix, for search-as-you-type); matches are ranked by relevance with title
+and keyword hits weighted above the abstract and the PDF text.
+
+Scoring costs about a microsecond per matching paper, so on SQLite a query
+matching more than `rank_candidates` papers (only words nearly every paper
+contains) is returned newest first instead; ranking such a broad match set
+would cost hundreds of milliseconds and separate the hits very little.
+"""
+import re
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+FTS_TABLE = "research_papers_fts"
+FULLTEXT_INDEX = "ft_research_papers_text"
+SEARCH_COLUMNS = ("paper_title", "abstract", "keywords", "paper_category", "full_text")
+# bm25() weight per column in SEARCH_COLUMNS order (SQLite only)
+COLUMN_WEIGHTS = (10.0, 1.0, 5.0, 2.0, 0.5)
+RESULT_COLUMNS = ("id", "paper_title", "abstract", "keywords", "paper_category")
+MAX_TERMS = 10
+RANK_CANDIDATES = 20000
+
+TOKEN_RE = re.compile(r"\w+")
+
+_RESULT_COLUMNS = ", ".join(f"p.{column}" for column in RESULT_COLUMNS)
+_BM25 = f"bm25({FTS_TABLE}, {', '.join(str(w) for w in COLUMN_WEIGHTS)})"
+
+# Rank inside the FTS table first so only one page of papers is read back
+SQLITE_SEARCH = text(f"""
+    SELECT {_RESULT_COLUMNS}, hits.score
+    FROM (
+        SELECT rowid, -{_BM25} AS score FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH :query
+        ORDER BY {_BM25}
+        LIMIT :limit OFFSET :offset
+    ) AS hits JOIN research_papers p ON p.id = hits.rowid
+    ORDER BY hits.score DESC
+""")
+
+# Counting stops at the cap, so this stays cheap for any match set size
+SQLITE_COUNT_UP_TO = text(f"""
+    SELECT count(*) FROM (
+        SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :query LIMIT :cap
+    ) AS candidates
+""")
+
+SQLITE_NEWEST = text(f"""
+    SELECT {_RESULT_COLUMNS}, NULL AS score
+    FROM (
+        SELECT rowid FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH :query
+        ORDER BY rowid DESC
+        LIMIT :limit OFFSET :offset
+    ) AS hits JOIN research_papers p ON p.id = hits.rowid
+    ORDER BY p.id DESC
+""")
+
+_MATCH = f"MATCH ({', '.join(SEARCH_COLUMNS)}) AGAINST (:query IN BOOLEAN MODE)"
+MYSQL_SEARCH = text(f"""
+    SELECT {_RESULT_COLUMNS}, {_MATCH} AS score
+    FROM research_papers p
+    WHERE {_MATCH}
+    ORDER BY score DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+
+def query_terms(query: str) -> list:
+    """Split a user query into at most MAX_TERMS distinct lowercase words."""
+    terms = []
+    for term in TOKEN_RE.findall(query.lower()):
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+
+def sqlite_match(terms: list) -> str:
+    # Every term is quoted so user input can never be read as FTS5 syntax
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def mysql_match(terms: list) -> str:
+    return " ".join(f"+{term}" for term in terms) + "*"
+
+
+async def search_papers(db: AsyncSession, query: str, limit: int, offset: int,
+                        rank_candidates: int = RANK_CANDIDATES) -> list:
+    """Return up to `limit` ranked hits, skipping the first `offset`."""
+    terms = query_terms(query)
+    if not terms:
+        return []
+
+    dialect = db.bind.dialect.name
+    if dialect == "sqlite":
+        statement, match = SQLITE_SEARCH, sqlite_match(terms)
+        candidates = await db.scalar(SQLITE_COUNT_UP_TO, {"query": match, "cap": rank_candidates + 1})
+        if candidates > rank_candidates:
+            statement = SQLITE_NEWEST
+    elif dialect == "mysql":
+        statement, match = MYSQL_SEARCH, mysql_match(terms)
+    else:
+        raise HTTPException(status_code=501, detail=f"Search is not supported on {dialect}")
+
+    result = await db.execute(statement, {"query": match, "limit": limit, "offset": offset})
+    return [dict(row._mapping) for row in result]
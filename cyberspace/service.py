@@ -1,149 +1,148 @@
+import asyncio
+import hashlib
 import os
-import uuid
-import smtplib
-from email.message import EmailMessage
+import tempfile
+import time
 from fastapi import HTTPException, UploadFile
-from passlib.context import CryptContext
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
-import configparser
+from sqlalchemy.ext.asyncio import AsyncSession
+from blobstore import TEMP_PREFIX, image_store, paper_store
+from cors import CORSMiddleware
+from hashing import HashingExecutor, pwd_context
+from mailer import enqueue_email
+from metrics import UPLOAD_BYTES, UPLOAD_DURATION
+from settings import settings
 
-# Load the configuration from config.ini
-config = configparser.ConfigParser()
-config.read('config.ini')
-
-# Fetch secret key and email credentials from the config file
-secret_key = config['DEFAULT']['SECRET_KEY']
-email_from = config['DEFAULT']['EMAIL_FROM']
-email_password = config['DEFAULT']['EMAIL_PASSWORD']
+# Fetch secret key from the config file (email credentials are used by mailer.py)
+secret_key = settings['DEFAULT']['SECRET_KEY']
 
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg"}
 
 ALLOWED_PDF_EXTENSIONS = {".pdf"}
 
-# Initialize CryptContext for password hashing
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-
-# Save image function with allowed extensions and unique filename generation
-def save_image(image: UploadFile) -> str:
+# Process pool for argon2 so hashing never runs on the request thread
+hasher = HashingExecutor(
+    max_workers=settings['DEFAULT'].getint('HASH_WORKERS', fallback=None),
+    max_queue=settings['DEFAULT'].getint('HASH_MAX_QUEUE', fallback=None),
+)
+
+# Upload limits (bytes) and the leading bytes each accepted file type must start with
+MAX_IMAGE_SIZE = settings['DEFAULT'].getint('MAX_IMAGE_SIZE', fallback=5 * 1024 * 1024)
+MAX_PDF_SIZE = settings['DEFAULT'].getint('MAX_PDF_SIZE', fallback=50 * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+JPEG_MAGIC = (b"\xff\xd8\xff",)
+PDF_MAGIC = (b"%PDF-",)
+
+
+def write_upload(upload: UploadFile, directory: str, max_size: int, magic: tuple) -> tuple:
+    """Copy an upload into a temp file in `directory`, checking its type and size
+    and hashing it on the way; returns (temp path, sha256 hex digest, size).
+
+    One pass over the spooled body. The temp file lives next to its final
+    location so BlobStore.put can rename it into place atomically, or delete it
+    if an identical blob is already stored.
+    """
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=TEMP_PREFIX)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = upload.file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if size == 0 and not chunk.startswith(magic):
+                    raise HTTPException(status_code=400, detail="File content does not match its type.")
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=413, detail=f"File exceeds the {max_size} byte limit.")
+                digest.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, digest.hexdigest(), size
+
+
+def store_upload(upload: UploadFile, store, max_size: int, magic: tuple, extension: str) -> tuple:
+    """Save an upload in `store`; returns (blob name, size). Blocking, run it off the event loop."""
+    temp_path, digest, size = write_upload(upload, store.root, max_size, magic)
+    return store.put(temp_path, digest, extension), size
+
+
+# Save image function with allowed extensions; identical images share one stored blob
+async def save_image(image: UploadFile) -> str:
     extension = os.path.splitext(image.filename)[1].lower()
     if extension not in ALLOWED_EXTENSIONS:
         raise HTTPException(status_code=400, detail="Invalid file extension. Only .jpg and .jpeg are allowed.")
 
-    unique_filename = f"{uuid.uuid4().hex}{extension}"
-    image_dir = "images"
-
-    # Ensure the images directory exists
-    os.makedirs(image_dir, exist_ok=True)
-
-    image_path = os.path.join(image_dir, unique_filename)
+    start = time.perf_counter()
     try:
-        with open(image_path, "wb") as image_file:
-            image_file.write(image.file.read())
+        # Reading, hashing and writing up to MAX_IMAGE_SIZE bytes would otherwise stall every other request
+        name, size = await asyncio.to_thread(store_upload, image, image_store, MAX_IMAGE_SIZE, JPEG_MAGIC, ".jpg")
+        UPLOAD_BYTES.labels("image").observe(size)
+        UPLOAD_DURATION.labels("image").observe(time.perf_counter() - start)
+        return name
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save image: {str(e)}")
 
-    return unique_filename
 
 
-
-def save_pdf(pdf: UploadFile) -> str:
+async def save_pdf(pdf: UploadFile) -> str:
     extension = os.path.splitext(pdf.filename)[1].lower()
     if extension not in ALLOWED_PDF_EXTENSIONS:
         raise HTTPException(status_code=400, detail="Invalid file extension. Only .pdf is allowed.")
 
-    unique_filename = f"{uuid.uuid4().hex}{extension}"
-    pdf_dir = "uploads/papers"
-
-    # Ensure the directory exists
-    os.makedirs(pdf_dir, exist_ok=True)
-
-    pdf_path = os.path.join(pdf_dir, unique_filename)
+    start = time.perf_counter()
     try:
-        with open(pdf_path, "wb") as pdf_file:
-            pdf_file.write(pdf.file.read())
+        name, size = await asyncio.to_thread(store_upload, pdf, paper_store, MAX_PDF_SIZE, PDF_MAGIC, ".pdf")
+        UPLOAD_BYTES.labels("pdf").observe(size)
+        UPLOAD_DURATION.labels("pdf").observe(time.perf_counter() - start)
+        return name
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save PDF: {str(e)}")
 
-    return unique_filename
-
 
 # Function to hash passwords
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    return await hasher.hash(password)
 
 # Function to verify passwords
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await hasher.verify(plain_password, hashed_password)
 
-# Add custom CORS middleware to the FastAPI application
-def add_custom_cors_middleware(app):
-    allowed_origins = ["http://127.0.0.1:5500"]  # Update this with your allowed origin
-
-    class CustomCORSMiddleware(BaseHTTPMiddleware):
-        async def dispatch(self, request, call_next):
-            if request.method == "OPTIONS":
-                response = Response()
-                response.headers.update({
-                    "Access-Control-Allow-Origin": allowed_origins[0],
-                    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE",
-                    "Access-Control-Allow-Headers": "X-Custom-Header, Content-Type, Authorization",
-                    "Access-Control-Max-Age": "86400",
-                    "Access-Control-Allow-Credentials": "true",
-                })
-                return response
-
-            response = await call_next(request)
-            origin = request.headers.get("Origin")
-            if origin in allowed_origins:
-                response.headers.update({
-                    "Access-Control-Allow-Origin": origin,
-                    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE",
-                    "Access-Control-Allow-Headers": "X-Custom-Header, Content-Type, Authorization",
-                    "Access-Control-Allow-Credentials": "true",
-                })
-            return response
-
-    app.add_middleware(CustomCORSMiddleware)
-
-# Function to send a congratulation email
-async def send_congratulation_email(to_email: str, user_name: str):
-    msg = EmailMessage()
-    msg.set_content(f"Dear {user_name},\n\nCongratulations on your successful signup!\n\nBest regards,\nYour Team")
-    msg["Subject"] = "Congratulations on Your Signup!"
-    msg["From"] = email_from  # Use the email_from loaded from config.ini
-    msg["To"] = to_email
-
-    try:
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(email_from, email_password)  # Securely load credentials
-            server.send_message(msg)
-        return {"message": "Email sent successfully"}
-    except smtplib.SMTPAuthenticationError as e:
-        print(f"SMTP Authentication Error: {e}")
-        raise HTTPException(status_code=500, detail="SMTP authentication failed")
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        raise HTTPException(status_code=500, detail="Error sending email")
+# True for hashes made with other argon2 costs than the current [HASHING] ones.
+# Only parses the hash, so it is cheap enough to call inline
+def password_needs_rehash(hashed_password: str) -> bool:
+    return pwd_context.needs_update(hashed_password)
 
-# Function to send OTP email
-async def send_otp_email(to_email: str, otp: str):
-    msg = EmailMessage()
-    msg.set_content(f"Your OTP for verification is {otp}.")
-    msg["Subject"] = "Your OTP Code"
-    msg["From"] = email_from  # Use the email_from loaded from config.ini
-    msg["To"] = to_email
-
-    try:
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(email_from, email_password)  # Securely load credentials
-            server.send_message(msg)
-        return {"message": "OTP sent successfully"}
-    except smtplib.SMTPAuthenticationError as e:
-        print(f"SMTP Authentication Error: {e}")
-        raise HTTPException(status_code=500, detail="SMTP authentication failed")
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        raise HTTPException(status_code=500, detail="Error sending email")
+# Add CORS handling to the FastAPI application (pure ASGI, see cors.py)
+def add_custom_cors_middleware(app):
+    # Comma-separated in config.ini, e.g. ALLOWED_ORIGINS = https://a.example, https://b.example
+    allowed_origins = settings.get('CORS', 'ALLOWED_ORIGINS', fallback="http://127.0.0.1:5500")
+    app.add_middleware(
+        CORSMiddleware,
+        allowed_origins={origin.strip() for origin in allowed_origins.split(",") if origin.strip()},
+    )
+
+# Queue a congratulation email; mailer.py delivers it from the outbox
+async def send_congratulation_email(db: AsyncSession, to_email: str, user_name: str):
+    await enqueue_email(
+        db,
+        to_email,
+        "Congratulations on Your Signup!",
+        f"Dear {user_name},\n\nCongratulations on your successful signup!\n\nBest regards,\nYour Team",
+    )
+    return {"message": "Email queued successfully"}
+
+# Queue an OTP email; mailer.py delivers it from the outbox
+async def send_otp_email(db: AsyncSession, to_email: str, otp: str):
+    await enqueue_email(db, to_email, "Your OTP Code", f"Your OTP for verification is {otp}.")
+    return {"message": "OTP queued successfully"}
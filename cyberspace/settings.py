@@ -0,0 +1,61 @@
+"""The application's settings, read from config.ini once per process.
+
+Every module used to build its own ConfigParser and read config.ini on
+import. They now share `settings`, which reads the file the first time any
+value is looked up (so scripts may chdir or set CYBERSPACE_CONFIG first) and
+then answers from memory. It behaves like a ConfigParser:
+
+    settings['DEFAULT']['SECRET_KEY']
+    settings.getint('INGEST', 'WORKERS', fallback=1)
+
+[APP] holds the process-wide switches read by startup.py:
+
+    MODE      production (default) or development. Only development
+              migrates the schema on startup; see startup.py
+    WARM_UP   open pool connections, start the hashing workers and prime
+              the validators before serving (default false; no benefit
+              measured yet, see benchmarks/bench_startup.py)
+    WARM_CONNECTIONS
+              connections opened by the warm-up (default: the pool size)
+"""
+import configparser
+import os
+
+CONFIG_PATH = os.environ.get("CYBERSPACE_CONFIG", "config.ini")
+
+MODES = ("development", "production")
+
+
+class Settings:
+    def __init__(self, path: str = CONFIG_PATH):
+        self.path = path
+        self._parser = None
+
+    @property
+    def parser(self) -> configparser.ConfigParser:
+        if self._parser is None:
+            parser = configparser.ConfigParser()
+            parser.read(self.path)
+            self._parser = parser
+        return self._parser
+
+    def __getitem__(self, section: str):
+        return self.parser[section]
+
+    def __getattr__(self, name: str):
+        # get, getint, getfloat, getboolean, has_option, ... of the loaded parser
+        return getattr(self.parser, name)
+
+    @property
+    def mode(self) -> str:
+        mode = self.parser.get('APP', 'MODE', fallback="production").strip().lower()
+        if mode not in MODES:
+            raise ValueError(f"[APP] MODE must be one of {', '.join(MODES)}, not {mode!r}")
+        return mode
+
+    @property
+    def production(self) -> bool:
+        return self.mode == "production"
+
+
+settings = Settings()
@@ -0,0 +1,268 @@
+"""Opt-in per-request SQL profiler that points out N+1 query patterns.
+
+Off by default; turn it on with [SQL_PROFILER] in config.ini:
+
+    ENABLED           true to install it (default false; nothing is hooked otherwise)
+    HEADER            add the X-SQL-Profile response headers (default: development mode only)
+    SAMPLE_RATE       fraction of requests written to the log (default 0.01)
+    LOG_PATH          NDJSON log file (default logs/sql_profile.ndjson)
+    REPEAT_THRESHOLD  identical statements per request that count as N+1 (default 3)
+
+Every statement run while a request is being served is recorded from the
+engine's before/after_cursor_execute events: its normalized text (literals
+and IN lists folded to ?), duration, and the two innermost app frames that
+issued it (e.g. "crud.py:92 create_user < main.py:120 create_user"). A
+statement repeated REPEAT_THRESHOLD or more times in one request is reported
+as an N+1 pattern: it is a loop that should be one batched query.
+
+Per request this yields:
+
+* X-SQL-Profile: "queries=4; time_ms=2.31; repeated=1", and
+  X-SQL-Profile-Repeated naming the callers of each repeated statement.
+  Both cover the queries made before the response started, so streamed
+  bodies are only counted in the log.
+* One NDJSON line with every query, for a SAMPLE_RATE sample of requests
+  plus every request with an N+1 pattern.
+
+GET /metrics/sql aggregates queries per route, to show which endpoints are
+worth batching.
+"""
+import contextvars
+import json
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+from typing import Optional
+import greenlet
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from settings import settings
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Queries kept per request; a runaway loop should not hold on to all of them
+MAX_QUERIES = 1000
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|:\w+")
+_IN_LIST = re.compile(r"\bIN \(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+
+# Middleware and plumbing frames, never where a query is issued from
+NOT_CALLERS = {"sql_profiler.py", "metrics.py", "cors.py", "startup.py", "database.py"}
+
+_current = contextvars.ContextVar("sql_profile", default=None)
+
+
+def normalize(statement: str) -> str:
+    statement = " ".join(statement.split())
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    return _IN_LIST.sub("IN (?, ...)", statement)
+
+
+def _app_frames(frame, depth: int = 2) -> Optional[str]:
+    found = []
+    while frame is not None and len(found) < depth:
+        filename = frame.f_code.co_filename
+        if filename.startswith(HERE) and os.path.basename(filename) not in NOT_CALLERS:
+            found.append(f"{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}")
+        frame = frame.f_back
+    return " < ".join(found) or None
+
+
+def caller() -> Optional[str]:
+    """The app frames that issued the current statement, innermost first.
+
+    Two levels, because the loop behind an N+1 pattern is usually in the
+    caller of the crud function rather than in the crud function itself.
+    """
+    # Under the async engine the statement runs in a greenlet whose stack ends
+    # at greenlet_spawn; the awaiting coroutines are on the parent's suspended stack
+    parent = greenlet.getcurrent().parent
+    if parent is not None:
+        found = _app_frames(parent.gr_frame)
+        if found:
+            return found
+    return _app_frames(sys._getframe(2))
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = []
+        self.total_seconds = 0.0
+        self.dropped = 0
+
+    def add(self, statement: str, seconds: float, issued_by: Optional[str]):
+        self.total_seconds += seconds
+        if len(self.queries) < MAX_QUERIES:
+            self.queries.append((statement, seconds, issued_by))
+        else:
+            self.dropped += 1
+
+    def repeated(self, threshold: int) -> list:
+        counts = Counter(statement for statement, _, _ in self.queries)
+        patterns = []
+        for statement, count in counts.items():
+            if count >= threshold:
+                callers = Counter(by for text, _, by in self.queries if text == statement)
+                patterns.append({
+                    "statement": statement,
+                    "count": count,
+                    "time_ms": round(sum(s for text, s, _ in self.queries if text == statement) * 1000, 3),
+                    "callers": dict(callers.most_common()),
+                })
+        return sorted(patterns, key=lambda pattern: pattern["count"], reverse=True)
+
+
+class SQLProfiler:
+    def __init__(self, enabled: bool = False, header: bool = False, sample_rate: float = 0.01,
+                 log_path: str = "logs/sql_profile.ndjson", repeat_threshold: int = 3):
+        self.enabled = enabled
+        self.header = header
+        self.sample_rate = sample_rate
+        self.log_path = log_path
+        self.repeat_threshold = repeat_threshold
+        self._normalized = {}
+        self._log = None
+        self._routes = {}
+
+    def _normalize(self, statement: str) -> str:
+        # The same few hundred statements come round again and again
+        normalized = self._normalized.get(statement)
+        if normalized is None:
+            if len(self._normalized) > 4096:
+                self._normalized.clear()
+            normalized = self._normalized[statement] = normalize(statement)
+        return normalized
+
+    def install(self, engine: AsyncEngine):
+        sync_engine = engine.sync_engine
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def start_query(conn, cursor, statement, parameters, context, executemany):
+            if _current.get() is not None:
+                context._profile_started = time.perf_counter()
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def end_query(conn, cursor, statement, parameters, context, executemany):
+            profile = _current.get()
+            if profile is not None:
+                seconds = time.perf_counter() - context._profile_started
+                profile.add(self._normalize(statement), seconds, caller())
+
+    def headers(self, profile: RequestProfile) -> list:
+        repeated = profile.repeated(self.repeat_threshold)
+        headers = [(b"x-sql-profile", (
+            f"queries={len(profile.queries) + profile.dropped}; "
+            f"time_ms={profile.total_seconds * 1000:.2f}; repeated={len(repeated)}"
+        ).encode())]
+        if repeated:
+            value = ", ".join(
+                f"{caller} x{count}" for pattern in repeated for caller, count in pattern["callers"].items()
+            )
+            headers.append((b"x-sql-profile-repeated", value.encode("latin-1", "replace")))
+        return headers
+
+    def record(self, method: str, route: str, status: int, seconds: float, profile: RequestProfile):
+        repeated = profile.repeated(self.repeat_threshold)
+        count = len(profile.queries) + profile.dropped
+
+        totals = self._routes.setdefault(f"{method} {route}", {
+            "requests": 0, "queries": 0, "query_ms": 0.0, "max_queries": 0, "n_plus_one_requests": 0,
+        })
+        totals["requests"] += 1
+        totals["queries"] += count
+        totals["query_ms"] += profile.total_seconds * 1000
+        totals["max_queries"] = max(totals["max_queries"], count)
+        totals["n_plus_one_requests"] += bool(repeated)
+
+        # Requests with an N+1 pattern are what the log is for, so they are always written
+        if repeated or random.random() < self.sample_rate:
+            self._write({
+                "ts": time.time(),
+                "method": method,
+                "route": route,
+                "status": status,
+                "duration_ms": round(seconds * 1000, 3),
+                "query_count": count,
+                "query_ms": round(profile.total_seconds * 1000, 3),
+                "n_plus_one": repeated,
+                "queries": [
+                    {"statement": statement, "ms": round(s * 1000, 3), "caller": by}
+                    for statement, s, by in profile.queries
+                ],
+            })
+
+    def _write(self, entry: dict):
+        if self._log is None:
+            directory = os.path.dirname(self.log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._log = open(self.log_path, "a", buffering=1)
+        self._log.write(json.dumps(entry) + "\n")
+
+    def stats(self) -> dict:
+        """Queries per request for every route profiled so far, most queries first."""
+        routes = {}
+        for route, totals in self._routes.items():
+            routes[route] = {
+                "requests": totals["requests"],
+                "avg_queries": totals["queries"] / totals["requests"],
+                "avg_query_ms": totals["query_ms"] / totals["requests"],
+                "max_queries": totals["max_queries"],
+                "n_plus_one_requests": totals["n_plus_one_requests"],
+            }
+        return dict(sorted(routes.items(), key=lambda item: item[1]["avg_queries"], reverse=True))
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+sql_profiler = SQLProfiler(
+    enabled=settings.getboolean('SQL_PROFILER', 'ENABLED', fallback=False),
+    header=settings.getboolean('SQL_PROFILER', 'HEADER', fallback=not settings.production),
+    sample_rate=settings.getfloat('SQL_PROFILER', 'SAMPLE_RATE', fallback=0.01),
+    log_path=settings.get('SQL_PROFILER', 'LOG_PATH', fallback="logs/sql_profile.ndjson"),
+    repeat_threshold=settings.getint('SQL_PROFILER', 'REPEAT_THRESHOLD', fallback=3),
+)
+
+
+class SQLProfilerMiddleware:
+    """Collects the statements of each HTTP request; see SQLProfiler for what is reported."""
+
+    def __init__(self, app: ASGIApp, profiler: SQLProfiler = sql_profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profiler = self.profiler
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_profile(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profiler.header:
+                    message = {**message, "headers": [*message.get("headers", []), *profiler.headers(profile)]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            profiler.record(scope["method"], route, status, time.perf_counter() - start, profile)
@@ -0,0 +1,142 @@
+"""Process start-up: schema, warm-up, and how long it took to serve.
+
+Importing main opens no connections and runs no DDL. The startup hook
+(prepare) then:
+
+1. in development mode, migrates the schema to head. Production mode (the
+   default) never runs DDL from the app: run `alembic upgrade head` once as
+   a deploy step instead of on every worker start.
+2. with [APP] WARM_UP on, opens the pool's connections, starts every argon2
+   worker process and configures the ORM mappers and pydantic validators,
+   so the first requests after a restart do not pay for any of it. It is
+   off by default: benchmarks/bench_startup.py has not shown it to bring
+   the first response forward, since the warm-up itself delays readiness.
+
+FirstRequestTimer then records when the first response went out. The
+durations from the start of the import are reported at GET /metrics/startup,
+which makes slow restarts visible during a rolling deploy.
+"""
+import time
+
+# Taken before main imports anything heavy
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import os
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import configure_mappers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from hashing import HashingExecutor
+from settings import settings
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class StartupTimer:
+    def __init__(self):
+        self.imported_at = None
+        self.migrate_seconds = None
+        self.warm_up_seconds = None
+        self.ready_at = None
+        self.first_request_at = None
+        self.first_response_at = None
+
+    @staticmethod
+    def since_import(moment: Optional[float]) -> Optional[float]:
+        return None if moment is None else moment - IMPORT_STARTED
+
+    def stats(self) -> dict:
+        first_request_seconds = None
+        if self.first_response_at is not None:
+            first_request_seconds = self.first_response_at - self.first_request_at
+        return {
+            "mode": settings.mode,
+            "import_seconds": self.since_import(self.imported_at),
+            "migrate_seconds": self.migrate_seconds,
+            "warm_up_seconds": self.warm_up_seconds,
+            "ready_seconds": self.since_import(self.ready_at),
+            "first_request_seconds": first_request_seconds,
+            "import_to_first_response_seconds": self.since_import(self.first_response_at),
+        }
+
+
+startup_timer = StartupTimer()
+
+
+def _upgrade(connection):
+    from alembic import command
+    from alembic.config import Config
+
+    alembic_config = Config()
+    alembic_config.set_main_option("script_location", os.path.join(HERE, "migrations"))
+    # migrations/env.py runs on this connection instead of opening its own
+    alembic_config.attributes["connection"] = connection
+    command.upgrade(alembic_config, "head")
+
+
+async def migrate(engine: AsyncEngine):
+    async with engine.begin() as connection:
+        await connection.run_sync(_upgrade)
+
+
+async def warm_pool(engine: AsyncEngine, connections: int):
+    async def connect():
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    # Held at the same time, so the pool ends up keeping `connections` of them
+    await asyncio.gather(*(connect() for _ in range(connections)))
+
+
+def warm_validators():
+    import schemas
+
+    # Mapper configuration otherwise happens inside the first query
+    configure_mappers()
+    # EmailStr loads email-validator and its IDNA tables on first use
+    schemas.Login(username="warm-up@example.com", password="warm-up")
+
+
+async def prepare(engine: AsyncEngine, hasher: HashingExecutor):
+    if not settings.production:
+        start = time.perf_counter()
+        await migrate(engine)
+        startup_timer.migrate_seconds = time.perf_counter() - start
+
+    if settings.getboolean('APP', 'WARM_UP', fallback=False):
+        start = time.perf_counter()
+        pool_size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+        await asyncio.gather(
+            warm_pool(engine, settings.getint('APP', 'WARM_CONNECTIONS', fallback=pool_size)),
+            hasher.warm_up(),
+            asyncio.to_thread(warm_validators),
+        )
+        startup_timer.warm_up_seconds = time.perf_counter() - start
+
+    startup_timer.ready_at = time.perf_counter()
+
+
+class FirstRequestTimer:
+    """Notes when the process's first HTTP request arrives and when its response ends."""
+
+    def __init__(self, app: ASGIApp, timer: StartupTimer = startup_timer):
+        self.app = app
+        self.timer = timer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.timer.first_request_at is not None:
+            await self.app(scope, receive, send)
+            return
+
+        timer = self.timer
+        timer.first_request_at = time.perf_counter()
+
+        async def send_timed(message: Message) -> None:
+            await send(message)
+            # The last body, pathsend or zerocopy message ends the response
+            if message["type"] != "http.response.start" and not message.get("more_body", False):
+                timer.first_response_at = time.perf_counter()
+
+        await self.app(scope, receive, send_timed)
@@ -0,0 +1,73 @@
+"""Shared set-up for the test suite.
+
+settings.py reads config.ini once per process and database.py builds its
+engine on import, so a scratch config (a SQLite database, cheap argon2 costs,
+rate limits off) is written and the working directory moved to it before any
+app module is imported. The database is migrated to head once per session.
+
+Tests drive coroutines through the `run` fixture, which disposes the engine
+afterwards so no pooled connection outlives its event loop.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+WORKDIR = tempfile.mkdtemp(prefix="cyberspace_tests_")
+DB_PATH = os.path.join(WORKDIR, "test.db")
+
+with open(os.path.join(WORKDIR, "config.ini"), "w") as f:
+    f.write(
+        "[DEFAULT]\nALGORITHM = HS256\nSECRET_KEY = test-suite\n"
+        "EMAIL_FROM = tests@example.com\nEMAIL_PASSWORD = tests\n\n"
+        f"[DATABASE]\nURL = sqlite+aiosqlite:///{DB_PATH}\n\n"
+        "[HASHING]\nTIME_COST = 1\nMEMORY_COST = 8192\nPARALLELISM = 1\n\n"
+        "[RATE_LIMIT]\nENABLED = false\n"
+    )
+os.environ["CYBERSPACE_CONFIG"] = os.path.join(WORKDIR, "config.ini")
+# Upload stores and the image cache use paths relative to the working directory
+os.chdir(WORKDIR)
+
+
+def alembic_config(connection=None):
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", os.path.join(APP_DIR, "migrations"))
+    if connection is not None:
+        # migrations/env.py runs on this connection instead of the app's engine
+        config.attributes["connection"] = connection
+    return config
+
+
+@pytest.fixture(scope="session", autouse=True)
+def migrated_database():
+    from alembic import command
+
+    command.upgrade(alembic_config(), "head")
+    yield DB_PATH
+
+    from service import hasher
+    hasher.shutdown()
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine to completion on a fresh event loop."""
+    from database import engine
+
+    def run(coroutine):
+        async def run_and_dispose():
+            try:
+                return await coroutine
+            finally:
+                await engine.dispose()
+
+        return asyncio.run(run_and_dispose())
+
+    return run
@@ -0,0 +1,98 @@
+"""Streaming roster imports."""
+import pytest
+from fastapi import HTTPException, Request
+from sqlalchemy import func, select
+
+import crud
+import database
+import main
+import schemas
+from bulk_import import LINE_TOO_LONG, iter_lines, iter_ndjson_rows, validated_chunks
+from models import Seminar, User
+
+HEADER = "first_name,last_name,email_id,phone_number,course,year_of_study,seminar_topic,additional_comments\n"
+
+
+async def stream(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def collect(iterator) -> list:
+    return [item async for item in iterator]
+
+
+def seminar_csv(rows: int) -> bytes:
+    return (HEADER + "".join(f"S{i},,s{i}@example.com,123,BSc,2,topic {i},\n" for i in range(rows))).encode()
+
+
+def test_lines_split_across_chunks_and_overlong_lines_are_dropped(run):
+    body = stream(b"\xef\xbb\xbfone\r\ntw", b"o\n" + b"x" * 20, b"x" * 20 + b"\nthree")
+    assert run(collect(iter_lines(body, max_length=30))) == ["one", "two", None, "three"]
+
+
+def test_ndjson_rows_report_bad_lines(run):
+    body = stream(b'{"a": 1}\n[1]\n{bad\n\n')
+    rows = run(collect(iter_ndjson_rows(body)))
+    assert rows[0] == {"a": 1}
+    assert rows[1] == {"__error__": "Each line must be a JSON object"}
+    assert rows[2]["__error__"].startswith("Invalid JSON")
+    assert len(rows) == 3
+
+
+def test_chunks_carry_the_row_numbers_they_cover(run):
+    rows = [{"first_name": "A", "email_id": "a@example.com", "phone_number": "1", "course": "c",
+             "year_of_study": "1", "seminar_topic": "t"}] * 5
+    rows[2] = {"__error__": LINE_TOO_LONG}
+
+    async def rows_iter():
+        for row in rows:
+            yield row
+
+    report = {"failed": 0, "errors": []}
+    chunks = run(collect(validated_chunks(rows_iter(), schemas.Seminar, report, chunk_size=2)))
+    assert [(first, last, len(chunk)) for first, last, chunk in chunks] == [(1, 2, 2), (3, 5, 2)]
+    assert report == {"failed": 1, "errors": [{"row": 3, "errors": [LINE_TOO_LONG]}]}
+
+
+def roster_request(body: bytes) -> Request:
+    chunks = [body[i:i + 65536] for i in range(0, len(body), 65536)]
+
+    async def receive():
+        if chunks:
+            return {"type": "http.request", "body": chunks.pop(0), "more_body": bool(chunks)}
+        return {"type": "http.disconnect"}
+
+    return Request({"type": "http", "method": "POST", "path": "/seminar/bulk",
+                    "headers": [(b"content-type", b"text/csv")]}, receive)
+
+
+def test_database_error_reports_what_was_imported(run, monkeypatch):
+    calls = []
+    bulk_create = crud.bulk_create_registrations
+
+    async def fail_second_chunk(db, model, rows, user_id):
+        calls.append(len(rows))
+        if len(calls) == 2:
+            raise RuntimeError("connection lost")
+        return await bulk_create(db, model, rows, user_id)
+
+    monkeypatch.setattr(crud, "bulk_create_registrations", fail_second_chunk)
+
+    async def import_then_count():
+        async with database.SessionLocal() as db:
+            user = User(first_name="Bulk", email_id="bulk-import@example.com")
+            db.add(user)
+            await db.commit()
+            with pytest.raises(HTTPException) as error:
+                await main.import_roster(roster_request(seminar_csv(2500)), Seminar, schemas.Seminar, user.id, db)
+            stored = await db.scalar(select(func.count()).select_from(Seminar).where(Seminar.user_id == user.id))
+            return error.value, stored
+
+    error, stored = run(import_then_count())
+    assert error.status_code == 500
+    assert error.detail["inserted"] == 1000 == stored
+    assert error.detail["not_imported_from_row"] == 1001
+    assert error.detail["failed_chunk"] == {"first_row": 1001, "last_row": 2000}
+    assert "connection lost" in error.detail["message"]
+    assert calls == [1000, 1000]
@@ -0,0 +1,75 @@
+"""The resized image variant cache."""
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from blobstore import BlobStore
+from file_serving import name_etag
+from image_variants import VariantCache
+
+
+def store_image(store: BlobStore, color: str) -> str:
+    out = io.BytesIO()
+    Image.new("RGB", (300, 200), color).save(out, "JPEG")
+    data = out.getvalue()
+    name = store.name_for(hashlib.sha256(data).hexdigest(), ".jpg")
+    os.makedirs(os.path.dirname(store.path_for(name)), exist_ok=True)
+    with open(store.path_for(name), "wb") as f:
+        f.write(data)
+    return name
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / "images"), "image")
+
+
+def test_hits_leave_the_variant_file_untouched(store, tmp_path, run):
+    cache = VariantCache(store, str(tmp_path / "cache"))
+    name = store_image(store, "red")
+
+    path = run(cache.get(name, 64))
+    os.utime(path, ns=(1, 1))
+    assert run(cache.get(name, 64)) == path
+    assert os.stat(path).st_mtime_ns == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_eviction_follows_in_memory_recency(store, tmp_path, run):
+    cache = VariantCache(store, str(tmp_path / "cache"), max_bytes=1, evict_grace=0)
+    first, second = store_image(store, "red"), store_image(store, "blue")
+
+    first_path = run(cache.get(first, 64))
+    second_path = run(cache.get(second, 64))
+    # Over the bound, so each render evicts everything but the newest variant
+    assert not os.path.exists(first_path)
+    assert os.path.exists(second_path)
+    assert cache.evictions == 1
+
+
+def test_recently_used_variants_are_kept_past_the_bound(store, tmp_path, run):
+    cache = VariantCache(store, str(tmp_path / "cache"), max_bytes=1, evict_grace=60)
+    paths = [run(cache.get(store_image(store, color), 64)) for color in ("red", "blue")]
+
+    assert all(os.path.exists(path) for path in paths)
+    assert cache.evictions == 0
+    assert cache.stats()["bytes"] > cache.max_bytes
+
+
+def test_unknown_widths_are_rejected(store, tmp_path, run):
+    cache = VariantCache(store, str(tmp_path / "cache"))
+    with pytest.raises(HTTPException) as error:
+        run(cache.get(store_image(store, "red"), 100))
+    assert error.value.status_code == 400
+
+
+def test_variant_etags_are_fixed_per_original_and_width(store):
+    name = store_image(store, "red")
+    digest = name.rsplit("/", 1)[-1].split(".", 1)[0]
+    assert name_etag(name, "-w64") == f'"{digest}-w64"'
+    assert name_etag(name, "-w64") != name_etag(name, "-w128") != name_etag(name)
+    assert name_etag("legacy.jpg", "-w64") is None
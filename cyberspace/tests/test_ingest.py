@@ -0,0 +1,46 @@
+"""IngestPipeline retries after a worker process dies."""
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+
+from ingest import IngestPipeline
+
+
+class BrokenPoolPipeline(IngestPipeline):
+    """Every job fails with BrokenProcessPool once all of them are running."""
+
+    def __init__(self, jobs: int):
+        super().__init__(session_factory=None, workers=jobs)
+        self.running = 0
+        self.all_running = None
+        self.updates = {}
+
+    async def _run_stages(self, paper_id, paper_pdf, pool):
+        self.running += 1
+        if self.running == self.workers:
+            self.all_running.set()
+        await self.all_running.wait()
+        raise BrokenProcessPool("A child process terminated abruptly")
+
+    async def _update_job(self, paper_id, **values):
+        self.updates[paper_id] = values
+
+
+def test_jobs_on_a_broken_pool_replace_it_once_and_are_requeued(run):
+    pipeline = BrokenPoolPipeline(jobs=3)
+
+    async def main():
+        pipeline.all_running = asyncio.Event()
+        first_pool = pipeline._ensure_pool()
+        await asyncio.gather(*(pipeline.process(paper_id, "paper.pdf", 1) for paper_id in (1, 2, 3)))
+        return first_pool
+
+    first_pool = run(main())
+    try:
+        assert pipeline._pool is None
+        assert pipeline._ensure_pool() is not first_pool
+        assert {paper_id: values["status"] for paper_id, values in pipeline.updates.items()} == {
+            1: "queued", 2: "queued", 3: "queued",
+        }
+        assert all(values["last_error"].startswith("BrokenProcessPool") for values in pipeline.updates.values())
+    finally:
+        pipeline.shutdown()
@@ -0,0 +1,103 @@
+"""DeliveryWorker against a local SMTP server (aiosmtpd)."""
+import datetime
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+from aiosmtpd.handlers import Sink
+from sqlalchemy import select, update
+
+import database
+from mailer import DeliveryWorker, SMTPConnectionPool, enqueue_email
+from models import EmailOutbox
+
+
+class Collector(Sink):
+    def __init__(self):
+        self.envelopes = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.envelopes.append(envelope)
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = Collector()
+    port = free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        yield handler, port
+    finally:
+        controller.stop()
+
+
+def outbox_rows(run, ids) -> dict:
+    async def load():
+        async with database.SessionLocal() as db:
+            result = await db.execute(select(EmailOutbox).where(EmailOutbox.id.in_(ids)))
+            return {row.id: row for row in result.scalars()}
+
+    return run(load())
+
+
+def test_queued_messages_are_delivered_and_their_bodies_blanked(smtp_server, run):
+    handler, port = smtp_server
+    pool = SMTPConnectionPool("127.0.0.1", port, size=2, starttls=False)
+    worker = DeliveryWorker(database.SessionLocal, pool, sender="noreply@example.com")
+
+    async def enqueue_and_deliver():
+        async with database.SessionLocal() as db:
+            messages = [await enqueue_email(db, f"student{i}@example.com", "Your OTP", f"OTP {i:06d}")
+                        for i in range(3)]
+        await worker.run_once()
+        return [message.id for message in messages]
+
+    try:
+        ids = run(enqueue_and_deliver())
+    finally:
+        pool.close()
+
+    assert sorted(envelope.rcpt_tos[0] for envelope in handler.envelopes) == [
+        "student0@example.com", "student1@example.com", "student2@example.com",
+    ]
+    assert all(b"OTP 0000" in envelope.content for envelope in handler.envelopes)
+    assert all(envelope.mail_from == "noreply@example.com" for envelope in handler.envelopes)
+    rows = outbox_rows(run, ids)
+    assert {(row.status, row.body, row.attempts) for row in rows.values()} == {("sent", "", 1)}
+    assert worker.stats()["sent"] == 3
+
+
+def test_unreachable_server_backs_off_then_purge_removes_finished_rows(run):
+    # Nothing listens on port 1
+    pool = SMTPConnectionPool("127.0.0.1", 1, size=1, starttls=False)
+    worker = DeliveryWorker(database.SessionLocal, pool, max_attempts=1, sender="noreply@example.com")
+
+    async def enqueue_and_fail():
+        async with database.SessionLocal() as db:
+            message = await enqueue_email(db, "student@example.com", "Your OTP", "OTP 123456")
+        await worker.run_once()
+        return message.id
+
+    message_id = run(enqueue_and_fail())
+    row = outbox_rows(run, [message_id])[message_id]
+    assert (row.status, row.body, row.attempts) == ("failed", "", 1)
+    assert row.last_error
+
+    async def age_and_purge():
+        async with database.SessionLocal() as db:
+            long_ago = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=2)
+            await db.execute(update(EmailOutbox).where(EmailOutbox.id == message_id)
+                             .values(next_attempt_at=long_ago))
+            await db.commit()
+        return await worker.purge(keep_hours=24)
+
+    assert run(age_and_purge()) >= 1
+    assert outbox_rows(run, [message_id]) == {}
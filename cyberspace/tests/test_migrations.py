@@ -0,0 +1,113 @@
+"""Databases created before migrations existed must upgrade to the full schema.
+
+Such a database is built here from the pre-migration models, which only
+ever existed as Base.metadata.create_all, marked with `alembic stamp 0001`
+as the README says and upgraded; it must end up with the same tables and
+indexes as a database migrated from scratch.
+"""
+import sqlite3
+
+from alembic import command
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, create_engine
+from sqlalchemy.sql import func
+
+from conftest import alembic_config
+from database import Base
+import models  # noqa: F401  (registers every table on Base.metadata)
+
+# The schema create_all produced before the first migration
+original = MetaData()
+Table(
+    "users", original,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("first_name", String(50)),
+    Column("last_name", String(50)),
+    Column("email_id", String(100), unique=True),
+    Column("mobile_number", String(20), unique=True),
+    Column("college_name", String(50)),
+    Column("hashed_password", String(255)),
+    Column("image_filename", String(100), nullable=True),
+)
+Table(
+    "virtual_internships", original,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("first_name", String(50)),
+    Column("last_name", String(50), nullable=True),
+    Column("email_id", String(100)),
+    Column("phone_number", String(20)),
+    Column("address", String(100)),
+    Column("highest_qualification", String(50)),
+    Column("field_of_study", String(50)),
+    Column("skills_and_strengths", String(300)),
+    Column("experience", String(300)),
+    Column("available_start_date", DateTime),
+    Column("preferred_internship", String(100)),
+    Column("additional_info", String(300)),
+)
+for name, topic in (("seminars", "seminar_topic"), ("webinars", "webinar_topic")):
+    Table(
+        name, original,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_id", Integer, ForeignKey("users.id")),
+        Column("first_name", String(50)),
+        Column("last_name", String(50)),
+        Column("email_id", String(100)),
+        Column("phone_number", String(20)),
+        Column("course", String(50)),
+        Column("year_of_study", String(10)),
+        Column(topic, String(300)),
+        Column("additional_comments", String(300)),
+    )
+Table(
+    "research_papers", original,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("first_name", String(50)),
+    Column("last_name", String(50)),
+    Column("email_id", String(100)),
+    Column("phone_number", String(20)),
+    Column("student_id", String(50)),
+    Column("paper_title", String(300)),
+    Column("abstract", String(1000)),
+    Column("keywords", String(300)),
+    Column("paper_category", String(100)),
+    Column("paper_pdf", String(100)),
+)
+Table(
+    "otps", original,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("otp", String(6)),
+    Column("expiry", DateTime(timezone=True)),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("used", Boolean, default=False),
+)
+
+
+def schema_objects(db_path: str) -> set:
+    conn = sqlite3.connect(db_path)
+    try:
+        return set(conn.execute(
+            "SELECT type, name FROM sqlite_master "
+            "WHERE name NOT LIKE 'sqlite_%' AND name != 'alembic_version'"
+        ).fetchall())
+    finally:
+        conn.close()
+
+
+def test_stamped_pre_migration_database_upgrades_to_head(tmp_path, migrated_database):
+    db_path = str(tmp_path / "pre_migration.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    original.create_all(engine)
+    assert schema_objects(db_path) <= schema_objects(migrated_database)
+
+    with engine.begin() as connection:
+        command.stamp(alembic_config(connection), "0001")
+    with engine.begin() as connection:
+        command.upgrade(alembic_config(connection), "head")
+    engine.dispose()
+
+    assert schema_objects(db_path) == schema_objects(migrated_database)
+    tables = {name for kind, name in schema_objects(db_path) if kind == "table"}
+    assert set(Base.metadata.tables) <= tables
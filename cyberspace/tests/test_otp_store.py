@@ -0,0 +1,66 @@
+"""OTP backends: each /forgot-password/ replaces the user's previous OTP."""
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+import database
+from models import User
+from otp_store import MemoryOTPBackend, OTPBackend, SQLOTPBackend
+
+
+def test_backends_must_implement_every_operation():
+    class Partial(OTPBackend):
+        async def issue(self, db, user_id):
+            return "123456"
+
+    with pytest.raises(TypeError):
+        Partial("secret")
+
+
+async def new_user(db) -> int:
+    user = User(first_name="Otp", email_id=f"{uuid.uuid4().hex}@example.com")
+    db.add(user)
+    await db.commit()
+    return user.id
+
+
+@pytest.mark.parametrize("backend_class", [SQLOTPBackend, MemoryOTPBackend])
+def test_issue_replaces_the_previous_otp(backend_class, run):
+    backend = backend_class("secret")
+
+    async def main():
+        async with database.SessionLocal() as db:
+            user_id = await new_user(db)
+            first = await backend.issue(db, user_id)
+            second = await backend.issue(db, user_id)
+            if first != second:
+                with pytest.raises(HTTPException) as error:
+                    await backend.verify(db, user_id, first)
+                assert error.value.status_code == 404
+            assert await backend.find_user(db, second) == user_id
+            await backend.verify(db, user_id, second)
+            # Consumed: it cannot be used twice
+            with pytest.raises(HTTPException):
+                await backend.verify(db, user_id, second)
+
+    run(main())
+
+
+@pytest.mark.parametrize("backend_class", [SQLOTPBackend, MemoryOTPBackend])
+def test_sweep_removes_expired_otps(backend_class, run):
+    backend = backend_class("secret", ttl_minutes=-1)
+
+    async def main():
+        async with database.SessionLocal() as db:
+            user_id = await new_user(db)
+            otp = await backend.issue(db, user_id)
+            with pytest.raises(HTTPException) as error:
+                await backend.verify(db, user_id, otp)
+            assert error.value.status_code == 400
+            assert await backend.sweep(db, batch_size=10) >= 1
+            with pytest.raises(HTTPException) as error:
+                await backend.verify(db, user_id, otp)
+            assert error.value.status_code == 404
+
+    run(main())
@@ -0,0 +1,110 @@
+"""Every query issued by crud.py must use an index, never a full table scan.
+
+Runs the crud functions against the test database while recording the SQL
+they emit, then checks each SELECT/UPDATE/DELETE with EXPLAIN QUERY PLAN.
+"""
+import datetime
+import sqlite3
+
+
+async def exercise_crud(statements: list):
+    from sqlalchemy import event
+    from database import SessionLocal, engine
+    import crud
+    import schemas
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+
+    async with SessionLocal() as db:
+        user = await crud.create_user(db, schemas.UserCreate(
+            first_name="Plan", last_name="Check", email_id="plan@example.com",
+            mobile_number="0000000000", college_name="Test", password="plan-check",
+        ))
+        token = crud.create_access_token({"sub": user.id})
+
+        await crud.get_user(db, user.id)
+        await crud.get_user_by_email(db, user.email_id)
+        await crud.authenticate_user(db, user.email_id, "plan-check")
+        await crud.rehash_password(user.id, "plan-check", user.hashed_password)
+        await crud.get_user_profile(db, token)
+        await crud.get_principal(db, token)
+        refresh_token = await crud.create_refresh_token(db, user.id)
+        _, refresh_token = await crud.refresh_access_token(db, refresh_token)
+        await crud.revoke_refresh_token(db, refresh_token)
+        crud.profile_counts_cache.clear()
+        await crud.get_user_profile_with_counts(db, token)
+
+        person = dict(first_name="Plan", email_id="plan@example.com", phone_number="0000000000")
+        await crud.create_virtual_internship(db, schemas.VirtualInternship(
+            **person, address="a", highest_qualification="q", field_of_study="f",
+            skills_and_strengths="s", experience="e", available_start_date=datetime.date.today(),
+            preferred_internship="p",
+        ), user.id)
+        await crud.create_seminar(db, schemas.Seminar(
+            **person, course="c", year_of_study="1", seminar_topic="t"), user.id)
+        await crud.create_webinar(db, schemas.Webinar(
+            **person, course="c", year_of_study="1", webinar_topic="t"), user.id)
+        await crud.create_research_paper(db, schemas.ResearchPaper(
+            **person, student_id="s", paper_title="t", abstract="a", keywords="k",
+            paper_category="c", paper_pdf="00/00/" + "0" * 64 + ".pdf"), user.id)
+
+        await crud.search_research_papers(db, "deep learn")
+        await crud.get_ingest_job(db, 1, user.id)
+
+        for model in crud.REGISTRATION_LIST_COLUMNS:
+            async for _ in crud.stream_registrations(db, model, user.id, before_id=10, limit=20):
+                pass
+
+        otp = await crud.create_otp(db, user.id)
+        await crud.find_otp_user(db, otp)
+        await crud.verify_otp(db, user.id, otp)
+        await crud.update_user_password(db, user.id, "plan-check-2")
+        await crud.otp_backend.sweep(db, batch_size=100)
+        await crud.refresh_tokens.sweep(db, batch_size=100)
+
+    from ingest import IngestPipeline
+    pipeline = IngestPipeline(SessionLocal)
+    await pipeline.count_backlog()
+    await pipeline.claim(1)
+
+    event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+def full_scans(db_path: str, statements: list) -> list:
+    problems = []
+    conn = sqlite3.connect(db_path)
+    seen = set()
+    for statement, parameters in statements:
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if verb not in ("SELECT", "UPDATE", "DELETE") or statement in seen:
+            continue
+        seen.add(statement)
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        details = [row[-1] for row in plan]
+        # "SCAN <table>" is a full table scan; "SEARCH <table> USING ..." is an index lookup.
+        # An FTS5 table answering MATCH reports "SCAN ... VIRTUAL TABLE INDEX" but uses its
+        # index, and scanning a subquery's own (already limited) result is not a table scan.
+        subqueries = {d.split()[1] for d in details if d.startswith(("CO-ROUTINE ", "MATERIALIZE "))}
+        if any(detail.startswith("SCAN ") and "CONSTANT ROW" not in detail
+               and "VIRTUAL TABLE INDEX" not in detail and detail.split()[1] not in subqueries
+               for detail in details):
+            problems.append((statement, details))
+    conn.close()
+    return problems
+
+
+def test_crud_queries_use_indexes(migrated_database, run):
+    statements = []
+    run(exercise_crud(statements))
+    checked = {s for s, _ in statements if s.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE")}
+    assert len(checked) > 20, "crud.py was not exercised"
+
+    problems = full_scans(migrated_database, statements)
+    report = "\n".join(
+        "FULL TABLE SCAN: " + " ".join(statement.split()) + "".join(f"\n    {d}" for d in details)
+        for statement, details in problems
+    )
+    assert not problems, report
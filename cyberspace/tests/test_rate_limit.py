@@ -0,0 +1,49 @@
+"""Per-IP and per-email token buckets."""
+import pytest
+from fastapi import HTTPException, Request
+
+from rate_limit import Limit, MemoryRateLimitBackend, RateLimitBackend, RateLimiter
+
+
+def client_request(host: str) -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/login", "headers": [], "client": (host, 1234)})
+
+
+def test_backends_must_implement_every_operation():
+    class Partial(RateLimitBackend):
+        async def take(self, key, limit):
+            return 0.0
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_over_the_limit_gets_429_with_retry_after(run):
+    limiter = RateLimiter(MemoryRateLimitBackend(), {"login_per_ip": Limit(2, 60), "login_per_email": Limit(5, 60)})
+
+    async def main():
+        for _ in range(2):
+            await limiter.check("login", client_request("10.0.0.1"), "A@example.com")
+        with pytest.raises(HTTPException) as error:
+            await limiter.check("login", client_request("10.0.0.1"), "a@example.com")
+        # Another IP has its own bucket
+        await limiter.check("login", client_request("10.0.0.2"), "a@example.com")
+        return error.value
+
+    error = run(main())
+    assert error.status_code == 429
+    assert error.headers["Retry-After"] == "30"
+    assert limiter.stats()["rejected"] == {"login_per_ip": 1, "login_per_email": 0}
+    assert limiter.stats()["buckets"] == 3
+
+
+def test_full_backend_prunes_refilled_buckets(run):
+    backend = MemoryRateLimitBackend(max_keys=2)
+    limit = Limit(1, 0.001)
+
+    async def main():
+        for key in ("a", "b", "c"):
+            assert await backend.take(key, limit) == 0.0
+
+    run(main())
+    assert backend.size() <= 2
@@ -0,0 +1,106 @@
+"""Upload storage and the request body caps in front of it."""
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+
+from blobstore import TEMP_PREFIX, BlobStore
+from body_limit import FORM_OVERHEAD, BodySizeLimitMiddleware
+from service import PDF_MAGIC, store_upload
+
+PDF = b"%PDF-1.4\n" + b"x" * 200000
+
+
+def upload(data: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename="paper.pdf")
+
+
+def temp_files(store: BlobStore) -> list:
+    return [name for _, _, names in os.walk(store.root) for name in names if name.startswith(TEMP_PREFIX)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / "papers"), "paper")
+
+
+def test_upload_is_stored_under_its_digest_and_deduplicated(store):
+    name, size = store_upload(upload(PDF), store, 1024 * 1024, PDF_MAGIC, ".pdf")
+    assert name == store.name_for(hashlib.sha256(PDF).hexdigest(), ".pdf")
+    assert size == len(PDF)
+    with open(store.path_for(name), "rb") as f:
+        assert f.read() == PDF
+
+    assert store_upload(upload(PDF), store, 1024 * 1024, PDF_MAGIC, ".pdf") == (name, size)
+    assert temp_files(store) == []
+
+
+@pytest.mark.parametrize("data, max_size, status_code", [
+    (b"GIF89a" + b"x" * 100, 1024 * 1024, 400),
+    (b"", 1024 * 1024, 400),
+    (PDF, 100000, 413),
+])
+def test_rejected_uploads_leave_no_temp_file(store, data, max_size, status_code):
+    with pytest.raises(HTTPException) as error:
+        store_upload(upload(data), store, max_size, PDF_MAGIC, ".pdf")
+    assert error.value.status_code == status_code
+    assert temp_files(store) == []
+
+
+MAX_FILE_SIZE = 100000
+BOUNDARY = "limit-test"
+
+
+def multipart(data: bytes) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"paper.pdf\"\r\n"
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.state.received = []
+
+    @app.post("/upload")
+    async def receive_upload(file: UploadFile = File(...)):
+        app.state.received.append(len(await file.read()))
+        return {"ok": True}
+
+    app.add_middleware(BodySizeLimitMiddleware, max_file_sizes={"/upload": MAX_FILE_SIZE})
+    with TestClient(app) as client:
+        yield client
+
+
+def post(client, body, **headers):
+    return client.post("/upload", content=body,
+                       headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}", **headers})
+
+
+def test_bodies_within_the_cap_reach_the_endpoint(client):
+    response = post(client, multipart(b"x" * MAX_FILE_SIZE))
+    assert response.status_code == 200
+    assert client.app.state.received == [MAX_FILE_SIZE]
+
+
+def test_oversized_content_length_is_refused_before_the_app_runs(client):
+    response = post(client, multipart(b"x" * (MAX_FILE_SIZE + FORM_OVERHEAD + 1)))
+    assert response.status_code == 413
+    assert client.app.state.received == []
+
+
+def test_oversized_streamed_body_is_cut_off(client):
+    body = multipart(b"x" * (MAX_FILE_SIZE + FORM_OVERHEAD + 1))
+
+    def chunks():
+        for start in range(0, len(body), 8192):
+            yield body[start:start + 8192]
+
+    response = post(client, chunks())
+    assert response.status_code == 413
+    assert "limit" in response.json()["detail"]
+    assert client.app.state.received == []